@@ -0,0 +1,110 @@
+import struct
+from . import yao
+
+MAGIC = b"YGC1"  # magic number of a serialized garbled circuit
+
+# Header: magic, scheme, number of gates
+HEADER = struct.Struct("<4sBI")
+# Index entry of a gate: gate ID, offset in the table buffer, row count,
+# row size in bytes
+GATE_ENTRY = struct.Struct("<qIHH")
+# Labels: number of labels, label size in bytes
+LABELS_HEADER = struct.Struct("<IH")
+# Label entry: wire ID, encrypted bit, followed by the raw label
+LABEL_ENTRY = struct.Struct("<qB")
+
+# Order of the rows of a classic garbled table
+ROWS_2 = ((0, 0), (0, 1), (1, 0), (1, 1))
+ROWS_1 = ((0, ), (1, ))
+
+
+def pack_garbled_tables(g_tables, scheme="classic"):
+    """Serialize garbled tables into binary frames.
+
+    Args:
+        g_tables: A dict mapping each gate to its garbled table.
+        scheme: Optional; the garbling scheme used to create g_tables.
+
+    Returns:
+        A list [index, tables] of bytes frames. The index frame holds the
+        header and one fixed-size entry per gate, the tables frame holds all
+        rows of all gates contiguously.
+    """
+    index = bytearray(HEADER.pack(MAGIC, yao.SCHEMES.index(scheme),
+                                  len(g_tables)))
+    tables = bytearray()
+
+    for gate_id, table in g_tables.items():
+        if scheme == "classic":
+            rows = [table[k] for k in (ROWS_1 if len(table) == 2 else ROWS_2)]
+        else:
+            rows = [table]
+        row_size = len(rows[0])
+        if any(len(row) != row_size for row in rows):
+            raise ValueError(f"Gate {gate_id} has rows of different sizes")
+        index += GATE_ENTRY.pack(gate_id, len(tables), len(rows), row_size)
+        for row in rows:
+            tables += row
+
+    return [bytes(index), bytes(tables)]
+
+
+def unpack_garbled_tables(frames):
+    """Deserialize garbled tables from binary frames.
+
+    The rows of the halfgates scheme are returned as memoryview slices of the
+    received frame, without any copy.
+
+    Args:
+        frames: The [index, tables] frames built by pack_garbled_tables.
+
+    Returns:
+        A tuple (g_tables, scheme).
+    """
+    index, tables = memoryview(frames[0]), memoryview(frames[1])
+    magic, scheme, gate_count = HEADER.unpack_from(index)
+    if magic != MAGIC:
+        raise ValueError("Not a serialized garbled circuit")
+    scheme = yao.SCHEMES[scheme]
+    g_tables = {}
+
+    for i in range(gate_count):
+        gate_id, offset, row_count, row_size = GATE_ENTRY.unpack_from(
+            index, HEADER.size + i * GATE_ENTRY.size)
+        if scheme == "classic":
+            keys = ROWS_1 if row_count == 2 else ROWS_2
+            g_tables[gate_id] = {
+                k: bytes(tables[offset + j * row_size:offset +
+                                (j + 1) * row_size])
+                for j, k in enumerate(keys)
+            }
+        else:
+            g_tables[gate_id] = tables[offset:offset + row_count * row_size]
+
+    return g_tables, scheme
+
+
+def pack_labels(inputs):
+    """Serialize a dict mapping wires to (key, encr_bit) into bytes."""
+    label_size = len(next(iter(inputs.values()))[0]) if inputs else 0
+    buffer = bytearray(LABELS_HEADER.pack(len(inputs), label_size))
+    for wire, (key, encr_bit) in inputs.items():
+        buffer += LABEL_ENTRY.pack(wire, encr_bit)
+        buffer += key
+    return bytes(buffer)
+
+
+def unpack_labels(frame):
+    """Deserialize a dict mapping wires to (key, encr_bit) from bytes."""
+    frame = memoryview(frame)
+    count, label_size = LABELS_HEADER.unpack_from(frame)
+    entry_size = LABEL_ENTRY.size + label_size
+    inputs = {}
+
+    for i in range(count):
+        offset = LABELS_HEADER.size + i * entry_size
+        wire, encr_bit = LABEL_ENTRY.unpack_from(frame, offset)
+        start = offset + LABEL_ENTRY.size
+        inputs[wire] = (bytes(frame[start:start + label_size]), encr_bit)
+
+    return inputs
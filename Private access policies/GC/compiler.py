@@ -0,0 +1,160 @@
+import hashlib
+import json
+import pickle
+from array import array
+from collections import deque
+
+# Gate opcodes of a compiled circuit
+NOT, AND, OR, XOR, NAND, NOR, XNOR = range(7)
+OPCODES = {
+    "NOT": NOT,
+    "AND": AND,
+    "OR": OR,
+    "XOR": XOR,
+    "NAND": NAND,
+    "NOR": NOR,
+    "XNOR": XNOR,
+}
+
+CACHE_SUFFIX = ".compiled"  # suffix of compiled circuits next to the JSON
+CACHE_FORMAT = 1  # bumped whenever CompiledCircuit changes
+
+
+class CompiledCircuit:
+    """An array-backed representation of a circuit.
+
+    Wires are renumbered densely: input wires first, then the output of each
+    gate in topological order, so that the i-th gate always writes wire
+    num_inputs + i and only reads wires with a lower index.
+
+    Args:
+        circuit: A dict containing circuit spec.
+    """
+    def __init__(self, circuit):
+        self.id = circuit["id"]
+        self.alice = circuit.get("alice", [])  # Alice's wires
+        self.bob = circuit.get("bob", [])  # Bob's wires
+        self.out = circuit["out"]  # list of output wires
+
+        gates = self._sort_gates(circuit["gates"])
+        produced = {gate["id"] for gate in gates}
+
+        # Input wires first, Alice's then Bob's then any other free wire
+        self.wire_ids = []  # map from dense index to wire ID
+        self.wire_index = {}  # map from wire ID to dense index
+        inputs = self.alice + self.bob + [
+            wire for gate in gates for wire in gate["in"]
+            if wire not in produced
+        ]
+        for wire in inputs:
+            if wire not in self.wire_index:
+                self.wire_index[wire] = len(self.wire_ids)
+                self.wire_ids.append(wire)
+        self.num_inputs = len(self.wire_ids)
+        for gate in gates:
+            self.wire_index[gate["id"]] = len(self.wire_ids)
+            self.wire_ids.append(gate["id"])
+        self.num_wires = len(self.wire_ids)
+
+        index = self.wire_index
+        self.gate_ids = array("q", (gate["id"] for gate in gates))
+        self.opcodes = array("B", (OPCODES[gate["type"]] for gate in gates))
+        self.in0 = array("l", (index[gate["in"][0]] for gate in gates))
+        self.in1 = array("l", (index[gate["in"][-1]] for gate in gates))
+        self.out_index = array("l", (index[w] for w in self.out))
+
+    @staticmethod
+    def _sort_gates(gates):
+        """Return gates in topological order.
+
+        Kahn's algorithm: after sorting by ID, each gate and wire is visited
+        once. Gates are taken in the order they become ready, lowest gate
+        IDs first among gates ready at once.
+        """
+        pending = sorted(gates, key=lambda g: g["id"])
+        produced = {gate["id"] for gate in pending}
+        waiting = []  # number of unsorted gates each gate reads
+        readers = {}  # map from gate ID to the gates reading its output
+        for i, gate in enumerate(pending):
+            inputs = [w for w in gate["in"] if w in produced]
+            waiting.append(len(inputs))
+            for w in inputs:
+                readers.setdefault(w, []).append(i)
+
+        ready = deque(i for i, count in enumerate(waiting) if count == 0)
+        ordered = []
+        while ready:
+            gate = pending[ready.popleft()]
+            ordered.append(gate)
+            for i in readers.get(gate["id"], ()):
+                waiting[i] -= 1
+                if waiting[i] == 0:
+                    ready.append(i)
+
+        if len(ordered) != len(pending):
+            raise ValueError("Circuit contains a cycle")
+        return ordered
+
+    def __len__(self):
+        return len(self.gate_ids)
+
+    def gates(self):
+        """Iterate over (gate_id, opcode, in0, in1, out) gate tuples."""
+        return zip(self.gate_ids, self.opcodes, self.in0, self.in1,
+                   range(self.num_inputs, self.num_wires))
+
+    def load_inputs(self, *inputs):
+        """Return the wire array filled with the given input dicts.
+
+        Args:
+            inputs: Dicts mapping input wires to their value.
+        """
+        wires = [None] * self.num_wires
+        index = self.wire_index
+        for values in inputs:
+            for wire, value in values.items():
+                wires[index[wire]] = value
+        return wires
+
+
+def compile_circuit(circuit):
+    """Compile a circuit, leaving already compiled circuits untouched."""
+    if isinstance(circuit, CompiledCircuit):
+        return circuit
+    return CompiledCircuit(circuit)
+
+
+def load_compiled(json_path):
+    """Return the compiled circuits of a JSON circuit file.
+
+    The compiled circuits are cached in a file next to the JSON file and
+    rebuilt whenever the JSON file or CACHE_FORMAT changes, or the cache
+    cannot be loaded.
+
+    Args:
+        json_path: The path to the JSON circuit file.
+
+    Returns:
+        A list of CompiledCircuit in the order of the JSON file.
+    """
+    with open(json_path, "rb") as json_file:
+        data = json_file.read()
+    digest = hashlib.sha256(data).digest()
+    cache_path = json_path + CACHE_SUFFIX
+
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached_format, cached_digest, compiled = pickle.load(cache_file)
+        if (cached_format, cached_digest) == (CACHE_FORMAT, digest):
+            return compiled
+    except Exception:
+        pass  # missing, truncated or written by another version
+
+    compiled = [CompiledCircuit(c) for c in json.loads(data)["circuits"]]
+    try:
+        with open(cache_path, "wb") as cache_file:
+            pickle.dump((CACHE_FORMAT, digest, compiled), cache_file)
+    except OSError:
+        pass  # read-only location, fall back to compiling every time
+
+    return compiled
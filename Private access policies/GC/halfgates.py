@@ -0,0 +1,183 @@
+import hashlib
+import secrets
+from . import compiler
+
+LABEL_SIZE = 16  # label length in bytes (128-bit labels)
+TABLE_SIZE = 2 * LABEL_SIZE  # two ciphertexts per AND-like gate
+
+# Gates garbled as ((a ^ alpha) and (b ^ beta)) ^ gamma with half-gates
+AND_GATES = {
+    compiler.AND: (0, 0, 0),
+    compiler.NAND: (0, 0, 1),
+    compiler.OR: (1, 1, 1),
+    compiler.NOR: (1, 1, 0),
+}
+
+# Gates garbled for free with free-XOR, mapped to their output inversion
+FREE_GATES = {
+    compiler.XOR: 0,
+    compiler.XNOR: 1,
+    compiler.NOT: 1,
+}
+
+
+def hash_label(label, tweak):
+    """Hash a label with a gate-dependent tweak.
+
+    Args:
+        label: The label as a 128-bit integer.
+        tweak: A unique integer per gate half.
+
+    Returns:
+        A 128-bit integer.
+    """
+    data = label.to_bytes(LABEL_SIZE, "big") + tweak.to_bytes(8, "big")
+    return int.from_bytes(hashlib.sha256(data).digest()[:LABEL_SIZE], "big")
+
+
+def label_to_bytes(label):
+    """Convert a 128-bit integer label into raw bytes."""
+    return label.to_bytes(LABEL_SIZE, "big")
+
+
+class Garbler:
+    """An incremental half-gates garbler.
+
+    Gates are garbled in topological order, one slice at a time, so that the
+    garbled tables of a large circuit never have to be held all at once.
+    Every wire w has a zero-label W0 and a one-label W0 ^ R, where R is a
+    global offset with its least significant bit set. The p-bit of a wire is
+    the least significant bit of its zero-label, so the encrypted bit of a
+    label is simply its least significant bit.
+
+    Args:
+        program: A compiled circuit.
+    """
+    def __init__(self, program):
+        self.program = program
+        self.offset = secrets.randbits(8 * LABEL_SIZE) | 1  # free-XOR offset
+        self.zero = []  # zero-label of each wire, indexed by wire
+        self.keys = {}  # dict mapping each wire to its pair of labels
+        self.pbits = {}  # dict mapping each wire to its p-bit
+        self.next_gate = 0  # index of the next gate to garble
+
+        for _ in range(program.num_inputs):
+            self._add_label(secrets.randbits(8 * LABEL_SIZE))
+
+    def _add_label(self, label):
+        """Append the zero-label of the next wire."""
+        wire = self.program.wire_ids[len(self.zero)]
+        self.zero.append(label)
+        self.keys[wire] = (label_to_bytes(label),
+                           label_to_bytes(label ^ self.offset))
+        self.pbits[wire] = label & 1
+
+    def garble_gates(self, count):
+        """Garble the next gates of the circuit.
+
+        Args:
+            count: The maximum number of gates to garble.
+
+        Returns:
+            A dict mapping each garbled AND-like gate to its 32-byte table.
+        """
+        zero, offset = self.zero, self.offset
+        start, stop = self.next_gate, min(self.next_gate + count,
+                                          len(self.program))
+        garbled_tables = {}
+
+        for i in range(start, stop):
+            gate_id, opcode = self.program.gate_ids[i], self.program.opcodes[i]
+            in0, in1 = self.program.in0[i], self.program.in1[i]
+
+            if opcode in FREE_GATES:
+                label = zero[in0]
+                if opcode != compiler.NOT:
+                    label ^= zero[in1]
+                self._add_label(label ^ (offset * FREE_GATES[opcode]))
+                continue
+
+            alpha, beta, gamma = AND_GATES[opcode]
+            a0 = zero[in0] ^ (offset * alpha)
+            b0 = zero[in1] ^ (offset * beta)
+            pa, pb = a0 & 1, b0 & 1
+            ha0, ha1 = hash_label(a0, 2 * gate_id), hash_label(
+                a0 ^ offset, 2 * gate_id)
+            hb0, hb1 = hash_label(b0, 2 * gate_id + 1), hash_label(
+                b0 ^ offset, 2 * gate_id + 1)
+
+            # Generator half-gate
+            t_gen = ha0 ^ ha1 ^ (offset * pb)
+            w_gen = ha0 ^ (t_gen * pa)
+            # Evaluator half-gate
+            t_eval = hb0 ^ hb1 ^ a0
+            w_eval = hb0 ^ ((t_eval ^ a0) * pb)
+
+            self._add_label(w_gen ^ w_eval ^ (offset * gamma))
+            garbled_tables[gate_id] = label_to_bytes(t_gen) + label_to_bytes(
+                t_eval)
+
+        self.next_gate = stop
+        return garbled_tables
+
+    def done(self):
+        """Return True once every gate has been garbled."""
+        return self.next_gate == len(self.program)
+
+
+def garble(program):
+    """Garble a circuit with free-XOR, point-and-permute and half-gates.
+
+    Args:
+        program: A compiled circuit.
+
+    Returns:
+        A tuple (keys, pbits, garbled_tables) where keys maps each wire to a
+        pair of 16-byte labels, pbits maps each wire to its p-bit and
+        garbled_tables maps each AND-like gate to its 32-byte table.
+    """
+    garbler = Garbler(program)
+    garbled_tables = garbler.garble_gates(len(program))
+    return garbler.keys, garbler.pbits, garbled_tables
+
+
+def evaluate(program, g_tables, pbits_out, a_inputs, b_inputs):
+    """Evaluate a half-gates circuit with given inputs.
+
+    Args:
+        program: A compiled circuit.
+        g_tables: A dict mapping each AND-like gate to its garbled table.
+        pbits_out: The pbits of outputs.
+        a_inputs: A dict mapping Alice's wires to (key, encr_bit) inputs.
+        b_inputs: A dict mapping Bob's wires to (key, encr_bit) inputs.
+
+    Returns:
+        A dict mapping output wires with their result bit.
+    """
+    # Array of labels as integers indexed by wire
+    labels = program.load_inputs(
+        {w: int.from_bytes(key, "big") for w, (key, _) in a_inputs.items()},
+        {w: int.from_bytes(key, "big") for w, (key, _) in b_inputs.items()},
+    )
+
+    for gate_id, opcode, in0, in1, out in program.gates():
+        if opcode in FREE_GATES:
+            label = labels[in0]
+            if opcode != compiler.NOT:
+                label ^= labels[in1]
+            labels[out] = label
+            continue
+
+        table = g_tables[gate_id]
+        t_gen = int.from_bytes(table[:LABEL_SIZE], "big")
+        t_eval = int.from_bytes(table[LABEL_SIZE:TABLE_SIZE], "big")
+        a, b = labels[in0], labels[in1]
+
+        w_gen = hash_label(a, 2 * gate_id) ^ (t_gen * (a & 1))
+        w_eval = hash_label(b, 2 * gate_id + 1) ^ ((t_eval ^ a) * (b & 1))
+        labels[out] = w_gen ^ w_eval
+
+    return {
+        out: (labels[i] & 1) ^ pbits_out[out]
+        for out, i in zip(program.out, program.out_index)
+    }
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 import logging
+import codec
+import compiler
 import ot
 import util
 import yao
 from abc import ABC, abstractmethod
 import time
-import base64
 
 
 logging.basicConfig(format="[%(levelname)s] %(message)s",
@@ -14,16 +15,32 @@ logging.basicConfig(format="[%(levelname)s] %(message)s",
 
 class YaoGarbler(ABC):
     """An abstract class for Yao garblers (e.g. Alice)."""
-    def __init__(self, circuits):
+    def __init__(self, circuits, scheme="classic", workers=1):
+        programs = compiler.load_compiled(circuits)
         circuits = util.parse_json(circuits)
         self.name = circuits["name"]
+        self.scheme = scheme
         self.circuits = []
 
-        for circuit in circuits["circuits"]:
-            garbled_circuit = yao.GarbledCircuit(circuit)
+        if workers != 1:
+            garbled_circuits = yao.garble_circuits(circuits["circuits"],
+                                                   programs,
+                                                   scheme=scheme,
+                                                   workers=workers)
+        else:
+            garbled_circuits = [
+                yao.GarbledCircuit(circuit, scheme=scheme, program=program)
+                for circuit, program in zip(circuits["circuits"], programs)
+            ]
+
+        for circuit, program, garbled_circuit in zip(circuits["circuits"],
+                                                     programs,
+                                                     garbled_circuits):
             pbits = garbled_circuit.get_pbits()
             entry = {
                 "circuit": circuit,
+                "program": program,
+                "scheme": scheme,
                 "garbled_circuit": garbled_circuit,
                 "garbled_tables": garbled_circuit.get_garbled_tables(),
                 "keys": garbled_circuit.get_keys(),
@@ -53,10 +70,17 @@ class Alice(YaoGarbler):
         circuits: the JSON file containing circuits
         oblivious_transfer: Optional; enable the Oblivious Transfer protocol
             (True by default).
+        scheme: Optional; the garbling scheme ('classic' by default).
+        workers: Optional; the number of processes garbling circuits, one
+            per CPU if 0 (1 by default).
     """
-    def __init__(self, circuits, oblivious_transfer=False):
+    def __init__(self,
+                 circuits,
+                 oblivious_transfer=False,
+                 scheme="classic",
+                 workers=1):
         alice_start = time.time()
-        super().__init__(circuits)
+        super().__init__(circuits, scheme=scheme, workers=workers)
         alice_end = time.time()
         print(f"Garble time: {alice_end - alice_start}")
         send_start = time.time()
@@ -70,11 +94,12 @@ class Alice(YaoGarbler):
         for circuit in self.circuits:
             to_send = {
                 "circuit": circuit["circuit"],
-                "garbled_tables": circuit["garbled_tables"],
                 "pbits_out": circuit["pbits_out"],
             }
+            frames = codec.pack_garbled_tables(circuit["garbled_tables"],
+                                               circuit["scheme"])
             logging.debug(f"Sending {circuit['circuit']['id']}")
-            self.socket.send_wait(to_send)
+            self.socket.send_wait(to_send, frames)
             self.print(circuit)
 
     def print(self, entry):
@@ -93,16 +118,17 @@ class Alice(YaoGarbler):
             w: self._get_encr_bits(pbits[w], key0, key1)
             for w, (key0, key1) in keys.items() if w in b_wires
         }
+        scheme = entry["scheme"]
         b_bytes_keys = {
             w: self._get_encr_bits(pbits[w], 
-                                   list(base64.urlsafe_b64decode(key0)), 
-                                   list(base64.urlsafe_b64decode(key1)))
+                                   list(yao.key_to_bytes(key0, scheme)), 
+                                   list(yao.key_to_bytes(key1, scheme)))
             for w, (key0, key1) in keys.items() if w in b_wires
         }
         b_decode_keys = {
             w: self._get_encr_bits(pbits[w], 
-                                   int.from_bytes(base64.urlsafe_b64decode(key0), byteorder='big'), 
-                                   int.from_bytes(base64.urlsafe_b64decode(key1), byteorder='big'))
+                                   yao.key_to_int(key0, scheme), 
+                                   yao.key_to_int(key1, scheme))
             for w, (key0, key1) in keys.items() if w in b_wires
         }
         print(f"b_keys: {b_keys}")
@@ -173,7 +199,8 @@ class Bob:
             entry: A dict representing the circuit to evaluate.
         """
         circuit, pbits_out = entry["circuit"], entry["pbits_out"]
-        garbled_tables = entry["garbled_tables"]
+        garbled_tables, scheme = codec.unpack_garbled_tables(entry["frames"])
+        program = compiler.compile_circuit(circuit)  # compiled once
         a_wires = circuit.get("alice", [])  # list of Alice's wires
         b_wires = circuit.get("bob", [])  # list of Bob's wires
         print(f"Bobs wires: {b_wires}")
@@ -192,8 +219,8 @@ class Bob:
             }
 
             # Evaluate and send result to Alice
-            self.ot.send_result(circuit, garbled_tables, pbits_out,
-                                b_inputs_clear)
+            self.ot.send_result(program, garbled_tables, pbits_out,
+                                b_inputs_clear, scheme)
 
 
 class LocalTest(YaoGarbler):
@@ -205,9 +232,16 @@ class LocalTest(YaoGarbler):
         circuits: the JSON file containing circuits
         print_mode: Print a clear version of the garbled tables or
             the circuit evaluation (the default).
+        scheme: Optional; the garbling scheme ('classic' by default).
+        workers: Optional; the number of processes garbling circuits, one
+            per CPU if 0 (1 by default).
     """
-    def __init__(self, circuits, print_mode="circuit"):
-        super().__init__(circuits)
+    def __init__(self,
+                 circuits,
+                 print_mode="circuit",
+                 scheme="classic",
+                 workers=1):
+        super().__init__(circuits, scheme=scheme, workers=workers)
         self._print_mode = print_mode
         self.modes = {
             "circuit": self._print_evaluation,
@@ -253,8 +287,8 @@ class LocalTest(YaoGarbler):
                 b_inputs[b_wires[i]] = (keys[b_wires[i]][bits_b[i]],
                                         pbits[b_wires[i]] ^ bits_b[i])
 
-            result = yao.evaluate(circuit, garbled_tables, pbits_out, a_inputs,
-                                  b_inputs)
+            result = yao.evaluate(entry["program"], garbled_tables, pbits_out,
+                                  a_inputs, b_inputs, entry["scheme"])
 
             # Format output
             str_bits_a = ' '.join(bits[:len(a_wires)])
@@ -285,18 +319,26 @@ def main(
     circuit_path="circuits/default.json",
     oblivious_transfer=False,
     print_mode="circuit",
+    scheme="classic",
+    workers=1,
     loglevel=logging.WARNING,
 ):
     logging.getLogger().setLevel(loglevel)
 
     if party == "alice":
-        alice = Alice(circuit_path, oblivious_transfer=False)
+        alice = Alice(circuit_path,
+                      oblivious_transfer=False,
+                      scheme=scheme,
+                      workers=workers)
         alice.start()
     elif party == "bob":
         bob = Bob(oblivious_transfer=False)
         bob.listen()
     elif party == "local":
-        local = LocalTest(circuit_path, print_mode=print_mode)
+        local = LocalTest(circuit_path,
+                          print_mode=print_mode,
+                          scheme=scheme,
+                          workers=workers)
         local.start()
     else:
         logging.error(f"Unknown party '{party}'")
@@ -334,6 +376,22 @@ if __name__ == '__main__':
             choices=["circuit", "table"],
             default="circuit",
             help="the print mode for local tests (default 'circuit')")
+        parser.add_argument(
+            "-s",
+            "--scheme",
+            metavar="scheme",
+            choices=yao.SCHEMES,
+            default="classic",
+            help="the garbling scheme for alice and local tests "
+            "(default 'classic')")
+        parser.add_argument(
+            "-j",
+            "--workers",
+            metavar="workers",
+            type=int,
+            default=1,
+            help="the number of processes garbling circuits, 0 for one per "
+            "CPU (default 1)")
         parser.add_argument("-l",
                             "--loglevel",
                             metavar="level",
@@ -346,6 +404,8 @@ if __name__ == '__main__':
             circuit_path=parser.parse_args().circuit,
             oblivious_transfer=not parser.parse_args().no_oblivious_transfer,
             print_mode=parser.parse_args().m,
+            scheme=parser.parse_args().scheme,
+            workers=parser.parse_args().workers,
             loglevel=loglevels[parser.parse_args().loglevel],
         )
 
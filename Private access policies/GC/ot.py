@@ -1,15 +1,37 @@
 import hashlib
 import logging
 import pickle
+import secrets
+from . import codec
+from . import compiler
 from . import util
 from . import yao
 import time
 
+OT_SECURITY = 128  # number of base OTs for OT extension
+SEED_SIZE = 16  # size in bytes of the base OT seeds
+
 
 class ObliviousTransfer:
-    def __init__(self, socket, enabled=True):
+    """Oblivious transfer of Bob's input keys.
+
+    With OT extension, OT_SECURITY public-key base OTs are run once per
+    session. Every batch of Bob's wires is then transferred with IKNP OT
+    extension in a single message exchange using symmetric crypto only.
+
+    Args:
+        socket: The socket of the party.
+        enabled: Optional; enable the Oblivious Transfer protocol.
+        extension: Optional; use OT extension instead of one public-key OT
+            per wire.
+    """
+    def __init__(self, socket, enabled=True, extension=True):
         self.socket = socket
         self.enabled = enabled
+        self.extension = extension
+        self.base = None  # base OT seeds, set up on first transfer
+        self.group = None  # group of public-key OTs, set up on first OT
+        self.batch = 0  # number of OT extension batches so far
 
     def get_result(self, a_inputs, b_keys):
         """Send Alice's inputs and retrieve Bob's result of evaluation.
@@ -21,8 +43,15 @@ class ObliviousTransfer:
         Returns:
             The result of the yao circuit evaluation.
         """
+        if self.enabled and self.extension and self.base is None:
+            self.base_ot_garbler()
+
         logging.debug("Sending inputs to Bob")
-        self.socket.send_to_evaluator(a_inputs)
+        self.socket.send_to_evaluator({}, [codec.pack_labels(a_inputs)])
+
+        if self.enabled and self.extension:
+            self.ot_ext_garbler(b_keys)
+            return self.socket.receive_from_evaluator()
 
         for _ in range(len(b_keys)):
             w = self.socket.receive_from_evaluator()  # receive gate ID where to perform OT
@@ -39,17 +68,26 @@ class ObliviousTransfer:
 
         return self.socket.receive_from_evaluator()
 
-    def send_result(self, circuit, g_tables, pbits_out, b_inputs):
+    def send_result(self,
+                    circuit,
+                    g_tables,
+                    pbits_out,
+                    b_inputs,
+                    scheme="classic"):
         """Evaluate circuit and send the result to Alice.
 
         Args:
-            circuit: A dict containing circuit spec.
+            circuit: A dict containing circuit spec or a compiled circuit.
             g_tables: Garbled tables of yao circuit.
             pbits_out: p-bits of outputs.
             b_inputs: A dict mapping Bob's wires to (clear) input bits.
+            scheme: Optional; the garbling scheme of the circuit.
         """
+        if self.enabled and self.extension and self.base is None:
+            self.base_ot_evaluator()
+
         # map from Alice's wires to (key, encr_bit) inputs
-        a_inputs = self.socket.receive()
+        a_inputs = codec.unpack_labels(self.socket.receive()["frames"][0])
         # map from Bob's wires to (key, encr_bit) inputs
         b_inputs_encr = {}
         # map from Bob's wires to Alice's key pairs
@@ -57,22 +95,146 @@ class ObliviousTransfer:
 
         logging.debug("Received Alice's inputs")
 
-        for w, b_input in b_inputs.items():
-            logging.debug(f"Sending gate ID {w}")
-            self.socket.send(w)
+        if self.enabled and self.extension:
+            wires = list(b_inputs)
+            msgs = self.ot_ext_evaluator(wires, [b_inputs[w] for w in wires])
+            b_inputs_encr = {w: pickle.loads(m) for w, m in zip(wires, msgs)}
+        else:
+            for w, b_input in b_inputs.items():
+                logging.debug(f"Sending gate ID {w}")
+                self.socket.send(w)
 
-            if self.enabled:
-                b_inputs_encr[w] = pickle.loads(self.ot_evaluator(b_input))
-            else:
-                pair = self.socket.receive()
-                logging.debug(f"Received key pair, key {b_input} selected")
-                b_inputs_encr[w] = pair[b_input]
+                if self.enabled:
+                    b_inputs_encr[w] = pickle.loads(self.ot_evaluator(b_input))
+                else:
+                    pair = self.socket.receive()
+                    logging.debug(f"Received key pair, key {b_input} selected")
+                    b_inputs_encr[w] = pair[b_input]
 
         result = yao.evaluate(circuit, g_tables, pbits_out, a_inputs,
-                              b_inputs_encr)
+                              b_inputs_encr, scheme)
         logging.debug("Sending circuit evaluation")
         self.socket.send(result)
 
+    def get_results(self, a_inputs_list, b_keys, send_tables=None):
+        """Send a batch of Alice's inputs and retrieve all of Bob's results.
+
+        All of Alice's input sets go out in one framed message, Bob's keys
+        for the whole batch are transferred at once and the results come
+        back in one message, so the number of round trips does not depend
+        on the size of the batch.
+
+        Args:
+            a_inputs_list: A list of dicts mapping Alice's wires to
+                (key, encr_bit) inputs, one per evaluation.
+            b_keys: A dict mapping each Bob's wire to a pair (key, encr_bit).
+            send_tables: Optional; a function streaming the garbled tables
+                once the inputs are transferred, its last message being
+                answered with the results.
+
+        Returns:
+            A list of dicts mapping output wires with their result bit, one
+            per evaluation.
+        """
+        if self.enabled and self.extension and self.base is None:
+            self.base_ot_garbler()
+
+        logging.debug(f"Sending {len(a_inputs_list)} inputs to Bob")
+        frames = [codec.pack_labels(a_inputs) for a_inputs in a_inputs_list]
+        self.socket.send_to_evaluator({"batch": len(frames)}, frames)
+
+        if self.enabled and self.extension:
+            self.ot_ext_garbler(b_keys)
+        elif self.enabled:
+            for _ in range(len(b_keys) * len(a_inputs_list)):
+                w = self.socket.receive_from_evaluator()
+                pair = (pickle.dumps(b_keys[w][0]), pickle.dumps(b_keys[w][1]))
+                self.ot_garbler(pair)
+        else:
+            wires = self.socket.receive_from_evaluator()
+            self.socket.send_to_evaluator(
+                {w: (b_keys[w][0], b_keys[w][1])
+                 for w in wires})
+
+        if send_tables is not None:
+            # Bob acknowledges the inputs, then evaluates the garbled tables
+            # as they arrive
+            self.socket.receive_from_evaluator()
+            send_tables()
+
+        # Output bits of all evaluations, one byte per output wire
+        message = self.socket.receive_from_evaluator()
+        outputs, bits = message["out"], message["frames"][0]
+        size = len(outputs)
+        return [
+            dict(zip(outputs, bits[i * size:(i + 1) * size]))
+            for i in range(len(a_inputs_list))
+        ]
+
+    def send_results(self,
+                     circuit,
+                     g_tables,
+                     pbits_out,
+                     b_inputs_list,
+                     scheme="classic"):
+        """Evaluate circuit for a batch of inputs and send all the results.
+
+        Args:
+            circuit: A dict containing circuit spec or a compiled circuit.
+            g_tables: Garbled tables of yao circuit, or an iterable of chunks
+                of garbled tables received after the inputs.
+            pbits_out: p-bits of outputs, filled in at the end of the chunks
+                if streamed.
+            b_inputs_list: A list of dicts mapping Bob's wires to (clear)
+                input bits, one per evaluation, in the order of Alice's
+                batch.
+            scheme: Optional; the garbling scheme of the circuit.
+        """
+        if self.enabled and self.extension and self.base is None:
+            self.base_ot_evaluator()
+
+        message = self.socket.receive()
+        a_inputs_list = [
+            codec.unpack_labels(frame) for frame in message.get("frames", [])
+        ]
+        logging.debug(f"Received {len(a_inputs_list)} inputs of Alice")
+
+        # Bob's wires and input bits of the whole batch
+        batch = [(i, w, bit) for i, b_inputs in enumerate(b_inputs_list)
+                 for w, bit in b_inputs.items()]
+        b_inputs_encr = [{} for _ in b_inputs_list]
+
+        if self.enabled and self.extension:
+            msgs = self.ot_ext_evaluator([w for _, w, _ in batch],
+                                         [bit for _, _, bit in batch])
+            for (i, w, _), msg in zip(batch, msgs):
+                b_inputs_encr[i][w] = pickle.loads(msg)
+        elif self.enabled:
+            for i, w, bit in batch:
+                self.socket.send(w)
+                b_inputs_encr[i][w] = pickle.loads(self.ot_evaluator(bit))
+        else:
+            pairs = self.socket.send_wait(list({w for _, w, _ in batch}))
+            for i, w, bit in batch:
+                b_inputs_encr[i][w] = pairs[w][bit]
+
+        if not isinstance(g_tables, dict):
+            # Tables are only sent once the inputs are acknowledged, and
+            # shared by all evaluations of the batch
+            self.socket.send(True)
+            g_tables = yao.TableStream(g_tables)
+            pbits_out = yao.PendingBits(pbits_out, g_tables)
+
+        program = compiler.compile_circuit(circuit)
+        bits = bytearray()
+        for a_inputs, b_inputs in zip(a_inputs_list, b_inputs_encr):
+            result = yao.evaluate(program, g_tables, pbits_out, a_inputs,
+                                  b_inputs, scheme)
+            bits.extend(result[out] for out in program.out)
+
+        logging.debug("Sending circuit evaluations")
+        self.socket.send({"out": program.out}, [bytes(bits)])
+
     def ot_garbler(self, msgs):
         """Oblivious transfer, Alice's side.
 
@@ -80,8 +242,11 @@ class ObliviousTransfer:
             msgs: A pair (msg1, msg2) to suggest to Bob.
         """
         logging.debug("OT protocol started")
-        G = util.PrimeGroup()
-        self.socket.send_wait(G)
+        # Group parameters are negotiated by name once per connection
+        if self.group is None:
+            self.group = util.get_group()
+            self.socket.send_wait(self.group.name)
+        G = self.group
 
         # OT protocol based on Nigel Smart’s "Cryptography Made Simple"
         c = G.gen_pow(G.rand_int())
@@ -105,8 +270,10 @@ class ObliviousTransfer:
             The message selected by Bob.
         """
         logging.debug("OT protocol started")
-        G = self.socket.receive()
-        self.socket.send(True)
+        if self.group is None:
+            self.group = util.get_group(self.socket.receive())
+            self.socket.send(True)
+        G = self.group
 
         # OT protocol based on Nigel Smart’s "Cryptography Made Simple"
         c = self.socket.receive()
@@ -121,6 +288,152 @@ class ObliviousTransfer:
         logging.debug("OT protocol ended")
         return mb
 
+    def base_ot_garbler(self):
+        """Base OTs for OT extension, Alice's side.
+
+        Alice is the receiver of the base OTs: for each of the OT_SECURITY
+        pairs of seeds of Bob, she learns the seed selected by a random bit
+        of her secret vector s.
+        """
+        logging.debug("Base OTs started")
+        # Group parameters are negotiated by name once per session
+        name, c = self.socket.send_wait_to_evaluator("base_ot")
+        G = util.get_group(name)
+        choices = secrets.randbits(OT_SECURITY)  # Alice's secret vector s
+        xs = [G.rand_int() for _ in range(OT_SECURITY)]
+        h0s = []
+        for i, x in enumerate(xs):
+            x_pow = G.gen_pow(x)
+            h0s.append(G.mul(c, G.inv(x_pow)) if (choices >> i) & 1 else x_pow)
+
+        ciphertexts = self.socket.send_wait_to_evaluator(h0s)
+        seeds = []
+        for i, (x, (c1, e0, e1)) in enumerate(zip(xs, ciphertexts)):
+            e = e1 if (choices >> i) & 1 else e0
+            seeds.append(util.xor_bytes(e, self.ot_hash(G.pow(c1, x),
+                                                        len(e))))
+
+        self.base = (choices, seeds)
+        logging.debug("Base OTs ended")
+
+    def base_ot_evaluator(self):
+        """Base OTs for OT extension, Bob's side.
+
+        Bob is the sender of the base OTs and offers OT_SECURITY pairs of
+        random seeds to Alice.
+        """
+        logging.debug("Base OTs started")
+        self.socket.receive()
+        G = util.get_group()
+        c = G.gen_pow(G.rand_int())
+        self.socket.send((G.name, c))
+
+        seeds = [(secrets.token_bytes(SEED_SIZE),
+                  secrets.token_bytes(SEED_SIZE)) for _ in range(OT_SECURITY)]
+        h0s = self.socket.receive()
+        ciphertexts = []
+        for h0, (m0, m1) in zip(h0s, seeds):
+            h1 = G.mul(c, G.inv(h0))
+            k = G.rand_int()
+            e0 = util.xor_bytes(m0, self.ot_hash(G.pow(h0, k), len(m0)))
+            e1 = util.xor_bytes(m1, self.ot_hash(G.pow(h1, k), len(m1)))
+            ciphertexts.append((G.gen_pow(k), e0, e1))
+        self.socket.send(ciphertexts)
+
+        self.base = seeds
+        logging.debug("Base OTs ended")
+
+    def ot_ext_garbler(self, b_keys):
+        """IKNP OT extension, Alice's side.
+
+        Args:
+            b_keys: A dict mapping each Bob's wire to a pair (key, encr_bit).
+        """
+        logging.debug("OT extension started")
+        choices, seeds = self.base
+        wires, columns = self.socket.receive_from_evaluator()
+        m = len(wires)
+
+        # q_i = G(k_i^{s_i}) ^ s_i * u_i, so that q_j = t_j ^ r_j * s
+        q = [
+            self.ot_prg(seed, self.batch, m) ^ (u * ((choices >> i) & 1))
+            for i, (seed, u) in enumerate(zip(seeds, columns))
+        ]
+        rows = self.transpose(q, m)
+
+        to_send = []
+        for j, (w, row) in enumerate(zip(wires, rows)):
+            msg0, msg1 = pickle.dumps(b_keys[w][0]), pickle.dumps(b_keys[w][1])
+            to_send.append((
+                util.xor_bytes(msg0, self.ot_row_hash(self.batch, j, row,
+                                                      len(msg0))),
+                util.xor_bytes(msg1, self.ot_row_hash(self.batch, j,
+                                                      row ^ choices,
+                                                      len(msg1))),
+            ))
+        self.batch += 1
+        self.socket.send_to_evaluator(to_send)
+        logging.debug("OT extension ended")
+
+    def ot_ext_evaluator(self, wires, bits):
+        """IKNP OT extension, Bob's side.
+
+        Args:
+            wires: The list of Bob's wires to transfer.
+            bits: Bob's input bit for each wire.
+
+        Returns:
+            The list of messages selected by Bob.
+        """
+        logging.debug("OT extension started")
+        m = len(wires)
+        r = sum(bit << j for j, bit in enumerate(bits))  # choice vector
+
+        # t_i = G(k_i^0) and u_i = t_i ^ G(k_i^1) ^ r
+        t = [self.ot_prg(k0, self.batch, m) for k0, _ in self.base]
+        columns = [
+            t_i ^ self.ot_prg(k1, self.batch, m) ^ r
+            for t_i, (_, k1) in zip(t, self.base)
+        ]
+        self.socket.send((wires, columns))
+        ciphertexts = self.socket.receive()
+        rows = self.transpose(t, m)
+
+        msgs = []
+        for j, (bit, row) in enumerate(zip(bits, rows)):
+            e = ciphertexts[j][bit]
+            msgs.append(util.xor_bytes(e, self.ot_row_hash(self.batch, j, row,
+                                                            len(e))))
+        self.batch += 1
+        logging.debug("OT extension ended")
+        return msgs
+
+    @staticmethod
+    def ot_prg(seed, batch, num_bits):
+        """Expand a base OT seed into num_bits pseudo-random bits."""
+        data = hashlib.shake_256(seed + batch.to_bytes(8, "big")).digest(
+            (num_bits + 7) // 8)
+        return int.from_bytes(data, "big") & ((1 << num_bits) - 1)
+
+    @staticmethod
+    def ot_row_hash(batch, index, row, msg_length):
+        """Hash function for the rows of the OT extension matrix."""
+        data = (batch.to_bytes(8, "big") + index.to_bytes(8, "big") +
+                row.to_bytes(OT_SECURITY // 8, "big"))
+        return hashlib.shake_256(data).digest(msg_length)
+
+    @staticmethod
+    def transpose(columns, num_rows):
+        """Transpose a bit matrix given as a list of integer columns."""
+        rows = [0] * num_rows
+        for i, column in enumerate(columns):
+            while column:
+                low = column & -column
+                j = low.bit_length() - 1
+                rows[j] |= 1 << i
+                column ^= low
+        return rows
+
     @staticmethod
     def ot_hash(pub_key, msg_length):
         """Hash function for OT keys."""
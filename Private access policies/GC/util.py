@@ -1,15 +1,31 @@
+import functools
+import itertools
 import json
 import operator
-import random
+import pickle
 import secrets
 import sympy
 import zmq
+import zmq.asyncio
 
 # SOCKET
 LOCAL_PORT = 4080
 SERVER_HOST = "localhost"
 SERVER_PORT = 4080
 GARBLER_PORT = 4081
+# Ports of the multi-client session servers
+EVALUATOR_SESSION_PORT = 4082
+GARBLER_SESSION_PORT = 4083
+REQUEST_ID_SIZE = 8  # size in bytes of a session request ID
+
+
+def _load_message(parts):
+    """Unpickle a message, attaching any following binary frames to it."""
+    msg = pickle.loads(parts[0].buffer)
+    if len(parts) > 1:
+        msg["frames"] = [part.buffer for part in parts[1:]]
+    return msg
+
 
 class Socket:
     def __init__(self, socket_type):
@@ -17,14 +33,27 @@ class Socket:
         self.poller = zmq.Poller()
         self.poller.register(self.socket, zmq.POLLIN)
 
-    def send(self, msg):
-        self.socket.send_pyobj(msg)
+    def send(self, msg, frames=None):
+        """Send a pickled message, followed by raw binary frames if any.
+
+        Frames are sent without copying them into ZeroMQ buffers.
+        """
+        self.send_serialized(pickle.dumps(msg), frames)
+
+    def send_serialized(self, data, frames=None):
+        """Send an already pickled message, followed by raw frames if any."""
+        self.socket.send_multipart([data] + list(frames or []), copy=False)
 
     def receive(self):
-        return self.socket.recv_pyobj()
+        """Receive a pickled message.
+
+        Raw binary frames following the message are attached to it as a
+        list of memoryviews under the 'frames' key.
+        """
+        return _load_message(self.socket.recv_multipart(copy=False))
 
-    def send_wait(self, msg):
-        self.send(msg)
+    def send_wait(self, msg, frames=None):
+        self.send(msg, frames)
         return self.receive()
 
     """
@@ -36,7 +65,7 @@ class Socket:
             while True:
                 obj = dict(self.poller.poll(timetick))
                 if self.socket in obj and obj[self.socket] == zmq.POLLIN:
-                    yield self.socket.recv_pyobj()
+                    yield self.receive()
         except KeyboardInterrupt:
             pass
 
@@ -52,10 +81,10 @@ class GarblerSocket(Socket):
         self.socket.bind(server_endpoint)
         self.evaluator_socket = Socket(zmq.REQ)
         self.evaluator_socket.socket.connect(evaluator_endpoint)
-    def send_to_evaluator(self, message):
-        self.evaluator_socket.send(message)
-    def send_wait_to_evaluator(self, message):
-        response = self.evaluator_socket.send_wait(message)
+    def send_to_evaluator(self, message, frames=None):
+        self.evaluator_socket.send(message, frames)
+    def send_wait_to_evaluator(self, message, frames=None):
+        response = self.evaluator_socket.send_wait(message, frames)
         return response
     def receive_from_evaluator(self):
         return self.evaluator_socket.receive()
@@ -87,6 +116,91 @@ class UserSocket:
     def receive_from_evaluator(self):
         return self.evaluator_socket.receive()
 
+class AsyncServerSocket:
+    """An asyncio ROUTER socket serving many clients concurrently.
+
+    Requests are multipart messages [client, request_id, message, *frames]
+    where client is the identity ZeroMQ gives to each connected client.
+    Replies carry the same client and request ID, so that a client may
+    have several requests in flight and replies may be sent in any order.
+
+    Args:
+        endpoint: The endpoint to bind.
+    """
+    def __init__(self, endpoint):
+        self.socket = zmq.asyncio.Context.instance().socket(zmq.ROUTER)
+        self.socket.bind(endpoint)
+
+    async def receive(self):
+        """Receive the next request as a tuple (client, request_id, msg)."""
+        parts = await self.socket.recv_multipart(copy=False)
+        client, request_id = parts[0].bytes, parts[1].bytes
+        return client, request_id, _load_message(parts[2:])
+
+    async def send(self, client, request_id, msg, frames=None):
+        """Send a pickled reply to a request of a client."""
+        await self.send_serialized(client, request_id, pickle.dumps(msg),
+                                   frames)
+
+    async def send_serialized(self, client, request_id, data, frames=None):
+        """Send an already pickled reply to a request of a client."""
+        await self.socket.send_multipart(
+            [client, request_id, data] + list(frames or []), copy=False)
+
+    def close(self):
+        self.socket.close()
+
+
+class ClientSocket:
+    """A DEALER socket sending numbered requests to an AsyncServerSocket.
+
+    Replies to other requests received while waiting for a given request
+    are kept until they are asked for.
+
+    Args:
+        endpoint: The endpoint to connect to.
+    """
+    def __init__(self, endpoint):
+        self.socket = zmq.Context.instance().socket(zmq.DEALER)
+        self.socket.connect(endpoint)
+        self.request_ids = itertools.count()
+        self.replies = {}  # map from request ID to pending replies
+
+    def send(self, msg, frames=None):
+        """Send a request and return its request ID."""
+        request_id = next(self.request_ids).to_bytes(REQUEST_ID_SIZE, "big")
+        self.socket.send_multipart(
+            [request_id, pickle.dumps(msg)] + list(frames or []),
+            copy=False)
+        return request_id
+
+    def receive(self, request_id):
+        """Receive the reply to a request."""
+        while request_id not in self.replies:
+            parts = self.socket.recv_multipart(copy=False)
+            self.replies[parts[0].bytes] = _load_message(parts[1:])
+        return self.replies.pop(request_id)
+
+    def send_wait(self, msg, frames=None):
+        return self.receive(self.send(msg, frames))
+
+
+class SessionUserSocket:
+    """User socket for the multi-client session servers.
+
+    It has the request/reply interface of UserSocket, but every exchange is
+    a single request answered by a single reply.
+    """
+    def __init__(self, garbler_endpoint=f"tcp://{SERVER_HOST}:{GARBLER_SESSION_PORT}", evaluator_endpoint=f"tcp://{SERVER_HOST}:{EVALUATOR_SESSION_PORT}"):
+        self.garbler_socket = ClientSocket(garbler_endpoint)
+        self.evaluator_socket = ClientSocket(evaluator_endpoint)
+
+    def send_wait_to_garbler(self, message):
+        return self.garbler_socket.send_wait(message)
+
+    def send_wait_to_evaluator(self, message):
+        return self.evaluator_socket.send_wait(message)
+
 # class UserSocket(Socket):
 #     def __init__(self, server_endpoint=f"tcp://{SERVER_HOST}:{GARBLER_PORT}"):
 #         super().__init__(zmq.REQ)
@@ -100,6 +214,42 @@ class UserSocket:
 
 # PRIME GROUP
 PRIME_BITS = 64  # order of magnitude of prime in base 2
+DEFAULT_GROUP = "modp2048"  # group used for OT unless negotiated otherwise
+EXPONENT_BITS = 256  # size of random exponents in standard groups
+WINDOW_BITS = 6  # window size of fixed-base exponentiation tables
+
+# RFC 3526 MODP groups: name -> (safe prime p = 2q + 1, generator of order q)
+MODP_GROUPS = {
+    "modp2048": (int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
+        "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+        "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
+        "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3D"
+        "C2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+        "83655D23DCA3AD961C62F356208552BB9ED529077096966D"
+        "670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+        "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9"
+        "DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+        "15728E5A8AACAA68FFFFFFFFFFFFFFFF", 16), 2),
+    "modp3072": (int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
+        "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+        "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
+        "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3D"
+        "C2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+        "83655D23DCA3AD961C62F356208552BB9ED529077096966D"
+        "670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+        "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9"
+        "DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+        "15728E5A8AAAC42DAD33170D04507A33A85521ABDF1CBA64"
+        "ECFB850458DBEF0A8AEA71575D060C7DB3970F85A6E1E4C7"
+        "ABF5AE8CDB0933D71E8C94E04A25619DCEE3D2261AD2EE6B"
+        "F12FFA06D98A0864D87602733EC86A64521F2B18177B200C"
+        "BBE117577A615D6C770988C0BAD946E208E24FA074E5AB31"
+        "43DB5BFCE0FD108E4B82D120A93AD2CAFFFFFFFFFFFFFFFF", 16), 2),
+}
 
 
 def next_prime(num):
@@ -124,12 +274,27 @@ def bits(num, width):
 
 
 class PrimeGroup:
-    """Cyclic abelian group of prime order 'prime'."""
-    def __init__(self, prime=None):
+    """Cyclic abelian group of prime order 'prime'.
+
+    Args:
+        prime: Optional; the prime modulus, random if not provided.
+        generator: Optional; a generator, searched for if not provided.
+        exponent_bits: Optional; the size of random exponents, any exponent
+            in [1, prime - 1] if not provided.
+        name: Optional; the name of a standard group.
+    """
+    def __init__(self,
+                 prime=None,
+                 generator=None,
+                 exponent_bits=None,
+                 name=None):
         self.prime = prime or gen_prime(num_bits=PRIME_BITS)
         self.prime_m1 = self.prime - 1
         self.prime_m2 = self.prime - 2
-        self.generator = self.find_generator()
+        self.exponent_bits = exponent_bits
+        self.name = name
+        self.generator = generator or self.find_generator()
+        self.gen_table = None  # fixed-base table, built on first use
 
     def mul(self, num1, num2):
         "Multiply two elements." ""
@@ -140,16 +305,48 @@ class PrimeGroup:
         return pow(base, exponent, self.prime)
 
     def gen_pow(self, exponent):  # generator exponentiation
-        "Compute nth power of a generator." ""
-        return pow(self.generator, exponent, self.prime)
+        """Compute nth power of a generator.
+
+        Standard groups use a table of precomputed powers of the generator,
+        so that only one multiplication per window of the exponent is needed.
+        """
+        if not self.exponent_bits or exponent >> self.exponent_bits:
+            return pow(self.generator, exponent, self.prime)
+        if self.gen_table is None:
+            self.gen_table = self.build_gen_table()
+
+        mask = (1 << WINDOW_BITS) - 1
+        result = 1
+        for row in self.gen_table:
+            if not exponent:
+                break
+            digit = exponent & mask
+            if digit:
+                result = result * row[digit] % self.prime
+            exponent >>= WINDOW_BITS
+        return result
+
+    def build_gen_table(self):
+        """Precompute g^(d * 2^(WINDOW_BITS * i)) for every window i."""
+        table = []
+        base = self.generator
+        for _ in range(-(-self.exponent_bits // WINDOW_BITS)):
+            row = [1]
+            for _ in range(1, 1 << WINDOW_BITS):
+                row.append(row[-1] * base % self.prime)
+            table.append(row)
+            base = row[-1] * base % self.prime
+        return table
 
     def inv(self, num):
         "Multiplicative inverse of an element." ""
-        return pow(num, self.prime_m2, self.prime)
+        return pow(num, -1, self.prime)
 
     def rand_int(self):  # random int in [1, prime-1]
         "Return an random int in [1, prime - 1]." ""
-        return random.randint(1, self.prime_m1)
+        if self.exponent_bits:
+            return secrets.randbits(self.exponent_bits) or 1
+        return secrets.randbelow(self.prime_m1) + 1
 
     def find_generator(self):  # find random generator for group
         """Find a random generator for the group."""
@@ -164,6 +361,13 @@ class PrimeGroup:
                 return candidate
 
 
+@functools.lru_cache(maxsize=None)
+def get_group(name=DEFAULT_GROUP):
+    """Return a standard group, loaded once and shared by all transfers."""
+    prime, generator = MODP_GROUPS[name]
+    return PrimeGroup(prime, generator, EXPONENT_BITS, name)
+
+
 # HELPER FUNCTIONS
 def parse_json(json_path):
     with open(json_path) as json_file:
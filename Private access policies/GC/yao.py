@@ -1,6 +1,14 @@
+import base64
 import pickle
 import random
+from concurrent.futures import ProcessPoolExecutor
 from cryptography.fernet import Fernet
+from . import compiler
+from . import halfgates
+
+# Garbling schemes: Fernet-encrypted 4-row tables or free-XOR/half-gates
+SCHEMES = ("classic", "halfgates")
+CHUNK_SIZE = 1024  # number of gates per chunk when streaming a circuit
 
 
 def encrypt(key, data):
@@ -31,52 +39,128 @@ def decrypt(key, data):
     return f.decrypt(data)
 
 
-def evaluate(circuit, g_tables, pbits_out, a_inputs, b_inputs):
+def key_to_bytes(key, scheme="classic"):
+    """Return the raw bytes of a wire key.
+
+    Args:
+        key: A Fernet key (classic scheme) or a raw label (halfgates scheme).
+        scheme: Optional; the garbling scheme the key comes from.
+    """
+    if scheme == "classic":
+        return base64.urlsafe_b64decode(key)
+    return bytes(key)
+
+
+def key_to_int(key, scheme="classic"):
+    """Return a wire key as a big-endian integer.
+
+    Args:
+        key: A Fernet key (classic scheme) or a raw label (halfgates scheme).
+        scheme: Optional; the garbling scheme the key comes from.
+    """
+    return int.from_bytes(key_to_bytes(key, scheme), byteorder="big")
+
+
+class TableStream:
+    """A read-only view over a stream of garbled table chunks.
+
+    Chunks are pulled from the stream only when a gate that has not been
+    received yet is looked up. Since chunks follow the topological order of
+    the gates, evaluation can start as soon as the first chunk arrives.
+
+    Args:
+        chunks: An iterable of dicts mapping gates to their garbled table.
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.tables = {}  # garbled tables received so far
+
+    def __getitem__(self, gate_id):
+        while gate_id not in self.tables:
+            try:
+                self.tables.update(next(self.chunks))
+            except StopIteration:
+                raise KeyError(gate_id) from None
+        return self.tables[gate_id]
+
+    def drain(self):
+        """Pull the remaining chunks, the stream being exhausted after."""
+        for chunk in self.chunks:
+            self.tables.update(chunk)
+
+
+class PendingBits:
+    """A read-only view over output p-bits sent at the end of a stream.
+
+    The last gates of a circuit may need no garbled table, so the stream is
+    drained before the first p-bit is looked up.
+
+    Args:
+        pbits_out: A dict filled with the output p-bits once the stream is
+            exhausted.
+        stream: The TableStream the p-bits follow.
+    """
+    def __init__(self, pbits_out, stream):
+        self.pbits_out = pbits_out
+        self.stream = stream
+
+    def __getitem__(self, wire):
+        self.stream.drain()
+        return self.pbits_out[wire]
+
+
+def evaluate(circuit,
+             g_tables,
+             pbits_out,
+             a_inputs,
+             b_inputs,
+             scheme="classic"):
     """Evaluate yao circuit with given inputs.
 
     Args:
-        circuit: A dict containing circuit spec.
-        g_tables: The yao circuit garbled tables.
-        pbits_out: The pbits of outputs.
+        circuit: A dict containing circuit spec or a compiled circuit.
+        g_tables: The yao circuit garbled tables, a TableStream, or an
+            iterable of chunks of garbled tables consumed as evaluation
+            progresses.
+        pbits_out: The pbits of outputs, or a PendingBits after a stream.
         a_inputs: A dict mapping Alice's wires to (key, encr_bit) inputs.
         b_inputs: A dict mapping Bob's wires to (key, encr_bit) inputs.
+        scheme: Optional; the garbling scheme used to create g_tables.
 
     Returns:
         A dict mapping output wires with their result bit.
     """
-    gates = circuit["gates"]  # dict containing circuit gates
-    wire_outputs = circuit["out"]  # list of output wires
-    wire_inputs = {}  # dict containing Alice and Bob inputs
-    evaluation = {}  # dict containing result of evaluation
-
-    wire_inputs.update(a_inputs)
-    wire_inputs.update(b_inputs)
-
-    # Iterate over all gates
-    for gate in sorted(gates, key=lambda g: g["id"]):
-        gate_id, gate_in, msg = gate["id"], gate["in"], None
+    program = compiler.compile_circuit(circuit)
+    if not isinstance(g_tables, (dict, TableStream)):
+        g_tables = TableStream(g_tables)
+    if scheme == "halfgates":
+        return halfgates.evaluate(program, g_tables, pbits_out, a_inputs,
+                                  b_inputs)
+
+    # Array of (key, encr_bit) indexed by wire, filled with the inputs
+    wires = program.load_inputs(a_inputs, b_inputs)
+
+    # Gates are already in topological order
+    for gate_id, opcode, in0, in1, out in program.gates():
+        key_a, encr_bit_a = wires[in0]
         # Special case if it's a NOT gate
-        if (len(gate_in) < 2) and (gate_in[0] in wire_inputs):
-            # Fetch input key associated with the gate's input wire
-            key_in, encr_bit_in = wire_inputs[gate_in[0]]
+        if opcode == compiler.NOT:
             # Fetch the encrypted message in the gate's garbled table
-            encr_msg = g_tables[gate_id][(encr_bit_in, )]
+            encr_msg = g_tables[gate_id][(encr_bit_a, )]
             # Decrypt message
-            msg = decrypt(key_in, encr_msg)
+            msg = decrypt(key_a, encr_msg)
         # Else the gate has two input wires (same model)
-        elif (gate_in[0] in wire_inputs) and (gate_in[1] in wire_inputs):
-            key_a, encr_bit_a = wire_inputs[gate_in[0]]
-            key_b, encr_bit_b = wire_inputs[gate_in[1]]
+        else:
+            key_b, encr_bit_b = wires[in1]
             encr_msg = g_tables[gate_id][(encr_bit_a, encr_bit_b)]
             msg = decrypt(key_b, decrypt(key_a, encr_msg))
-        if msg:
-            wire_inputs[gate_id] = pickle.loads(msg)
+        wires[out] = pickle.loads(msg)
 
     # After all gates have been evaluated, we populate the dict of results
-    for out in wire_outputs:
-        evaluation[out] = wire_inputs[out][1] ^ pbits_out[out]
-
-    return evaluation
+    return {
+        out: wires[i][1] ^ pbits_out[out]
+        for out, i in zip(program.out, program.out_index)
+    }
 
 
 class GarbledGate:
@@ -189,15 +273,103 @@ class GarbledGate:
         return self.garbled_table
 
 
+def garble_gates(gates, keys, pbits):
+    """Garble classic gates, in a worker process if need be.
+
+    Args:
+        gates: A list of gate specs.
+        keys: A dict mapping (at least) the wires of the gates to their pair
+            of keys.
+        pbits: A dict mapping (at least) the wires of the gates to their
+            p-bit.
+
+    Returns:
+        A dict mapping each gate to its garbled table.
+    """
+    return {
+        gate["id"]: GarbledGate(gate, keys, pbits).get_garbled_table()
+        for gate in gates
+    }
+
+
+def garble_circuit(circuit, scheme, program):
+    """Garble a whole circuit, in a worker process if need be."""
+    return GarbledCircuit(circuit, scheme=scheme, program=program)
+
+
+def garble_circuits(circuits, programs, scheme="classic", workers=None):
+    """Garble independent circuits over a pool of processes.
+
+    Circuits are garbled in parallel. The gates of a large classic circuit
+    are also spread over the pool in chunks, since all its keys and p-bits
+    are drawn before any table is garbled. Half-gates circuits are only
+    garbled in parallel as a whole, the labels of a gate output depending
+    on the labels of its inputs.
+
+    Args:
+        circuits: A list of dicts containing circuit spec.
+        programs: The compiled circuits, in the same order.
+        scheme: Optional; the garbling scheme, one of SCHEMES.
+        workers: Optional; the number of processes, one per CPU if 0 or
+            not provided.
+
+    Returns:
+        A list of GarbledCircuit, in the order of circuits.
+    """
+    with ProcessPoolExecutor(workers or None) as executor:
+        futures = []
+        for circuit, program in zip(circuits, programs):
+            if scheme == "classic" and len(program) > CHUNK_SIZE:
+                futures.append(None)  # garbled in chunks below
+            else:
+                futures.append(
+                    executor.submit(garble_circuit, circuit, scheme,
+                                    program))
+
+        garbled_circuits = []
+        for circuit, program, future in zip(circuits, programs, futures):
+            if future is None:
+                garbled_circuits.append(
+                    GarbledCircuit(circuit,
+                                   scheme=scheme,
+                                   program=program,
+                                   executor=executor))
+            else:
+                garbled_circuits.append(future.result())
+
+    return garbled_circuits
+
+
 class GarbledCircuit:
     """A representation of a garbled circuit.
 
     Args:
         circuit: A dict containing circuit spec.
-        pbits: Optional; a dict of p-bits for the given circuit.
+        pbits: Optional; a dict of p-bits for the given circuit. Ignored by
+            the halfgates scheme where p-bits are derived from the labels.
+        scheme: Optional; the garbling scheme, one of SCHEMES.
+        program: Optional; the compiled circuit, compiled on the fly if
+            not provided.
+        stream: Optional; defer the garbled tables to garbled_chunks()
+            instead of garbling the whole circuit up front.
+        executor: Optional; an executor to garble the gates of a classic
+            circuit in chunks of CHUNK_SIZE gates.
     """
-    def __init__(self, circuit, pbits={}):
+    def __init__(self,
+                 circuit,
+                 pbits={},
+                 scheme="classic",
+                 program=None,
+                 stream=False,
+                 executor=None):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown garbling scheme '{scheme}', "
+                             f"must be in {list(SCHEMES)}")
         self.circuit = circuit
+        self.scheme = scheme
+        if program is None:
+            program = compiler.compile_circuit(circuit)
+        self.program = program
         self.gates = circuit["gates"]  # list of gates
         self.wires = set()  # list of circuit wires
 
@@ -211,9 +383,19 @@ class GarbledCircuit:
             self.wires.update(set(gate["in"]))
         self.wires = list(self.wires)
 
+        if scheme == "halfgates":
+            # Labels of gate outputs are only known once gates are garbled
+            self._garbler = halfgates.Garbler(self.program)
+            self.keys, self.pbits = self._garbler.keys, self._garbler.pbits
+            if not stream:
+                self.garbled_tables = self._garbler.garble_gates(
+                    len(self.program))
+            return
+
         self._gen_pbits(pbits)
         self._gen_keys()
-        self._gen_garbled_tables()
+        if not stream:
+            self._gen_garbled_tables(executor)
 
     def _gen_pbits(self, pbits):
         """Create a dict mapping each wire to a random p-bit."""
@@ -227,16 +409,67 @@ class GarbledCircuit:
         for wire in self.wires:
             self.keys[wire] = (Fernet.generate_key(), Fernet.generate_key())
 
-    def _gen_garbled_tables(self):
-        """Create the garbled table of each gate."""
-        for gate in self.gates:
-            garbled_gate = GarbledGate(gate, self.keys, self.pbits)
-            self.garbled_tables[gate["id"]] = garbled_gate.get_garbled_table()
+    def _gen_garbled_tables(self, executor=None):
+        """Create the garbled table of each gate.
+
+        Args:
+            executor: Optional; an executor to garble chunks of gates with.
+        """
+        if executor is None:
+            self.garbled_tables = garble_gates(self.gates, self.keys,
+                                               self.pbits)
+            return
+
+        futures = []
+        for start in range(0, len(self.gates), CHUNK_SIZE):
+            gates = self.gates[start:start + CHUNK_SIZE]
+            # Only send the keys and p-bits of the wires of the chunk
+            wires = {w for gate in gates for w in gate["in"] + [gate["id"]]}
+            futures.append(
+                executor.submit(garble_gates, gates,
+                                {w: self.keys[w] for w in wires},
+                                {w: self.pbits[w] for w in wires}))
+        for future in futures:
+            self.garbled_tables.update(future.result())
+
+    def garbled_chunks(self, chunk_size=CHUNK_SIZE):
+        """Garble the circuit in chunks of gates in topological order.
+
+        Chunks are generated lazily and not kept, so only one chunk is held
+        in memory at a time. With the halfgates scheme, keys and p-bits of
+        gate outputs are filled in as their gates are garbled.
+
+        Args:
+            chunk_size: Optional; the number of gates per chunk.
+
+        Yields:
+            Dicts mapping each gate of the chunk to its garbled table.
+        """
+        if self.scheme == "halfgates":
+            while not self._garbler.done():
+                yield self._garbler.garble_gates(chunk_size)
+            return
+
+        gates = {gate["id"]: gate for gate in self.gates}
+        gate_ids = self.program.gate_ids
+        for start in range(0, len(gate_ids), chunk_size):
+            yield {
+                gate_id: GarbledGate(gates[gate_id], self.keys,
+                                     self.pbits).get_garbled_table()
+                for gate_id in gate_ids[start:start + chunk_size]
+            }
 
     def print_garbled_tables(self):
         """Print p-bits and a clear representation of all garbled tables."""
         print(f"======== {self.circuit['id']} ========")
         print(f"P-BITS: {self.pbits}")
+        if self.scheme == "halfgates":
+            for gate in self.gates:
+                table = self.garbled_tables.get(gate["id"])
+                print(f"GATE: {gate['id']}, TYPE: {gate['type']}")
+                print(f"[T_G, T_E]: {table.hex() if table else 'free'}")
+            print()
+            return
         for gate in self.gates:
             garbled_table = GarbledGate(gate, self.keys, self.pbits)
             garbled_table.print_garbled_table()
@@ -253,3 +486,7 @@ class GarbledCircuit:
     def get_keys(self):
         """Return dict mapping each wire to its pair of keys."""
         return self.keys
+
+    def get_program(self):
+        """Return the compiled circuit."""
+        return self.program
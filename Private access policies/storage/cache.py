@@ -0,0 +1,167 @@
+import collections
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import Future
+
+from .container import read_chunks
+from .ipfs import CHUNK_SIZE, Storage, _write_atomic
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".heimdall", "cache")
+MAX_BYTES = 1 << 30  # size bound of the cache
+
+
+class CachedStorage(Storage):
+    """A storage keeping the files it downloads in an on-disk cache.
+
+    CIDs are immutable, so a file downloaded once is served from the cache
+    afterwards. Downloads are checked against their CID where the storage
+    gives the digest of a CID, and are not cached if they do not match.
+    Cached files are named <cid>.<sha256> and re-hashed on every read: a
+    file that no longer matches is dropped and downloaded again.
+    The least recently used files are evicted once the cache grows over
+    max_bytes, and concurrent downloads of the same CID share one transfer.
+
+    Args:
+        storage: The storage files are downloaded from and added to.
+        directory: Optional; the directory of the cache.
+        max_bytes: Optional; the size bound of the cache. The latest file is
+            always kept, even if larger.
+    """
+    def __init__(self, storage, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.storage = storage
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0  # bytes in the cache
+        # map from CID to (SHA-256, size), least recently used first
+        self._entries = collections.OrderedDict()
+        self._fetching = {}  # map from CID to the future of its download
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            cid, _, digest = name.rpartition(".")
+            if not cid or len(digest) != 64:
+                continue  # not a cached file, left alone
+            if self.storage.digest(cid) not in (None, digest):
+                continue  # not the content of its CID
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue  # evicted by another process
+            files.append((stat.st_mtime, cid, digest, stat.st_size))
+        for _, cid, digest, size in sorted(files):
+            self._entries[cid] = (digest, size)
+            self.size += size
+
+    def _path(self, cid, digest):
+        return os.path.join(self.directory, f"{cid}.{digest}")
+
+    def add(self, file_path):
+        return self.storage.add(file_path)
+
+    def digest(self, cid):
+        return self.storage.digest(cid)
+
+    def cat(self, cid, output_path):
+        while True:
+            with self._lock:
+                entry = self._entries.get(cid)
+                if entry:
+                    self._entries.move_to_end(cid)
+                else:
+                    future = self._fetching.get(cid)
+                    owner = future is None
+                    if owner:
+                        future = self._fetching[cid] = Future()
+
+            if entry:
+                try:
+                    if self._read(cid, entry, output_path):
+                        return output_path
+                except ValueError:
+                    pass
+                # Evicted by another process or corrupted: drop the entry,
+                # so that the next pass downloads the file again
+                self._discard(cid, entry)
+                continue
+            if owner:
+                try:
+                    self._fetch(cid)
+                    future.set_result(None)
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                finally:
+                    with self._lock:
+                        del self._fetching[cid]
+            else:
+                future.result()  # wait for the download of another thread
+
+    def _read(self, cid, entry, output_path):
+        # Copy a cached file to output_path, False if it was evicted
+        digest, _ = entry
+        try:
+            f = open(self._path(cid, digest), "rb")
+        except FileNotFoundError:
+            return False
+        os.utime(f.fileno())  # recently used, across restarts
+
+        def chunks():
+            sha256 = hashlib.sha256()
+            for chunk in read_chunks(f, CHUNK_SIZE):
+                sha256.update(chunk)
+                yield chunk
+            if sha256.hexdigest() != digest:
+                raise ValueError(f"Corrupted cache entry {cid}")
+
+        with f:
+            _write_atomic(chunks(), output_path)
+        return True
+
+    def _fetch(self, cid):
+        tmp_path = os.path.join(self.directory, uuid.uuid4().hex)
+        self.storage.cat(cid, tmp_path)
+        try:
+            sha256 = hashlib.sha256()
+            with open(tmp_path, "rb") as f:
+                for chunk in read_chunks(f, CHUNK_SIZE):
+                    sha256.update(chunk)
+            digest, size = sha256.hexdigest(), os.path.getsize(tmp_path)
+            if self.storage.digest(cid) not in (None, digest):
+                raise ValueError(f"Downloaded content does not match {cid}")
+            os.replace(tmp_path, self._path(cid, digest))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._entries[cid] = (digest, size)
+            self.size += size
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                old_cid, (old_digest, old_size) = self._entries.popitem(
+                    last=False)
+                self.size -= old_size
+                try:
+                    os.remove(self._path(old_cid, old_digest))
+                except FileNotFoundError:
+                    pass  # evicted by another process
+
+    def _discard(self, cid, entry):
+        with self._lock:
+            if self._entries.get(cid) != entry:
+                return  # already discarded by another thread
+            del self._entries[cid]
+            self.size -= entry[1]
+        try:
+            os.remove(self._path(cid, entry[0]))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.storage.close()
@@ -0,0 +1,222 @@
+import collections
+import itertools
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+MAGIC = b"HCT1"  # magic number of an encrypted container
+CHUNK_SIZE = 64 * 1024  # plaintext bytes per segment
+TAG_SIZE = 16  # bytes of the GCM tag of a segment
+
+# Header: magic, plaintext bytes per segment, random nonce prefix
+HEADER = struct.Struct(">4sI7s")
+# Nonce of a segment: nonce prefix, segment index, last segment flag
+NONCE = struct.Struct(">7sIB")
+
+
+def _nonce(prefix, index, last):
+    # The flag binds the position of the last segment, so that a truncated
+    # container fails to decrypt instead of decrypting to a prefix
+    return NONCE.pack(prefix, index, last)
+
+
+def _rechunk(chunks, size):
+    # Regroup an iterable of bytes into blocks of size bytes, the last one
+    # possibly shorter; yields a single empty block for an empty input
+    buffer = bytearray()
+    empty = True
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) < size:
+            continue
+        start = 0
+        with memoryview(buffer) as view:
+            while len(buffer) - start >= size:
+                yield bytes(view[start:start + size])
+                start += size
+        del buffer[:start]
+        empty = False
+    if buffer or empty:
+        yield bytes(buffer)
+
+
+def _lookahead(blocks):
+    # Yield (block, is_last) pairs
+    blocks = iter(blocks)
+    previous = next(blocks)
+    for block in blocks:
+        yield previous, False
+        previous = block
+    yield previous, True
+
+
+def _map_ordered(fn, args, workers):
+    # Apply fn to each tuple of args on a thread pool and yield the results
+    # in order. AES-GCM releases the GIL, so segments are sealed on all
+    # cores; at most 2 * workers segments are held waiting for their turn.
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for arg in args:
+            yield fn(*arg)
+        return
+    with ThreadPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for arg in args:
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, *arg))
+        while pending:
+            yield pending.popleft().result()
+
+
+def _parse_header(header):
+    if len(header) < HEADER.size:
+        raise ValueError("Truncated container header")
+    magic, chunk_size, prefix = HEADER.unpack(header)
+    if magic != MAGIC or not chunk_size:
+        raise ValueError("Not an encrypted container")
+    return chunk_size, prefix
+
+
+def read_chunks(f, size=CHUNK_SIZE):
+    """Yield the content of a binary file in blocks of size bytes."""
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def encrypt_stream(key, chunks, chunk_size=CHUNK_SIZE, workers=None):
+    """Encrypt a stream of bytes into a container.
+
+    The plaintext is split into segments of chunk_size bytes, each sealed
+    with AES-GCM under its own nonce, so that memory only depends on
+    chunk_size and segments can be decrypted independently.
+
+    Args:
+        key: A 16, 24 or 32 bytes AES key.
+        chunks: An iterable of plaintext bytes, of any size.
+        chunk_size: Optional; the plaintext bytes per segment.
+        workers: Optional; the number of threads sealing segments, one per
+            CPU if not provided.
+
+    Yields:
+        The header, then the encrypted segments.
+    """
+    aesgcm = AESGCM(key)
+    prefix = os.urandom(7)
+    header = HEADER.pack(MAGIC, chunk_size, prefix)
+    yield header
+
+    blocks = _lookahead(_rechunk(chunks, chunk_size))
+    yield from _map_ordered(aesgcm.encrypt, (
+        (_nonce(prefix, index, last), block, header)
+        for index, (block, last) in enumerate(blocks)
+    ), workers)
+
+
+def decrypt_stream(key, chunks, workers=None):
+    """Decrypt a container given as a stream of bytes.
+
+    Args:
+        key: The AES key of the container.
+        chunks: An iterable of container bytes, of any size.
+        workers: Optional; the number of threads opening segments, one per
+            CPU if not provided.
+
+    Yields:
+        The plaintext, one segment at a time.
+
+    Raises:
+        ValueError: The stream is not a container.
+        cryptography.exceptions.InvalidTag: A segment was modified,
+            reordered or removed.
+    """
+    aesgcm = AESGCM(key)
+    chunks = iter(chunks)
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= HEADER.size:
+            break
+    header = bytes(head[:HEADER.size])
+    chunk_size, prefix = _parse_header(header)
+
+    body = itertools.chain([bytes(head[HEADER.size:])], chunks)
+    segments = _lookahead(_rechunk(body, chunk_size + TAG_SIZE))
+    yield from _map_ordered(aesgcm.decrypt, (
+        (_nonce(prefix, index, last), segment, header)
+        for index, (segment, last) in enumerate(segments)
+    ), workers)
+
+
+def encrypt_file(key, file_path, encrypted_file_path=None,
+                 chunk_size=CHUNK_SIZE, workers=None):
+    """Encrypt a file into a container and return the container path."""
+    encrypted_file_path = encrypted_file_path or file_path + ".enc"
+    with open(file_path, "rb") as f, open(encrypted_file_path, "wb") as out:
+        for data in encrypt_stream(key, read_chunks(f, chunk_size),
+                                   chunk_size, workers):
+            out.write(data)
+    return encrypted_file_path
+
+
+def decrypt_file(key, encrypted_file_path, decrypted_file_path,
+                 workers=None):
+    """Decrypt a container into a file and return the file path.
+
+    The plaintext is written to a temporary file first, so that a corrupted
+    container never leaves a partially decrypted file behind.
+    """
+    tmp_path = decrypted_file_path + ".tmp"
+    try:
+        with open(encrypted_file_path, "rb") as f, \
+                open(tmp_path, "wb") as out:
+            for data in decrypt_stream(key, read_chunks(f), workers):
+                out.write(data)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, decrypted_file_path)
+    return decrypted_file_path
+
+
+def decrypt_range(key, encrypted_file_path, offset, length):
+    """Decrypt a byte range of the plaintext of a container.
+
+    Only the segments overlapping the range are read and decrypted.
+
+    Args:
+        key: The AES key of the container.
+        encrypted_file_path: The path of the container.
+        offset: The position of the range in the plaintext.
+        length: The size of the range, shorter past the end of the
+            plaintext.
+
+    Returns:
+        The plaintext bytes of the range.
+    """
+    if offset < 0 or length < 0:
+        raise ValueError("Negative offset or length")
+    aesgcm = AESGCM(key)
+    with open(encrypted_file_path, "rb") as f:
+        header = f.read(HEADER.size)
+        chunk_size, prefix = _parse_header(header)
+        segment_size = chunk_size + TAG_SIZE
+        body_size = os.fstat(f.fileno()).st_size - HEADER.size
+        count = max(-(-body_size // segment_size), 1)  # number of segments
+
+        first = offset // chunk_size
+        last = min((offset + length - 1) // chunk_size, count - 1)
+        plaintext = bytearray()
+        for index in range(first, last + 1):
+            f.seek(HEADER.size + index * segment_size)
+            segment = f.read(segment_size)
+            plaintext += aesgcm.decrypt(
+                _nonce(prefix, index, index == count - 1), segment, header)
+    start = offset - first * chunk_size
+    return bytes(plaintext[start:start + length])
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .container import read_chunks
+
+API_ADDRESS = "http://localhost:5001"  # HTTP API of the local IPFS node
+CHUNK_SIZE = 1 << 20  # bytes read or written at once
+POOL_SIZE = 8  # connections kept open to the node
+
+
+class Storage(ABC):
+    """An abstract class for content-addressed file storage."""
+
+    @abstractmethod
+    def add(self, file_path):
+        """Store a file and return its CID."""
+        pass
+
+    @abstractmethod
+    def cat(self, cid, output_path):
+        """Write the content of a CID to output_path and return the path."""
+        pass
+
+    def digest(self, cid):
+        """Return the SHA-256 hex digest the content of a CID must have.
+
+        None if the CID does not give the digest of the content directly,
+        the content is then trusted to match its CID.
+        """
+        return None
+
+    def add_many(self, file_paths, workers=None):
+        """Store many files in parallel.
+
+        Args:
+            file_paths: The paths of the files to store.
+            workers: Optional; the number of concurrent uploads, the size of
+                the connection pool if not provided.
+
+        Returns:
+            The CIDs of the files, in order.
+        """
+        with ThreadPoolExecutor(workers or POOL_SIZE) as executor:
+            return list(executor.map(self.add, file_paths))
+
+    def close(self):
+        pass
+
+
+def _write_atomic(chunks, output_path):
+    # Write then rename, so that a failed transfer never leaves a partial
+    # file behind
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class IpfsStorage(Storage):
+    """An IPFS node reached through its HTTP API.
+
+    All transfers share one HTTP session, so connections to the node are
+    opened once and reused. Files are streamed in chunks of CHUNK_SIZE
+    bytes to and from disk and never held in memory as a whole.
+
+    A CID is the multihash of the DAG of a file, not of its content, so
+    downloads are not checked here: the node checks every block it fetches
+    against its hash, and is trusted to return the content of the CID.
+
+    Args:
+        address: Optional; the address of the HTTP API of the node.
+        pool_size: Optional; the number of connections kept open.
+        timeout: Optional; the seconds to wait for the node to respond.
+    """
+    def __init__(self, address=API_ADDRESS, pool_size=POOL_SIZE, timeout=None):
+        self.address = address.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, command, **kwargs):
+        response = self.session.post(f"{self.address}/api/v0/{command}",
+                                     timeout=self.timeout,
+                                     **kwargs)
+        response.raise_for_status()
+        return response
+
+    def add(self, file_path):
+        # Chunked multipart body, read from disk as it is sent
+        boundary = uuid.uuid4().hex
+        name = os.path.basename(file_path)
+
+        def body():
+            yield (f"--{boundary}\r\n"
+                   f"Content-Disposition: form-data; name=\"file\"; "
+                   f"filename=\"{name}\"\r\n"
+                   "Content-Type: application/octet-stream\r\n\r\n").encode()
+            with open(file_path, "rb") as f:
+                yield from read_chunks(f, CHUNK_SIZE)
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        response = self._post(
+            "add",
+            data=body(),
+            headers={
+                "Content-Type": f"multipart/form-data; boundary={boundary}"
+            })
+        # One JSON object per added file, the last one being ours
+        return json.loads(response.text.splitlines()[-1])["Hash"]
+
+    def cat(self, cid, output_path):
+        with self._post("cat", params={"arg": cid}, stream=True) as response:
+            return _write_atomic(response.iter_content(CHUNK_SIZE),
+                                 output_path)
+
+    def close(self):
+        self.session.close()
+
+
+class LocalStorage(Storage):
+    """A local directory standing in for an IPFS node.
+
+    Files are stored under the SHA-256 of their content, which serves as
+    CID, so that the protocol can run without an IPFS daemon.
+
+    Args:
+        directory: The directory holding the files.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, file_path):
+        sha256 = hashlib.sha256()
+
+        def chunks():
+            with open(file_path, "rb") as f:
+                for chunk in read_chunks(f, CHUNK_SIZE):
+                    sha256.update(chunk)
+                    yield chunk
+
+        tmp_path = _write_atomic(
+            chunks(), os.path.join(self.directory, uuid.uuid4().hex))
+        cid = sha256.hexdigest()
+        os.replace(tmp_path, os.path.join(self.directory, cid))
+        return cid
+
+    def digest(self, cid):
+        return cid
+
+    def cat(self, cid, output_path):
+        path = os.path.join(self.directory, os.path.basename(cid))
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Unknown CID {cid}")
+        with open(path, "rb") as f:
+            return _write_atomic(read_chunks(f, CHUNK_SIZE), output_path)
+
+
+_default_storage = None
+_default_storage_lock = threading.Lock()
+
+
+def get_storage(directory=None):
+    """Return the storage shared by the process, created on first use.
+
+    Args:
+        directory: Optional; a local directory standing in for IPFS, the
+            local IPFS node if not provided.
+    """
+    global _default_storage
+    with _default_storage_lock:
+        if _default_storage is None:
+            _default_storage = (LocalStorage(directory)
+                                if directory else IpfsStorage())
+        return _default_storage
@@ -0,0 +1,169 @@
+import os
+import threading
+
+import pytest
+
+from storage import cache, ipfs
+
+
+class CountingStorage(ipfs.LocalStorage):
+    """A local storage counting its downloads."""
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.downloads = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def cat(self, cid, output_path):
+        self.downloads.append(cid)
+        self.started.set()
+        self.release.wait(30)
+        return super().cat(cid, output_path)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return CountingStorage(str(tmp_path / "ipfs"))
+
+
+def add(storage, tmp_path, data):
+    path = tmp_path / "upload"
+    path.write_bytes(data)
+    return storage.add(str(path))
+
+
+def read(cached, tmp_path, cid):
+    output_path = str(tmp_path / "output")
+    assert cached.cat(cid, output_path) == output_path
+    with open(output_path, "rb") as f:
+        return f.read()
+
+
+def entry_path(cached, cid):
+    digest, _ = cached._entries[cid]
+    return cached._path(cid, digest)
+
+
+def test_hit(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"))
+    cid = add(storage, tmp_path, b"data")
+    assert read(cached, tmp_path, cid) == b"data"
+    assert read(cached, tmp_path, cid) == b"data"
+    assert storage.downloads == [cid]
+
+    # Cached files survive restarts
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"))
+    assert read(cached, tmp_path, cid) == b"data"
+    assert storage.downloads == [cid]
+
+
+def test_corrupted_entry(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"))
+    cid = add(storage, tmp_path, b"data")
+    read(cached, tmp_path, cid)
+    with open(entry_path(cached, cid), "wb") as f:
+        f.write(b"DATA")
+
+    assert read(cached, tmp_path, cid) == b"data"
+    assert storage.downloads == [cid, cid]
+
+
+def test_evicted_by_another_process(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"))
+    cid = add(storage, tmp_path, b"data")
+    read(cached, tmp_path, cid)
+    os.remove(entry_path(cached, cid))
+
+    assert read(cached, tmp_path, cid) == b"data"
+    assert storage.downloads == [cid, cid]
+    assert cached.size == 4
+
+
+def test_lru_eviction(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"),
+                                 max_bytes=10)
+    cids = [add(storage, tmp_path, bytes([i]) * 4) for i in range(3)]
+    read(cached, tmp_path, cids[0])
+    read(cached, tmp_path, cids[1])
+    read(cached, tmp_path, cids[0])  # cids[1] is now the least recent
+    read(cached, tmp_path, cids[2])
+
+    assert list(cached._entries) == [cids[0], cids[2]]
+    assert cached.size == 8
+    assert len(os.listdir(tmp_path / "cache")) == 2
+
+
+def test_latest_file_kept(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"),
+                                 max_bytes=2)
+    cid = add(storage, tmp_path, b"larger than the cache")
+    assert read(cached, tmp_path, cid) == b"larger than the cache"
+    assert list(cached._entries) == [cid]
+
+
+def test_unknown_files_left_alone(storage, tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    (directory / "notes.txt").write_bytes(b"notes")
+    (directory / "tmpfile").write_bytes(b"partial")
+
+    cached = cache.CachedStorage(storage, str(directory))
+    assert cached.size == 0
+    assert sorted(os.listdir(directory)) == ["notes.txt", "tmpfile"]
+
+
+def test_failed_download(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"))
+    with pytest.raises(FileNotFoundError):
+        cached.cat("unknown", str(tmp_path / "output"))
+    assert os.listdir(tmp_path / "cache") == []
+
+
+def test_mismatching_download(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"))
+    cid = add(storage, tmp_path, b"data")
+    # The backend returns other content for the CID
+    with open(os.path.join(storage.directory, cid), "wb") as f:
+        f.write(b"DATA")
+
+    with pytest.raises(ValueError):
+        cached.cat(cid, str(tmp_path / "output"))
+    assert os.listdir(tmp_path / "cache") == []
+    assert cached.size == 0
+
+
+def test_mismatching_entry_not_loaded(storage, tmp_path):
+    cid = add(storage, tmp_path, b"data")
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    other = add(storage, tmp_path, b"DATA")
+    (directory / f"{cid}.{other}").write_bytes(b"DATA")
+
+    cached = cache.CachedStorage(storage, str(directory))
+    assert cached.size == 0
+    assert read(cached, tmp_path, cid) == b"data"
+
+
+def test_concurrent_downloads(storage, tmp_path):
+    cached = cache.CachedStorage(storage, str(tmp_path / "cache"))
+    cid = add(storage, tmp_path, b"data")
+    storage.release.clear()
+    results = []
+
+    def fetch(i):
+        output_path = str(tmp_path / f"output{i}")
+        cached.cat(cid, output_path)
+        with open(output_path, "rb") as f:
+            results.append(f.read())
+
+    threads = [threading.Thread(target=fetch, args=(i, )) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    storage.started.wait(30)
+    storage.release.set()
+    for thread in threads:
+        thread.join(30)
+
+    assert results == [b"data"] * 4
+    assert storage.downloads == [cid]
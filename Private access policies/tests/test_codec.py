@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from GC import codec, yao
+
+
+def classic_tables():
+    return {
+        1: {(0, ): os.urandom(100), (1, ): os.urandom(100)},
+        -5: {row: os.urandom(120) for row in codec.ROWS_2},
+        1 << 40: {row: os.urandom(120) for row in codec.ROWS_2},
+    }
+
+
+def test_classic_round_trip():
+    g_tables = classic_tables()
+    frames = codec.pack_garbled_tables(g_tables, "classic")
+    assert codec.unpack_garbled_tables(frames) == (g_tables, "classic")
+
+
+def test_halfgates_round_trip():
+    g_tables = {i: os.urandom(32) for i in range(10)}
+    unpacked, scheme = codec.unpack_garbled_tables(
+        codec.pack_garbled_tables(g_tables, "halfgates"))
+    assert scheme == "halfgates"
+    assert {k: bytes(v) for k, v in unpacked.items()} == g_tables
+
+
+def test_known_answer():
+    frames = codec.pack_garbled_tables({7: b"\x01" * 32}, "halfgates")
+    assert frames == [
+        b"YGC1" + bytes([yao.SCHEMES.index("halfgates")]) +
+        (1).to_bytes(4, "little") + (7).to_bytes(8, "little") +
+        (0).to_bytes(4, "little") + (1).to_bytes(2, "little") +
+        (32).to_bytes(2, "little"),
+        b"\x01" * 32,
+    ]
+
+
+def test_empty():
+    for scheme in yao.SCHEMES:
+        frames = codec.pack_garbled_tables({}, scheme)
+        assert codec.unpack_garbled_tables(frames) == ({}, scheme)
+
+
+def test_rows_of_different_sizes():
+    with pytest.raises(ValueError):
+        codec.pack_garbled_tables({1: {(0, ): b"a", (1, ): b"bb"}})
+
+
+def test_bad_magic():
+    index, tables = codec.pack_garbled_tables(classic_tables())
+    with pytest.raises(ValueError):
+        codec.unpack_garbled_tables([b"XXXX" + index[4:], tables])
+
+
+def test_labels_round_trip():
+    inputs = {3: (os.urandom(16), 1), -2: (os.urandom(16), 0)}
+    assert codec.unpack_labels(codec.pack_labels(inputs)) == inputs
+    assert codec.unpack_labels(codec.pack_labels({})) == {}
@@ -0,0 +1,128 @@
+import json
+import os
+import pickle
+
+import pytest
+
+from GC import compiler
+
+CIRCUIT = {
+    "id": "shuffled",
+    "alice": [1, 2],
+    "bob": [3],
+    "out": [7],
+    # Gates out of topological order, with a free wire 4
+    "gates": [
+        {"id": 7, "type": "OR", "in": [6, 5]},
+        {"id": 5, "type": "AND", "in": [1, 3]},
+        {"id": 6, "type": "XOR", "in": [2, 4]},
+    ],
+}
+
+
+def test_dense_numbering():
+    program = compiler.CompiledCircuit(CIRCUIT)
+
+    assert program.num_inputs == 4
+    assert program.num_wires == 7
+    # Alice's wires, Bob's, then free wires, then gate outputs in order
+    assert program.wire_ids == [1, 2, 3, 4, 5, 6, 7]
+    assert program.wire_index == {w: i for i, w in enumerate(program.wire_ids)}
+    assert list(program.gate_ids) == [5, 6, 7]
+    assert list(program.out_index) == [6]
+
+
+def test_topological_order():
+    program = compiler.CompiledCircuit(CIRCUIT)
+
+    for gate_id, opcode, in0, in1, out in program.gates():
+        assert program.wire_ids[out] == gate_id
+        assert in0 < out and in1 < out
+    assert list(program.opcodes) == [compiler.AND, compiler.XOR, compiler.OR]
+
+
+def test_not_gate_reads_one_wire():
+    program = compiler.CompiledCircuit({
+        "id": "not",
+        "alice": [1],
+        "out": [2],
+        "gates": [{"id": 2, "type": "NOT", "in": [1]}],
+    })
+    assert (program.in0[0], program.in1[0]) == (0, 0)
+
+
+def test_duplicate_inputs():
+    program = compiler.CompiledCircuit({
+        "id": "dup",
+        "alice": [1, 1],
+        "bob": [1, 2],
+        "out": [3],
+        "gates": [{"id": 3, "type": "AND", "in": [1, 2]}],
+    })
+    assert program.wire_ids == [1, 2, 3]
+
+
+def test_cycle():
+    with pytest.raises(ValueError):
+        compiler.CompiledCircuit({
+            "id": "cycle",
+            "alice": [1],
+            "out": [3],
+            "gates": [
+                {"id": 2, "type": "AND", "in": [1, 3]},
+                {"id": 3, "type": "AND", "in": [1, 2]},
+            ],
+        })
+
+
+def test_load_inputs():
+    program = compiler.CompiledCircuit(CIRCUIT)
+    wires = program.load_inputs({1: "a1", 2: "a2"}, {3: "b3"})
+    assert wires == ["a1", "a2", "b3", None, None, None, None]
+
+
+def test_load_compiled(tmp_path):
+    json_path = str(tmp_path / "circuits.json")
+    with open(json_path, "w") as f:
+        json.dump({"circuits": [CIRCUIT]}, f)
+
+    compiled = compiler.load_compiled(json_path)
+    assert os.path.exists(json_path + compiler.CACHE_SUFFIX)
+    assert compiler.load_compiled(json_path)[0].wire_ids == \
+        compiled[0].wire_ids
+
+    # A changed JSON file is compiled again
+    with open(json_path, "w") as f:
+        json.dump({"circuits": [dict(CIRCUIT, id="changed")]}, f)
+    assert compiler.load_compiled(json_path)[0].id == "changed"
+
+
+def test_load_compiled_stale_cache(tmp_path, monkeypatch):
+    json_path = str(tmp_path / "circuits.json")
+    with open(json_path, "w") as f:
+        json.dump({"circuits": [CIRCUIT]}, f)
+    cache_path = json_path + compiler.CACHE_SUFFIX
+
+    # Caches of the previous format, or that fail to load, are rebuilt
+    for cache in (pickle.dumps((b"digest", [])), b"garbage"):
+        with open(cache_path, "wb") as f:
+            f.write(cache)
+        assert compiler.load_compiled(json_path)[0].id == "shuffled"
+
+    monkeypatch.setattr(compiler, "CACHE_FORMAT", compiler.CACHE_FORMAT + 1)
+    with open(cache_path, "rb") as f:
+        cached = f.read()
+    assert compiler.load_compiled(json_path)[0].id == "shuffled"
+    with open(cache_path, "rb") as f:
+        assert f.read() != cached
+
+
+def test_long_chain():
+    # Gates listed against their order, each reading the previous one
+    n = 5000
+    gates = [{"id": i, "type": "XOR", "in": [i - 1, 0]}
+             for i in range(n, 1, -1)]
+    program = compiler.CompiledCircuit({
+        "id": "chain", "alice": [0, 1], "out": [n], "gates": gates,
+    })
+    assert list(program.gate_ids) == list(range(2, n + 1))
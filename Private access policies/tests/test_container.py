@@ -0,0 +1,159 @@
+import os
+import random
+import time
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from storage import container
+
+KEY = bytes(range(32))
+CHUNK_SIZE = 64  # small segments, to cover segment boundaries
+
+SIZES = [0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1, 10 * CHUNK_SIZE,
+         10 * CHUNK_SIZE + 7]
+
+
+def encrypt(data, chunk_size=CHUNK_SIZE, workers=None):
+    # Plaintext fed in pieces unrelated to the segment size
+    pieces = [data[i:i + 23] for i in range(0, len(data), 23)]
+    return b"".join(
+        container.encrypt_stream(KEY, pieces, chunk_size, workers))
+
+
+def decrypt(encrypted, workers=None, piece_size=37):
+    pieces = [encrypted[i:i + piece_size]
+              for i in range(0, len(encrypted), piece_size)]
+    return b"".join(container.decrypt_stream(KEY, pieces, workers))
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("workers", [1, 4])
+def test_round_trip(size, workers):
+    data = os.urandom(size)
+    encrypted = encrypt(data, workers=workers)
+    segments = max(-(-size // CHUNK_SIZE), 1)
+    assert len(encrypted) == container.HEADER.size + size + \
+        segments * container.TAG_SIZE
+    assert decrypt(encrypted, workers=workers) == data
+    assert decrypt(encrypted, piece_size=1) == data
+
+
+def test_parallel_order(monkeypatch):
+    # With a fixed nonce prefix, segments sealed on many threads come out
+    # exactly as sealed one after the other
+    data = os.urandom(100 * CHUNK_SIZE + 5)
+    monkeypatch.setattr(container.os, "urandom", lambda n: bytes(n))
+    encrypted = encrypt(data, workers=1)
+    assert encrypt(data, workers=8) == encrypted
+    assert decrypt(encrypted, workers=8) == data
+
+
+def test_map_ordered():
+    consumed = []
+
+    def args():
+        for i in range(50):
+            consumed.append(i)
+            yield (i,)
+
+    def slow(i):
+        time.sleep(random.random() / 1000)
+        return i
+
+    results = container._map_ordered(slow, args(), 3)
+    assert next(results) == 0
+    # Only a bounded number of segments is read ahead
+    assert len(consumed) <= 2 * 3 + 1
+    assert list(results) == list(range(1, 50))
+
+
+def test_fresh_nonces():
+    data = os.urandom(3 * CHUNK_SIZE)
+    assert encrypt(data) != encrypt(data)
+
+
+def test_modified_segment():
+    encrypted = bytearray(encrypt(os.urandom(3 * CHUNK_SIZE)))
+    encrypted[container.HEADER.size + CHUNK_SIZE + 20] ^= 1
+    with pytest.raises(InvalidTag):
+        decrypt(bytes(encrypted))
+
+
+def test_modified_header():
+    encrypted = bytearray(encrypt(os.urandom(3 * CHUNK_SIZE)))
+    encrypted[10] ^= 1  # nonce prefix
+    with pytest.raises(InvalidTag):
+        decrypt(bytes(encrypted))
+
+
+def test_truncated():
+    encrypted = encrypt(os.urandom(3 * CHUNK_SIZE))
+    segment_size = CHUNK_SIZE + container.TAG_SIZE
+    # Dropping the last segment leaves a valid prefix, rejected by the
+    # last segment flag
+    with pytest.raises(InvalidTag):
+        decrypt(encrypted[:-segment_size])
+
+
+def test_reordered():
+    encrypted = encrypt(os.urandom(3 * CHUNK_SIZE))
+    header, body = (encrypted[:container.HEADER.size],
+                    encrypted[container.HEADER.size:])
+    segment_size = CHUNK_SIZE + container.TAG_SIZE
+    first, second = body[:segment_size], body[segment_size:2 * segment_size]
+    with pytest.raises(InvalidTag):
+        decrypt(header + second + first + body[2 * segment_size:])
+
+
+def test_wrong_key():
+    encrypted = encrypt(b"secret")
+    with pytest.raises(InvalidTag):
+        b"".join(container.decrypt_stream(bytes(32), [encrypted]))
+
+
+def test_not_a_container():
+    with pytest.raises(ValueError):
+        decrypt(b"not a container at all")
+    with pytest.raises(ValueError):
+        decrypt(b"HCT")
+
+
+def test_files(tmp_path):
+    data = os.urandom(10 * CHUNK_SIZE + 7)
+    path = tmp_path / "data"
+    path.write_bytes(data)
+
+    encrypted_path = container.encrypt_file(KEY, str(path),
+                                            chunk_size=CHUNK_SIZE)
+    assert encrypted_path == str(path) + ".enc"
+    decrypted_path = str(tmp_path / "decrypted")
+    assert container.decrypt_file(KEY, encrypted_path,
+                                  decrypted_path) == decrypted_path
+    with open(decrypted_path, "rb") as f:
+        assert f.read() == data
+
+    for offset, length in ((0, 1), (5, CHUNK_SIZE), (CHUNK_SIZE, CHUNK_SIZE),
+                           (3 * CHUNK_SIZE - 1, 2), (len(data) - 3, 100),
+                           (len(data), 10)):
+        assert container.decrypt_range(KEY, encrypted_path, offset,
+                                       length) == data[offset:offset + length]
+
+
+def test_corrupted_file(tmp_path):
+    path = tmp_path / "data"
+    path.write_bytes(os.urandom(3 * CHUNK_SIZE))
+    encrypted_path = container.encrypt_file(KEY, str(path),
+                                            chunk_size=CHUNK_SIZE)
+    with open(encrypted_path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([byte[0] ^ 1]))
+
+    decrypted_path = tmp_path / "decrypted"
+    with pytest.raises(InvalidTag):
+        container.decrypt_file(KEY, encrypted_path, str(decrypted_path))
+    # No partial plaintext left behind
+    assert not decrypted_path.exists()
+    assert sorted(tmp_path.iterdir()) == [path, tmp_path / "data.enc"]
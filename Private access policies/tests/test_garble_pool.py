@@ -0,0 +1,44 @@
+import pytest
+
+from GC import compiler, yao
+from test_halfgates import all_inputs, evaluate_clear, labels, load_circuits
+
+
+def check(circuit, garbled_circuit, scheme):
+    keys, pbits = garbled_circuit.keys, garbled_circuit.pbits
+    g_tables = garbled_circuit.get_garbled_tables()
+    assert set(g_tables) <= {gate["id"] for gate in circuit["gates"]}
+    pbits_out = {w: pbits[w] for w in circuit["out"]}
+    for bits, a_inputs, b_inputs in all_inputs(circuit):
+        result = yao.evaluate(circuit, g_tables, pbits_out,
+                              labels(keys, pbits, a_inputs),
+                              labels(keys, pbits, b_inputs), scheme)
+        assert result == evaluate_clear(circuit, bits)
+
+
+@pytest.mark.parametrize("scheme", yao.SCHEMES)
+def test_garble_circuits(scheme):
+    circuits = load_circuits()
+    programs = [compiler.compile_circuit(c) for c in circuits]
+    garbled_circuits = yao.garble_circuits(circuits, programs, scheme=scheme,
+                                           workers=2)
+
+    # Same circuits in the same order as garbling them one by one
+    assert [g.circuit["id"] for g in garbled_circuits] == \
+        [c["id"] for c in circuits]
+    for circuit, garbled_circuit in zip(circuits, garbled_circuits):
+        check(circuit, garbled_circuit, scheme)
+
+
+def test_garble_in_chunks(monkeypatch):
+    # Classic circuits over CHUNK_SIZE gates are split across the pool
+    monkeypatch.setattr(yao, "CHUNK_SIZE", 2)
+    circuits = [c for c in load_circuits() if len(c["gates"]) > 2]
+    assert circuits
+    programs = [compiler.compile_circuit(c) for c in circuits]
+    garbled_circuits = yao.garble_circuits(circuits, programs, workers=2)
+
+    for circuit, garbled_circuit in zip(circuits, garbled_circuits):
+        assert len(garbled_circuit.get_garbled_tables()) == \
+            len(circuit["gates"])
+        check(circuit, garbled_circuit, "classic")
@@ -0,0 +1,103 @@
+import itertools
+import json
+import os
+
+import pytest
+
+from GC import compiler, halfgates, yao
+
+CIRCUITS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "GC",
+                            "circuits")
+CIRCUIT_FILES = ["add.json", "bool.json", "cmp.json", "max.json", "min.json",
+                 "nand.json"]
+
+OPERATORS = {
+    "AND": lambda a, b: a & b,
+    "OR": lambda a, b: a | b,
+    "XOR": lambda a, b: a ^ b,
+    "NAND": lambda a, b: 1 - (a & b),
+    "NOR": lambda a, b: 1 - (a | b),
+    "XNOR": lambda a, b: 1 - (a ^ b),
+}
+
+
+def load_circuits():
+    circuits = []
+    for name in CIRCUIT_FILES:
+        with open(os.path.join(CIRCUITS_DIR, name)) as f:
+            circuits.extend(json.load(f)["circuits"])
+    return circuits
+
+
+def evaluate_clear(circuit, bits):
+    """Evaluate a circuit on clear bits, Alice's wires then Bob's."""
+    wires = dict(zip(circuit.get("alice", []) + circuit.get("bob", []), bits))
+    for gate in circuit["gates"]:
+        if gate["type"] == "NOT":
+            wires[gate["id"]] = 1 - wires[gate["in"][0]]
+        else:
+            a, b = (wires[w] for w in gate["in"])
+            wires[gate["id"]] = OPERATORS[gate["type"]](a, b)
+    return {w: wires[w] for w in circuit["out"]}
+
+
+def all_inputs(circuit):
+    a_wires, b_wires = circuit.get("alice", []), circuit.get("bob", [])
+    for bits in itertools.product((0, 1), repeat=len(a_wires) + len(b_wires)):
+        yield (bits, dict(zip(a_wires, bits)),
+               dict(zip(b_wires, bits[len(a_wires):])))
+
+
+def labels(keys, pbits, inputs):
+    # (label, encrypted bit) of each input wire for its clear bit
+    return {w: (keys[w][bit], pbits[w] ^ bit) for w, bit in inputs.items()}
+
+
+@pytest.mark.parametrize("circuit", load_circuits(), ids=lambda c: c["id"])
+def test_garble_evaluate(circuit):
+    program = compiler.compile_circuit(circuit)
+    keys, pbits, g_tables = halfgates.garble(program)
+    pbits_out = {w: pbits[w] for w in circuit["out"]}
+
+    for bits, a_inputs, b_inputs in all_inputs(circuit):
+        result = halfgates.evaluate(program, g_tables, pbits_out,
+                                    labels(keys, pbits, a_inputs),
+                                    labels(keys, pbits, b_inputs))
+        assert result == evaluate_clear(circuit, bits)
+
+
+def test_labels():
+    circuit = load_circuits()[0]
+    program = compiler.compile_circuit(circuit)
+    keys, pbits, g_tables = halfgates.garble(program)
+
+    for wire, (key0, key1) in keys.items():
+        assert len(key0) == len(key1) == halfgates.LABEL_SIZE
+        # Point-and-permute: the labels of a wire have opposite p-bits
+        assert key0[-1] & 1 == pbits[wire]
+        assert key1[-1] & 1 != pbits[wire]
+    # Free-XOR: every wire shares the same offset
+    assert len({
+        int.from_bytes(key0, "big") ^ int.from_bytes(key1, "big")
+        for key0, key1 in keys.values()
+    }) == 1
+    for table in g_tables.values():
+        assert len(table) == halfgates.TABLE_SIZE
+
+
+@pytest.mark.parametrize("scheme", yao.SCHEMES)
+def test_streamed_chunks(scheme):
+    circuit = next(c for c in load_circuits() if c["id"] == "2-bit full adder")
+    garbled_circuit = yao.GarbledCircuit(circuit, scheme=scheme, stream=True)
+    chunks = list(garbled_circuit.garbled_chunks(chunk_size=3))
+    assert len(chunks) > 1
+    keys, pbits = garbled_circuit.keys, garbled_circuit.pbits
+    pbits_out = {w: pbits[w] for w in circuit["out"]}
+
+    # Chunks are shared by every evaluation, and pulled only when needed
+    stream = yao.TableStream(iter(chunks))
+    for bits, a_inputs, b_inputs in all_inputs(circuit):
+        result = yao.evaluate(circuit, stream, pbits_out,
+                              labels(keys, pbits, a_inputs),
+                              labels(keys, pbits, b_inputs), scheme)
+        assert result == evaluate_clear(circuit, bits)
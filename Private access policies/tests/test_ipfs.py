@@ -0,0 +1,143 @@
+import hashlib
+import http.server
+import json
+import os
+import threading
+import urllib.parse
+
+import pytest
+import requests
+
+from storage import ipfs
+
+
+class FakeNode(http.server.ThreadingHTTPServer):
+    """The add and cat commands of the HTTP API of an IPFS node."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeApiHandler)
+        self.files = {}
+        self.clients = set()  # client addresses, one per connection
+        self.chunked = []  # whether each add request was streamed
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def address(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeApiHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # connections are kept alive
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            return self.rfile.read(int(self.headers["Content-Length"]))
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if not size:
+                return bytes(body)
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        node = self.server
+        with node.lock:
+            node.clients.add(self.client_address)
+        url = urllib.parse.urlparse(self.path)
+        body = self._body()
+        if url.path == "/api/v0/add":
+            with node.lock:
+                node.chunked.append(
+                    self.headers.get("Transfer-Encoding") == "chunked")
+            boundary = self.headers["Content-Type"].split("boundary=")[1]
+            content = body.split(b"\r\n\r\n", 1)[1]
+            content = content[:content.rindex(f"\r\n--{boundary}--".encode())]
+            cid = hashlib.sha256(content).hexdigest()
+            node.files[cid] = content
+            self._reply(200, json.dumps({"Name": "file", "Hash": cid})
+                        .encode() + b"\n")
+        elif url.path == "/api/v0/cat":
+            cid = urllib.parse.parse_qs(url.query)["arg"][0]
+            if cid in node.files:
+                self._reply(200, node.files[cid])
+            else:
+                self._reply(500, b"block not found")
+        else:
+            self._reply(404, b"")
+
+
+@pytest.fixture
+def node():
+    node = FakeNode()
+    yield node
+    node.shutdown()
+    node.server_close()
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_streamed_round_trip(node, tmp_path, monkeypatch):
+    # Several chunks per transfer
+    monkeypatch.setattr(ipfs, "CHUNK_SIZE", 1000)
+    storage = ipfs.IpfsStorage(node.address, timeout=30)
+    data = os.urandom(10 * 1000 + 7)
+    cid = storage.add(write(tmp_path / "upload", data))
+    assert node.files[cid] == data
+    assert node.chunked == [True]
+
+    output_path = str(tmp_path / "download")
+    assert storage.cat(cid, output_path) == output_path
+    with open(output_path, "rb") as f:
+        assert f.read() == data
+    storage.close()
+
+
+def test_connection_reused(node, tmp_path):
+    storage = ipfs.IpfsStorage(node.address, timeout=30)
+    for i in range(5):
+        cid = storage.add(write(tmp_path / "upload", bytes([i]) * 100))
+        storage.cat(cid, str(tmp_path / "download"))
+    assert len(node.clients) == 1
+    storage.close()
+
+
+def test_add_many(node, tmp_path):
+    storage = ipfs.IpfsStorage(node.address, pool_size=4, timeout=30)
+    paths = [write(tmp_path / f"upload{i}", bytes([i]) * 1000)
+             for i in range(20)]
+    cids = storage.add_many(paths, workers=4)
+    assert cids == [hashlib.sha256(bytes([i]) * 1000).hexdigest()
+                    for i in range(20)]
+    # Concurrent uploads share the pool instead of opening a connection each
+    assert len(node.clients) <= 4
+    storage.close()
+
+
+def test_failed_cat(node, tmp_path):
+    storage = ipfs.IpfsStorage(node.address, timeout=30)
+    with pytest.raises(requests.HTTPError):
+        storage.cat("unknown", str(tmp_path / "download"))
+    assert os.listdir(tmp_path) == []
+    storage.close()
+
+
+def test_shared_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(ipfs, "_default_storage", None)
+    storage = ipfs.get_storage(str(tmp_path))
+    assert isinstance(storage, ipfs.LocalStorage)
+    assert ipfs.get_storage() is storage
@@ -0,0 +1,181 @@
+import pickle
+import queue
+import secrets
+import threading
+
+from GC import codec, compiler, ot, util, yao
+
+
+class Pipe:
+    """Both ends of an in-memory socket pair, messages being pickled."""
+    def __init__(self):
+        self.to_evaluator = queue.Queue()
+        self.to_garbler = queue.Queue()
+
+    @staticmethod
+    def _put(q, msg, frames):
+        if frames:
+            msg = dict(msg, frames=[bytes(f) for f in frames])
+        q.put(pickle.dumps(msg))
+
+    @staticmethod
+    def _get(q):
+        return pickle.loads(q.get(timeout=30))
+
+    # Garbler's side
+    def send_to_evaluator(self, msg, frames=None):
+        self._put(self.to_evaluator, msg, frames)
+
+    def receive_from_evaluator(self):
+        return self._get(self.to_garbler)
+
+    def send_wait_to_evaluator(self, msg, frames=None):
+        self.send_to_evaluator(msg, frames)
+        return self.receive_from_evaluator()
+
+
+class GarblerEnd(Pipe):
+    """A pipe whose garbler's side also records what it sends."""
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send(self, msg, frames=None):
+        self.sent.append(msg)
+        self.send_to_evaluator(msg, frames)
+
+    def send_wait(self, msg, frames=None):
+        self.send(msg, frames)
+        return self.receive_from_evaluator()
+
+
+class EvaluatorEnd:
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    def send(self, msg, frames=None):
+        self.pipe._put(self.pipe.to_garbler, msg, frames)
+
+    def receive(self):
+        return self.pipe._get(self.pipe.to_evaluator)
+
+    def send_wait(self, msg, frames=None):
+        self.send(msg, frames)
+        return self.receive()
+
+
+def run(garbler, evaluator):
+    """Run both parties concurrently, returning both results."""
+    results = {}
+    thread = threading.Thread(
+        target=lambda: results.setdefault("evaluator", evaluator()))
+    thread.start()
+    results["garbler"] = garbler()
+    thread.join(30)
+    assert not thread.is_alive()
+    return results["garbler"], results.get("evaluator")
+
+
+def test_transpose():
+    # Columns of a 3x2 matrix, bit j of a column being row j
+    assert ot.ObliviousTransfer.transpose([0b101, 0b011], 3) == \
+        [0b11, 0b10, 0b01]
+    columns = [secrets.randbits(200) for _ in range(ot.OT_SECURITY)]
+    rows = ot.ObliviousTransfer.transpose(columns, 200)
+    assert ot.ObliviousTransfer.transpose(rows, ot.OT_SECURITY) == columns
+
+
+def test_public_key_ot():
+    pipe = GarblerEnd()
+    alice = ot.ObliviousTransfer(pipe, extension=False)
+    bob = ot.ObliviousTransfer(EvaluatorEnd(pipe), extension=False)
+
+    for bit in (0, 1, 1):
+        msgs = (secrets.token_bytes(16), secrets.token_bytes(16))
+        _, msg = run(lambda: alice.ot_garbler(msgs),
+                     lambda: bob.ot_evaluator(bit))
+        assert msg == msgs[bit]
+    # The group is only sent on the first OT of the connection
+    assert pipe.sent.count(util.get_group().name) == 1
+    assert alice.group.name == bob.group.name
+
+
+def test_ot_extension():
+    pipe = Pipe()
+    alice = ot.ObliviousTransfer(pipe)
+    bob = ot.ObliviousTransfer(EvaluatorEnd(pipe))
+    run(alice.base_ot_garbler, bob.base_ot_evaluator)
+
+    # Several batches over the same base OTs
+    for size in (1, 300):
+        b_keys = {w: ((secrets.token_bytes(16), 0), (secrets.token_bytes(16),
+                                                      1))
+                  for w in range(size)}
+        wires = list(b_keys)
+        bits = [secrets.randbits(1) for _ in wires]
+        _, msgs = run(lambda: alice.ot_ext_garbler(b_keys),
+                      lambda: bob.ot_ext_evaluator(wires, bits))
+        assert [pickle.loads(msg) for msg in msgs] == [
+            b_keys[w][bit] for w, bit in zip(wires, bits)
+        ]
+
+
+def test_batch_results():
+    circuit = {
+        "id": "and-xor",
+        "alice": [1, 2],
+        "bob": [3],
+        "out": [4, 5],
+        "gates": [
+            {"id": 4, "type": "AND", "in": [1, 3]},
+            {"id": 5, "type": "XOR", "in": [2, 3]},
+        ],
+    }
+    inputs = [(a1, a2, b) for a1 in (0, 1) for a2 in (0, 1) for b in (0, 1)]
+    # Base OTs are run on the first batch only
+    pipe = Pipe()
+    alice = ot.ObliviousTransfer(pipe)
+    bob = ot.ObliviousTransfer(EvaluatorEnd(pipe))
+
+    for scheme in yao.SCHEMES:
+        for stream in (False, True):
+            garbled = yao.GarbledCircuit(circuit, scheme=scheme, stream=stream)
+            keys, pbits = garbled.keys, garbled.pbits
+            a_inputs_list = [{
+                w: (keys[w][bit], pbits[w] ^ bit)
+                for w, bit in ((1, a1), (2, a2))
+            } for a1, a2, _ in inputs]
+            b_keys = {3: ((keys[3][0], pbits[3]), (keys[3][1], 1 ^ pbits[3]))}
+            b_inputs_list = [{3: b} for _, _, b in inputs]
+            pbits_out = {}
+
+            def send_tables():
+                for chunk in garbled.garbled_chunks(chunk_size=1):
+                    pipe.send_wait_to_evaluator(
+                        {}, codec.pack_garbled_tables(chunk, scheme))
+                pipe.send_to_evaluator({
+                    "pbits_out": {w: pbits[w] for w in circuit["out"]}
+                })
+
+            def chunks():
+                while True:
+                    message = bob.socket.receive()
+                    if "frames" not in message:
+                        pbits_out.update(message["pbits_out"])
+                        return
+                    bob.socket.send(True)
+                    yield codec.unpack_garbled_tables(message["frames"])[0]
+
+            if stream:
+                g_tables = chunks()
+            else:
+                g_tables = garbled.get_garbled_tables()
+                pbits_out = {w: pbits[w] for w in circuit["out"]}
+            results, _ = run(
+                lambda: alice.get_results(
+                    a_inputs_list, b_keys,
+                    send_tables=send_tables if stream else None),
+                lambda: bob.send_results(compiler.compile_circuit(circuit),
+                                         g_tables, pbits_out, b_inputs_list,
+                                         scheme))
+            assert results == [{4: a1 & b, 5: a2 ^ b} for a1, a2, b in inputs]
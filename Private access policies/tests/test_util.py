@@ -0,0 +1,67 @@
+import asyncio
+import pickle
+import socket
+
+import zmq
+
+from GC import util
+
+RESPONSE = {"b_decode_keys": {3: ((1, 0), (2, 1))}, "cid": "cid"}
+
+
+def free_endpoint():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_send_serialized():
+    endpoint = free_endpoint()
+    server = util.Socket(zmq.REP)
+    server.socket.bind(endpoint)
+    client = util.Socket(zmq.REQ)
+    client.socket.connect(endpoint)
+
+    # A cached response is pickled once and sent to every request
+    data = pickle.dumps(RESPONSE)
+    for frames in (None, [b"frame"]):
+        client.send({"circuit_id": "Smart"})
+        assert server.receive() == {"circuit_id": "Smart"}
+        server.send_serialized(data, frames)
+        reply = client.receive()
+        if frames:
+            assert [bytes(f) for f in reply.pop("frames")] == frames
+        assert reply == RESPONSE
+    client.socket.close(linger=0)
+    server.socket.close(linger=0)
+
+
+def test_async_send_serialized():
+    endpoint = free_endpoint()
+    data = pickle.dumps(RESPONSE)
+
+    async def serve(count):
+        server = util.AsyncServerSocket(endpoint)
+        try:
+            for _ in range(count):
+                client, request_id, message = await server.receive()
+                assert message == {"circuit_id": "Smart"}
+                await server.send_serialized(client, request_id, data)
+        finally:
+            server.close()
+
+    async def main():
+        task = asyncio.ensure_future(serve(2))
+        loop = asyncio.get_event_loop()
+        clients = [util.ClientSocket(endpoint) for _ in range(2)]
+        replies = [
+            await loop.run_in_executor(
+                None, c.send_wait, {"circuit_id": "Smart"})
+            for c in clients
+        ]
+        await asyncio.wait_for(task, 30)
+        for c in clients:
+            c.socket.close(linger=0)
+        return replies
+
+    assert asyncio.run(main()) == [RESPONSE, RESPONSE]
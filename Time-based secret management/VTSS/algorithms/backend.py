@@ -0,0 +1,81 @@
+import secrets
+import time
+
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+# Number of squarings done by one modular exponentiation in
+# repeated_squaring, small enough to report progress between chunks
+SQUARING_CHUNK = 1 << 16
+
+
+class IntBackend:
+    """Modular arithmetic on plain Python ints."""
+    name = "int"
+
+    def mpz(self, x: int) -> int:
+        return int(x)
+
+    def powmod(self, base: int, exponent: int, mod: int) -> int:
+        return pow(base, exponent, mod)
+
+    def repeated_squaring(self, base: int, t: int, mod: int) -> int:
+        """Return base**(2**t) % mod with t sequential squarings.
+
+        Squarings are done SQUARING_CHUNK at a time as one exponentiation
+        by a power of two, so that no Python object is created per squaring.
+        """
+        b = self.mpz(base) % mod
+        mod = self.mpz(mod)
+        while t > 0:
+            k = min(t, SQUARING_CHUNK)
+            b = self.powmod(b, self.mpz(1) << k, mod)
+            t -= k
+        return int(b)
+
+    def squarings_per_second(self, bits: int = 2048,
+                             squarings: int = 20000) -> int:
+        """Measure the rate of sequential squarings modulo a bits-bit number.
+
+        Args:
+            bits: Optional; the size of the modulus.
+            squarings: Optional; the number of squarings to time.
+        """
+        mod = secrets.randbits(bits) | (1 << (bits - 1)) | 1
+        base = secrets.randbits(bits - 1)
+        start = time.perf_counter()
+        self.repeated_squaring(base, squarings, mod)
+        return int(squarings / (time.perf_counter() - start))
+
+
+class Gmpy2Backend(IntBackend):
+    """Modular arithmetic on GMP integers with gmpy2."""
+    name = "gmpy2"
+
+    def mpz(self, x: int):
+        return gmpy2.mpz(x)
+
+    def powmod(self, base, exponent, mod):
+        return gmpy2.powmod(base, exponent, mod)
+
+
+BACKENDS = {"int": IntBackend()}
+if gmpy2 is not None:
+    BACKENDS["gmpy2"] = Gmpy2Backend()
+
+
+def get_backend(name: str = None) -> IntBackend:
+    """Return a modular arithmetic backend.
+
+    Args:
+        name: Optional; 'int' or 'gmpy2', the fastest available backend if
+            not provided.
+    """
+    if name is None:
+        return BACKENDS.get("gmpy2", BACKENDS["int"])
+    if name not in BACKENDS:
+        raise ValueError(f"Backend '{name}' is not available, "
+                         f"must be in {list(BACKENDS)}")
+    return BACKENDS[name]
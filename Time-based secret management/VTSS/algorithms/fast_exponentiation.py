@@ -1,20 +1,159 @@
-def fast_exponentiation(n: int, g: int, x: int) -> int:
-    # reverses binary string
-    binary = bin(x)[2:][::-1]
-    squares = successive_squares(g, n, len(binary))
-    # keeps positive powers of two
-    factors = [tup[1] for tup in zip(binary, squares) if tup[0] == '1']
-    acc = 1
-    for factor in factors:
-        acc = acc * factor % n
-    return acc
-
-
-def successive_squares(base: int, mod: int, length: int) -> [int]:
-    table = [base % mod]
-    prev = base % mod
-    for n in range(1, length):
-        squared = prev**2 % mod
-        table.append(squared)
-        prev = squared
+import secrets
+import timeit
+
+from .backend import get_backend
+
+
+def window_size(bits: int) -> int:
+    # Window minimizing the multiplications of a sliding window
+    # exponentiation of a bits-bit exponent
+    for window, max_bits in enumerate((24, 80, 240, 672, 1792), start=1):
+        if bits <= max_bits:
+            return window
+    return 6
+
+
+def odd_powers(n: int, g: int, window: int) -> [int]:
+    # g, g**3, g**5, ..., g**(2**window - 1) modulo n
+    g = g % n
+    g_square = g * g % n
+    table = [g]
+    for _ in range(1, 1 << (window - 1)):
+        table.append(table[-1] * g_square % n)
     return table
+
+
+def fast_exponentiation(n: int, g: int, x: int, backend=None) -> int:
+    # Left-to-right sliding window exponentiation: the bits of the exponent
+    # are read in place, so memory only depends on the window size
+    backend = backend or get_backend()
+    n, g = backend.mpz(n), backend.mpz(g)
+    if x < 0:
+        raise ValueError("Negative exponent")
+    window = window_size(x.bit_length())
+    table = odd_powers(n, g, window)
+    acc = backend.mpz(1) % n
+
+    i = x.bit_length() - 1
+    while i >= 0:
+        if not (x >> i) & 1:
+            acc = acc * acc % n
+            i -= 1
+            continue
+        # Longest window x[i..j] of at most window bits ending with a 1
+        j = max(i - window + 1, 0)
+        while not (x >> j) & 1:
+            j += 1
+        digit = (x >> j) & ((1 << (i - j + 1)) - 1)
+        for _ in range(i - j + 1):
+            acc = acc * acc % n
+        acc = acc * table[digit >> 1] % n
+        i = j - 1
+    return int(acc)
+
+
+def multi_exponentiation(n: int, pairs, window: int = 4,
+                         backend=None) -> int:
+    # Product of g**x modulo n for all (g, x) in pairs, sharing the
+    # squarings between all exponents (Straus' method, fixed windows)
+    backend = backend or get_backend()
+    n = backend.mpz(n)
+    pairs = [(backend.mpz(g) % n, x) for g, x in pairs]
+    if any(x < 0 for _, x in pairs):
+        raise ValueError("Negative exponent")
+    tables = []
+    for g, _ in pairs:
+        table = [backend.mpz(1) % n]
+        for _ in range(1, 1 << window):
+            table.append(table[-1] * g % n)
+        tables.append(table)
+
+    mask = (1 << window) - 1
+    bits = max((x.bit_length() for _, x in pairs), default=0)
+    acc = backend.mpz(1) % n
+    for k in range((bits + window - 1) // window - 1, -1, -1):
+        for _ in range(window):
+            acc = acc * acc % n
+        for table, (_, x) in zip(tables, pairs):
+            digit = (x >> (k * window)) & mask
+            if digit:
+                acc = acc * table[digit] % n
+    return int(acc)
+
+
+class FixedBaseTable:
+    """Precomputed powers of a fixed base g modulo n.
+
+    The table holds g**(d * 2**(window * k)) for every digit d and window
+    position k, so an exponentiation of a fixed base only needs one
+    multiplication per window of the exponent and no squaring.
+
+    Args:
+        n: The modulus.
+        g: The fixed base.
+        max_bits: The maximum size of the exponents.
+        window: Optional; the number of exponent bits per table row.
+        backend: Optional; the modular arithmetic backend.
+    """
+    def __init__(self, n: int, g: int, max_bits: int, window: int = 6,
+                 backend=None):
+        self.backend = backend or get_backend()
+        self.n = self.backend.mpz(n)
+        self.max_bits = max_bits
+        self.window = window
+        self.rows = []
+        base = self.backend.mpz(g) % self.n
+        for _ in range((max_bits + window - 1) // window):
+            row = [self.backend.mpz(1) % self.n]
+            for _ in range(1, 1 << window):
+                row.append(row[-1] * base % self.n)
+            self.rows.append(row)
+            base = row[-1] * base % self.n  # g**(2**(window * (k + 1)))
+
+    def pow(self, x: int) -> int:
+        """Return g**x modulo n."""
+        if x < 0 or x.bit_length() > self.max_bits:
+            raise ValueError(f"Exponent must be in [0, 2**{self.max_bits})")
+        mask = (1 << self.window) - 1
+        acc = self.backend.mpz(1) % self.n
+        for k, row in enumerate(self.rows):
+            digit = (x >> (k * self.window)) & mask
+            if digit:
+                acc = acc * row[digit] % self.n
+        return int(acc)
+
+
+def benchmark(bits: int = 2048, repeats: int = 20, backend=None) -> dict:
+    """Time each exponentiation against the built-in pow.
+
+    Args:
+        bits: Optional; the size of the modulus and exponents.
+        repeats: Optional; the number of exponentiations timed.
+        backend: Optional; the modular arithmetic backend.
+
+    Returns:
+        A dict mapping each method to its mean time in seconds.
+    """
+    backend = backend or get_backend()
+    n = secrets.randbits(bits) | (1 << (bits - 1)) | 1
+    g, h = secrets.randbits(bits - 1), secrets.randbits(bits - 1)
+    x, y = secrets.randbits(bits), secrets.randbits(bits)
+    table = FixedBaseTable(n, g, bits, backend=backend)
+    timers = {
+        "pow": lambda: pow(g, x, n),
+        "fast_exponentiation": lambda: fast_exponentiation(n, g, x, backend),
+        "fixed_base": lambda: table.pow(x),
+        "2 x pow": lambda: pow(g, x, n) * pow(h, y, n) % n,
+        "multi_exponentiation": lambda: multi_exponentiation(
+            n, [(g, x), (h, y)], backend=backend),
+    }
+    return {
+        name: timeit.timeit(timer, number=repeats) / repeats
+        for name, timer in timers.items()
+    }
+
+
+if __name__ == '__main__':
+    # Run as python -m VTSS.algorithms.fast_exponentiation
+    for name, seconds in benchmark().items():
+        print(f"{name:>22}: {seconds * 1000:.3f} ms")
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import socket
+import time
+
+from . import puzzle
+from .algorithms.backend import get_backend
+from .modulus_pool import MODULUS_BITS
+
+# Measured rates, keyed by host, backend and modulus size
+CALIBRATION_FILE = os.path.join(os.path.expanduser("~"), ".heimdall",
+                                "calibration.json")
+BENCHMARK_SQUARINGS = 200000  # squarings timed by one benchmark
+
+
+def benchmark(bits: int = MODULUS_BITS, backend=None,
+              squarings: int = BENCHMARK_SQUARINGS) -> int:
+    """Measure the rate of sequential modular squarings on this host.
+
+    Args:
+        bits: Optional; the size of the modulus.
+        backend: Optional; the modular arithmetic backend, the fastest
+            available if not provided.
+        squarings: Optional; the number of squarings to time.
+
+    Returns:
+        The number of squarings per second.
+    """
+    backend = backend or get_backend()
+    return backend.squarings_per_second(bits, squarings)
+
+
+def _calibration_key(bits: int, backend) -> str:
+    return f"{socket.gethostname()}/{backend.name}/{bits}"
+
+
+def _load(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def squarings_per_second(bits: int = MODULUS_BITS, backend=None,
+                         path: str = CALIBRATION_FILE,
+                         refresh: bool = False) -> int:
+    """Return the calibrated squaring rate of this host.
+
+    The rate is benchmarked on first use and persisted in path, keyed by
+    host name, backend and modulus size.
+
+    Args:
+        bits: Optional; the size of the modulus.
+        backend: Optional; the modular arithmetic backend, the fastest
+            available if not provided.
+        path: Optional; the calibration file.
+        refresh: Optional; benchmark again even if a rate is persisted.
+    """
+    backend = backend or get_backend()
+    key = _calibration_key(bits, backend)
+    rates = _load(path)
+    if not refresh and key in rates:
+        return rates[key]
+
+    rates[key] = benchmark(bits, backend)
+    logging.info(f"Calibrated {key}: {rates[key]} squarings per second")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(rates, f, indent=4)
+    except OSError:
+        logging.warning(f"Could not persist calibration to {path}")
+    return rates[key]
+
+
+def encrypt(message: bytes, seconds: float, backend=None,
+            path: str = CALIBRATION_FILE):
+    """Encrypt a message in a puzzle taking seconds to solve on this host.
+
+    Args:
+        message: The message to encrypt.
+        seconds: The target time to solve the puzzle.
+        backend: Optional; the backend the puzzle will be solved with.
+        path: Optional; the calibration file.
+
+    Returns:
+        The tuple returned by puzzle.encrypt.
+    """
+    rate = squarings_per_second(backend=backend, path=path)
+    return puzzle.encrypt(message, seconds, rate)
+
+
+def decrypt(n: int, a: int, t: int, enc_key: int, enc_message: bytes,
+            backend=None, path: str = CALIBRATION_FILE):
+    """Solve a puzzle and report the achieved against the target delay.
+
+    The target delay is the time t squarings should take according to the
+    calibration of this host.
+
+    Returns:
+        A tuple (message, elapsed, target) with delays in seconds.
+    """
+    backend = backend or get_backend()
+    target = t / squarings_per_second(backend=backend, path=path)
+    start = time.perf_counter()
+    message = puzzle.decrypt(n, a, t, enc_key, enc_message, backend)
+    elapsed = time.perf_counter() - start
+    logging.info(f"Puzzle solved in {elapsed:.2f}s, target {target:.2f}s")
+    return message, elapsed, target
+
+
+if __name__ == '__main__':
+    # Run as python -m VTSS.calibration on the host solving the puzzles, and
+    # pass the rate to the service provider with --squarings-per-second
+    print(squarings_per_second(refresh=True))
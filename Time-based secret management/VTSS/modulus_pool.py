@@ -0,0 +1,123 @@
+import collections
+import logging
+import threading
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+MODULUS_BITS = 2048  # size of the RSA modulus of a puzzle
+POOL_SIZE = 8  # number of moduli kept ready
+REFILL_THRESHOLD = 4  # refill the pool when fewer moduli are left
+
+
+def generate_modulus(bits: int = MODULUS_BITS):
+    """Generate an RSA modulus.
+
+    Returns:
+        A tuple (p, q, n, phi_n).
+    """
+    # hard code safe exponent to use
+    private_key = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=bits,
+        backend=default_backend()
+    )
+
+    # see RSA for security specifications
+    p, q = private_key.private_numbers().p, private_key.private_numbers().q
+    n = private_key.public_key().public_numbers().n
+    return p, q, n, (p - 1) * (q - 1)
+
+
+class ModulusPool:
+    """A pool of RSA moduli generated in a background thread.
+
+    Prime generation is kept off the hot path of puzzle creation: moduli
+    are drawn from the pool, which is refilled up to size whenever fewer
+    than refill_threshold moduli are left. A modulus is removed from the
+    pool when drawn, so it is never used for two puzzles.
+
+    Args:
+        size: Optional; the number of moduli kept ready, at least one.
+        refill_threshold: Optional; the number of moduli left below which
+            the pool is refilled. The pool is always refilled once empty.
+        bits: Optional; the size of the moduli.
+    """
+    def __init__(self,
+                 size: int = POOL_SIZE,
+                 refill_threshold: int = REFILL_THRESHOLD,
+                 bits: int = MODULUS_BITS):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        if not 0 <= refill_threshold <= size:
+            raise ValueError("refill_threshold must be in [0, size]")
+        self.size = size
+        self.refill_threshold = refill_threshold
+        self.bits = bits
+        self._moduli = collections.deque()
+        self._filling = True  # the background thread is generating moduli
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._moduli) < self.refill_threshold or
+                    not self._moduli)
+                self._filling = True
+            while True:
+                try:
+                    modulus = generate_modulus(self.bits)
+                except Exception:
+                    # Moduli are then generated by the callers of get
+                    logging.exception("Modulus generation failed")
+                    with self._condition:
+                        self._filling = False
+                        self._condition.notify_all()
+                    return
+                with self._condition:
+                    self._moduli.append(modulus)
+                    self._filling = len(self._moduli) < self.size
+                    self._condition.notify_all()
+                    if not self._filling:
+                        break
+
+    def __len__(self):
+        return len(self._moduli)
+
+    def get(self, timeout: float = None):
+        """Draw a modulus.
+
+        A modulus being generated by the background thread is waited for,
+        since it is ready before one generated from scratch. A modulus is
+        only generated in the calling thread if the pool is empty and not
+        being refilled, or if the wait times out.
+
+        Args:
+            timeout: Optional; the maximum seconds to wait for the
+                background thread, no limit if not provided.
+
+        Returns:
+            A tuple (p, q, n, phi_n).
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._moduli or not self._filling, timeout)
+            modulus = self._moduli.popleft() if self._moduli else None
+            self._condition.notify_all()
+        return modulus or generate_modulus(self.bits)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool() -> ModulusPool:
+    """Return the pool shared by all puzzles, started on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ModulusPool()
+        return _default_pool
@@ -1,3 +1,4 @@
+import base64
 import os
 import sys
 import timeit
@@ -6,64 +7,132 @@ import subprocess
 from pvss import Pvss
 from pvss.ristretto_255 import create_ristretto_255_parameters
 
-from .algorithms.fast_exponentiation import fast_exponentiation
+from .algorithms.backend import get_backend
+from .modulus_pool import get_pool
 
 from cryptography.fernet import Fernet
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 
-def encrypt(message: bytes, seconds: int, squarings_per_second: int):
-    if not seconds or not squarings_per_second:
-        raise AssertionError
+def trapdoor_squaring(p: int, q: int, a: int, t: int, backend=None) -> int:
+    # Compute a**(2**t) % (p * q) with the factorization of the modulus:
+    # reduce 2**t modulo p - 1 and q - 1 (Euler), exponentiate modulo p
+    # and q separately and recombine with the CRT
+    backend = backend or get_backend()
+    b_p = int(backend.powmod(backend.mpz(a % p), pow(2, t, p - 1), p))
+    b_q = int(backend.powmod(backend.mpz(a % q), pow(2, t, q - 1), q))
+    return b_q + q * ((b_p - b_q) * pow(q, -1, p) % p)
 
-    # hard code safe exponent to use
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
-    )
 
-    # see RSA for security specifications
-    p, q = private_key.private_numbers().p, private_key.private_numbers().q
-    n = private_key.public_key().public_numbers().n
-    phi_n = (p - 1) * (q - 1)
+def derive_key(master_key: bytes, index: int) -> bytes:
+    # Fernet key of the index-th message of a batch puzzle
+    hkdf = HKDF(algorithm=hashes.SHA256(),
+                length=32,
+                salt=None,
+                info=b"heimdall puzzle key " + index.to_bytes(8, "big"))
+    master_key = base64.urlsafe_b64decode(master_key)
+    return base64.urlsafe_b64encode(hkdf.derive(master_key))
+
+
+def encrypt(message: bytes, seconds: float, squarings_per_second: int,
+            pool=None):
+    if not seconds or not squarings_per_second:
+        raise AssertionError
 
     # Fernet is an asymmetric encryption protocol using AES
     key = Fernet.generate_key()
-    key_int = int.from_bytes(key, sys.byteorder)
     cipher_suite = Fernet(key)
 
     # Vote Encryption
     encrypted_message = cipher_suite.encrypt(message)
 
+    p, q, n, a, t, encrypted_key, key_int = lock_key(key, seconds,
+                                                     squarings_per_second,
+                                                     pool)
+    return p, q, n, a, t, encrypted_key, encrypted_message, key_int
+
+
+def encrypt_batch(messages: [bytes], seconds: float,
+                  squarings_per_second: int, pool=None):
+    # One puzzle for messages released at the same time: the puzzle locks a
+    # master key and each message is encrypted with a key derived from it,
+    # so that solving the puzzle once decrypts all of them
+    if not seconds or not squarings_per_second:
+        raise AssertionError
+
+    master_key = Fernet.generate_key()
+    encrypted_messages = [
+        Fernet(derive_key(master_key, i)).encrypt(message)
+        for i, message in enumerate(messages)
+    ]
+
+    p, q, n, a, t, encrypted_key, key_int = lock_key(master_key, seconds,
+                                                     squarings_per_second,
+                                                     pool)
+    return p, q, n, a, t, encrypted_key, encrypted_messages, key_int
+
+
+def lock_key(key: bytes, seconds: float, squarings_per_second: int,
+             pool=None):
+    # Fresh RSA modulus, generated ahead of time by the pool
+    # An empty pool is falsy, hence the explicit None check
+    p, q, n, phi_n = (pool if pool is not None else get_pool()).get()
+    key_int = int.from_bytes(key, sys.byteorder)
+
     # Pick safe, pseudo-random a where 1 < a < n
     # Alternatively, we could use a = 2
     a = int.from_bytes(os.urandom(32), sys.byteorder) % n + 1
 
-    # Key Encryption
-    t = seconds * squarings_per_second
-    e = 2**t % phi_n
-    b = fast_exponentiation(n, a, e)
+    # Key Encryption, with the trapdoor instead of t squarings
+    t = int(seconds * squarings_per_second)
+    b = trapdoor_squaring(p, q, a, t)
 
     encrypted_key = (key_int % n + b) % n
-    return p, q, n, a, t, encrypted_key, encrypted_message, key_int
+    return p, q, n, a, t, encrypted_key, key_int
 
 
-def decrypt(n: int, a: int, t: int, enc_key: int, enc_message: int) -> bytes:
+def decrypt(n: int, a: int, t: int, enc_key: int, enc_message: int,
+            backend=None) -> bytes:
     # Successive squaring to find b
     # We assume this cannot be parallelized
-    b = a % n
-    for i in range(t):
-        b = b**2 % n
-    dec_key = (enc_key - b) % n
+    b = (backend or get_backend()).repeated_squaring(a, t, n)
+    return decrypt_solved(n, b, enc_key, enc_message)
+
 
-    # Retrieve key, decrypt message
+def decrypt_batch(n: int, a: int, t: int, enc_key: int,
+                  enc_messages: [bytes], backend=None) -> [bytes]:
+    # One sequential solve for all the messages of a batch puzzle
+    b = (backend or get_backend()).repeated_squaring(a, t, n)
+    return decrypt_batch_solved(n, b, enc_key, enc_messages)
+
+
+def solved_key(n: int, b: int, enc_key: int) -> bytes:
+    # Retrieve the key locked by the puzzle, with b = a**(2**t) % n
+    dec_key = (enc_key - b) % n
     key_bytes = int.to_bytes(dec_key, length=64, byteorder=sys.byteorder)
-    cipher_suite = Fernet(key_bytes)
+    return key_bytes.rstrip(b"\0")
+
+
+def decrypt_solved(n: int, b: int, enc_key: int, enc_message: int) -> bytes:
+    # Decrypt with b = a**(2**t) % n, found by solving the puzzle
+    cipher_suite = Fernet(solved_key(n, b, enc_key))
     return cipher_suite.decrypt(enc_message)
 
 
+def decrypt_batch_solved(n: int, b: int, enc_key: int, enc_messages: [bytes],
+                         indices: [int] = None) -> [bytes]:
+    # Decrypt messages of a batch puzzle, indices being their position in
+    # the batch (all messages of the batch in order if not provided)
+    master_key = solved_key(n, b, enc_key)
+    if indices is None:
+        indices = range(len(enc_messages))
+    return [
+        Fernet(derive_key(master_key, i)).decrypt(enc_message)
+        for i, enc_message in zip(indices, enc_messages)
+    ]
+
+
 if __name__ == '__main__':
     # We use the main function to time the accuracy of the decrypt function
     # Import the methods to use as-is
@@ -0,0 +1,259 @@
+import hashlib
+import os
+
+from pvss import Pvss
+from pvss.pvss import Poly, Secret, Share, SharedSecret, SharesChallenge, prod
+from pvss.ristretto_255 import create_ristretto_255_parameters
+
+PARAMS_FILE = "parameters.der"  # system parameters in a key directory
+
+
+def load_params(directory=None):
+    """Return the DER encoded system parameters, created on first use.
+
+    Args:
+        directory: Optional; where the parameters are persisted, new
+            parameters every time if not provided.
+    """
+    path = directory and os.path.join(directory, PARAMS_FILE)
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    params = create_ristretto_255_parameters(Pvss())
+    if path:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(params)
+    return params
+
+
+class _BatchedShares(SharedSecret):
+    """Shares of a secret whose proof covers a whole batch of secrets.
+
+    The library checks the proof of shares when they are loaded, which a
+    batched dealing has no per-secret proof for, so these are only parsed.
+    They are checked as a batch by PvssKeyManager.verify_shares.
+    """
+    def _validate(self):
+        self.coefficients
+        self.shares
+
+
+def _weights(pvss, shares):
+    """Return the weights of the secrets of a batch in its combined proof.
+
+    The weights are derived from the dealings of all secrets, so they are
+    fixed before the proof and the dealer cannot cancel a bad dealing with
+    another one.
+    """
+    transcript = hashlib.sha256(pvss.params.der)
+    for shared in shares:
+        transcript.update(shared.der)
+    digest = transcript.digest()
+    return [
+        int.from_bytes(
+            hashlib.sha256(digest + k.to_bytes(4, "big")).digest(), "big")
+        for k in range(len(shares))
+    ]
+
+
+def _combine(weights, values):
+    """Return the weighted product of the values of each secret."""
+    return [
+        prod(value ** weight for weight, value in zip(weights, column))
+        for column in zip(*values)
+    ]
+
+
+class PvssKeyManager:
+    """Long-lived PVSS keypairs and per-secret sessions.
+
+    Keypairs are created once per name and persisted, so that participants
+    keep their keys across secrets and restarts. A Pvss object only accepts
+    its shares and receiver once, so each secret gets a fresh session built
+    from the known parameters and public keys.
+
+    Args:
+        params: DER encoded system parameters.
+        directory: Optional; where keypairs are persisted, in memory only if
+            not provided. Keys are stored per system parameters, and the
+            directory should only be used by one party.
+    """
+    def __init__(self, params, directory=None):
+        self.params = params
+        self.directory = directory and os.path.join(
+            directory, hashlib.sha256(params).hexdigest()[:16])
+        self._keypairs = {}  # map from (name, kind) to (priv, pub)
+
+    def _keypair(self, name, kind, create):
+        if (name, kind) in self._keypairs:
+            return self._keypairs[(name, kind)]
+
+        paths = self.directory and [
+            os.path.join(self.directory, f"{kind}-{name}.{ext}")
+            for ext in ("key", "pub")
+        ]
+        if paths and all(os.path.exists(path) for path in paths):
+            keypair = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    keypair.append(f.read())
+            keypair = tuple(keypair)
+        else:
+            pvss = Pvss()
+            pvss.set_params(self.params)
+            keypair = create(pvss, name)
+            if paths:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                # Private keys are only readable by their owner
+                for path, der, mode in zip(paths, keypair, (0o600, 0o644)):
+                    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                                 mode)
+                    os.fchmod(fd, mode)  # also for a file left by a crash
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(der)
+
+        self._keypairs[(name, kind)] = keypair
+        return keypair
+
+    def user_keypair(self, name):
+        """Return the DER encoded (private key, public key) of a user."""
+        return self._keypair(name, "user", Pvss.create_user_keypair)
+
+    def receiver_keypair(self, name):
+        """Return the DER encoded (private key, public key) of a receiver."""
+        return self._keypair(name, "receiver", Pvss.create_receiver_keypair)
+
+    def share_secrets(self, public_keys, threshold, count):
+        """Share count independent secrets with the same users.
+
+        Each secret has its own polynomials, commitments and encrypted
+        shares, so that reconstructing one secret reveals nothing about the
+        others. The proofs are batched: a single proof covers a random
+        linear combination of the dealings, with weights derived from all of
+        them, instead of one proof per secret.
+
+        Args:
+            public_keys: The DER encoded public keys of the users.
+            threshold: The number of shares needed to reconstruct a secret.
+            count: The number of secrets.
+
+        Returns:
+            A tuple (secrets, DER encoded shares of each secret, DER encoded
+            proof of all shares).
+        """
+        pvss = self.session(public_keys)
+        params = pvss.params
+        zero = params.pre_group(0)
+        pubs = list(pvss.user_public_keys.values())
+        users = range(1, len(pubs) + 1)
+
+        secrets, shares, alphas = [], [], []
+        for _ in range(count):
+            alpha = tuple(
+                Poly((params.pre_group.rand for _ in range(threshold)), zero)
+                for _ in range(2))
+            secret = (params.G[0] ** alpha[0](0)) * (params.G[1] ** alpha[1](0))
+            coeffs = [(params.g[0] ** c0) * (params.g[1] ** c1)
+                      for c0, c1 in zip(alpha[0], alpha[1])]
+            encrypted = [(pub.pub[0] ** alpha[0](i)) * (pub.pub[1] ** alpha[1](i))
+                         for i, pub in zip(users, pubs)]
+            # The responses are in the proof of the batch
+            shares.append(_BatchedShares.create(
+                pvss,
+                [Share.create(pvss, pub.name, share, (zero, zero))
+                 for pub, share in zip(pubs, encrypted)],
+                coeffs, b""))
+            secrets.append(Secret.create(pvss, secret).der)
+            alphas.append(alpha)
+
+        # Prove the combined dealing, the way the library proves a single one
+        weights = _weights(pvss, shares)
+        alpha = tuple(
+            Poly((sum((weight * alpha[f][j]
+                       for weight, alpha in zip(weights, alphas)), zero)
+                  for j in range(threshold)), zero)
+            for f in range(2))
+        coeffs = _combine(weights, [shared.coefficients for shared in shares])
+        encrypted = _combine(
+            weights, [[share.share for share in shared.shares]
+                      for shared in shares])
+        X = [(params.g[0] ** alpha[0](i)) * (params.g[1] ** alpha[1](i))
+             for i in users]
+        k = [(params.pre_group.rand, params.pre_group.rand) for _ in pubs]
+        r = [((params.g[0] ** k0) * (params.g[1] ** k1),
+              (pub.pub[0] ** k0) * (pub.pub[1] ** k1))
+             for pub, (k0, k1) in zip(pubs, k)]
+        challenge = SharesChallenge.create(pvss, pubs, coeffs, X, encrypted, r)
+        c = challenge.challenge
+        proof = _BatchedShares.create(
+            pvss,
+            [Share.create(pvss, pub.name, share,
+                          (k0 + alpha[0](i) * c, k1 + alpha[1](i) * c))
+             for i, pub, share, (k0, k1) in zip(users, pubs, encrypted, k)],
+            coeffs, challenge.digest)
+        return secrets, [shared.der for shared in shares], proof.der
+
+    def verify_shares(self, public_keys, shares, proof):
+        """Check the shares of a batch of secrets against their proof.
+
+        The per-secret checks are combined with the weights of the dealer,
+        and the combined dealing is checked by the library like the dealing
+        of a single secret.
+
+        Args:
+            public_keys: The DER encoded public keys of the users.
+            shares: The DER encoded shares of each secret.
+            proof: The DER encoded proof of all shares.
+
+        Raises:
+            ValueError: If the shares or the proof are invalid.
+        """
+        pvss = self.session(public_keys)
+        shares = [_BatchedShares.from_der(pvss, der) for der in shares]
+        proof = _BatchedShares.from_der(pvss, proof)
+        names = [share.pub_name for share in proof.shares]
+        if not shares or any(
+                [share.pub_name for share in shared.shares] != names
+                or len(shared.coefficients) != len(proof.coefficients)
+                for shared in shares):
+            raise ValueError("Shares do not match their proof")
+
+        weights = _weights(pvss, shares)
+        coeffs = _combine(weights, [shared.coefficients for shared in shares])
+        encrypted = _combine(
+            weights, [[share.share for share in shared.shares]
+                      for shared in shares])
+        # Checked when created, with the responses and challenge of the proof
+        SharedSecret.create(
+            pvss,
+            [Share.create(pvss, share.pub_name, combined, share.resp)
+             for share, combined in zip(proof.shares, encrypted)],
+            coeffs, proof.digest)
+
+    def session(self, public_keys=(), shares=None, receiver_pub=None,
+                batched=False):
+        """Return a Pvss object for one secret.
+
+        Args:
+            public_keys: Optional; the DER encoded public keys of the users.
+            shares: Optional; the DER encoded shares of the secret.
+            receiver_pub: Optional; the DER encoded public key of the
+                receiver.
+            batched: Optional; whether the shares are from share_secrets,
+                with their proof checked by verify_shares or received from
+                the dealer itself.
+        """
+        pvss = Pvss()
+        pvss.set_params(self.params)
+        for pub in public_keys:
+            pvss.add_user_public_key(pub)
+        if shares is not None and batched:
+            # Set once like Pvss.set_shares, without its per-secret proof
+            pvss._shares = _BatchedShares.from_der(pvss, shares)
+        elif shares is not None:
+            pvss.set_shares(shares)
+        if receiver_pub is not None:
+            pvss.set_receiver_public_key(receiver_pub)
+        return pvss
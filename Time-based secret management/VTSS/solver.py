@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from . import puzzle
+from .algorithms.backend import SQUARING_CHUNK, get_backend
+
+CHECKPOINT_INTERVAL = 10  # seconds between two checkpoints
+
+
+class PuzzleSolver:
+    """A resumable solver of a time-lock puzzle.
+
+    The solver computes b = a**(2**t) % n in chunks of SQUARING_CHUNK
+    squarings and checkpoints (i, b) to disk, i being the number of
+    squarings done, so that a restarted solver resumes from the latest
+    checkpoint instead of starting over. A checkpoint is only resumed for
+    the same puzzle (n, a, t).
+
+    Args:
+        n: The RSA modulus of the puzzle.
+        a: The base of the puzzle.
+        t: The number of squarings.
+        checkpoint_path: Optional; the checkpoint file, no checkpoint if not
+            provided.
+        backend: Optional; the modular arithmetic backend, the fastest
+            available if not provided.
+        checkpoint_interval: Optional; the seconds between two checkpoints.
+        on_checkpoint: Optional; a function called with the solver after
+            each checkpoint, to report progress.
+    """
+    def __init__(self,
+                 n: int,
+                 a: int,
+                 t: int,
+                 checkpoint_path: str = None,
+                 backend=None,
+                 checkpoint_interval: float = CHECKPOINT_INTERVAL,
+                 on_checkpoint=None):
+        self.n, self.a, self.t = n, a, t
+        self.checkpoint_path = checkpoint_path
+        self.backend = backend or get_backend()
+        self.checkpoint_interval = checkpoint_interval
+        self.on_checkpoint = on_checkpoint
+        self.i, self.b = 0, a % n  # squarings done and current value
+        self.rate = None  # squarings per second of the current run
+        self.elapsed = 0  # seconds spent solving by the current run
+        self.error = None  # exception raised by a background solve
+        self._done = threading.Event()
+        self._thread = None
+        self._load_checkpoint()
+        if self.done():
+            self._done.set()
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return
+        if [checkpoint.get(k) for k in "nat"] == [self.n, self.a, self.t]:
+            self.i, self.b = checkpoint["i"], checkpoint["b"]
+            logging.info(f"Resuming puzzle at {self.i}/{self.t} squarings")
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        checkpoint = {"n": self.n, "a": self.a, "t": self.t,
+                      "i": self.i, "b": self.b}
+        # Write then rename, so that a crash never leaves a partial file
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".",
+                    exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def solve(self) -> int:
+        """Solve the puzzle in the calling thread and return b."""
+        start = last_checkpoint = time.perf_counter()
+        start_i = self.i
+        while self.i < self.t:
+            k = min(self.t - self.i, SQUARING_CHUNK)
+            b = self.backend.repeated_squaring(self.b, k, self.n)
+            self.i, self.b = self.i + k, b
+
+            now = time.perf_counter()
+            self.elapsed = now - start
+            if self.elapsed:
+                self.rate = (self.i - start_i) / self.elapsed
+            if now - last_checkpoint >= self.checkpoint_interval:
+                self._save_checkpoint()
+                last_checkpoint = now
+                logging.info(f"Puzzle {self.progress():.0%} solved, "
+                             f"{self.eta():.0f}s left")
+                if self.on_checkpoint:
+                    self.on_checkpoint(self)
+
+        self._save_checkpoint()
+        self._done.set()
+        return self.b
+
+    def start(self, callback=None):
+        """Solve the puzzle in a background thread.
+
+        Args:
+            callback: Optional; a function called with the solver once the
+                puzzle is solved.
+        """
+        def run():
+            try:
+                self.solve()
+            except Exception as e:
+                self.error = e
+                self._done.set()
+                raise
+            if callback:
+                callback(self)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: float = None) -> int:
+        """Wait for a background solve and return b, or None on timeout."""
+        if not self._done.wait(timeout):
+            return None
+        if self.error:
+            raise self.error
+        return self.b
+
+    def done(self) -> bool:
+        return self.i >= self.t
+
+    def progress(self) -> float:
+        """Return the fraction of squarings done."""
+        return self.i / self.t if self.t else 1.0
+
+    def eta(self) -> float:
+        """Return the estimated seconds left, or None before the first chunk."""
+        if self.done():
+            return 0.0
+        if not self.rate:
+            return None
+        return (self.t - self.i) / self.rate
+
+    def _solved(self, timeout: float = None) -> int:
+        b = self.b if self.done() else self.wait(timeout)
+        if b is None:
+            raise TimeoutError("Puzzle not solved yet")
+        return b
+
+    def decrypt(self, enc_key: int, enc_message: bytes,
+                timeout: float = None) -> bytes:
+        """Wait for the puzzle to be solved and decrypt its message."""
+        return puzzle.decrypt_solved(self.n, self._solved(timeout), enc_key,
+                                     enc_message)
+
+    def decrypt_batch(self, enc_key: int, enc_messages: [bytes],
+                      indices: [int] = None,
+                      timeout: float = None) -> [bytes]:
+        """Wait for a batch puzzle to be solved and decrypt its messages.
+
+        Args:
+            enc_key: The encrypted master key.
+            enc_messages: The encrypted messages.
+            indices: Optional; the positions of the messages in the batch,
+                all messages in order if not provided.
+            timeout: Optional; the seconds to wait for the solve.
+        """
+        return puzzle.decrypt_batch_solved(self.n, self._solved(timeout),
+                                           enc_key, enc_messages, indices)
@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .algorithms.backend import get_backend
+from .solver import PuzzleSolver
+
+PROGRESS_INTERVAL = 5  # seconds between two progress reports of a worker
+
+_progress = None  # queue of the progress of the pool, in worker processes
+
+
+def _init_worker(progress):
+    global _progress
+    _progress = progress
+
+
+def _solve(job: int, n: int, a: int, t: int, checkpoint_path: str,
+           backend_name: str) -> int:
+    # Run in a worker process, reporting (job, squarings done, rate) to the
+    # pool at every checkpoint
+    solver = PuzzleSolver(
+        n, a, t,
+        checkpoint_path=checkpoint_path,
+        backend=get_backend(backend_name),
+        checkpoint_interval=PROGRESS_INTERVAL,
+        on_checkpoint=lambda solver: _progress.put(
+            (job, solver.i, solver.rate)))
+    _progress.put((job, solver.i, None))  # resumed from a checkpoint
+    return solver.solve()
+
+
+class SolverPool:
+    """A pool of processes solving independent time-lock puzzles.
+
+    Each puzzle is sequential, but puzzles with different moduli are solved
+    in parallel, one per process. Waiting puzzles are queued by deadline,
+    so that the puzzle due first is the next one to get a free process.
+    Workers report their progress back to the pool, see progress and eta.
+
+    Args:
+        workers: Optional; the number of processes, one per CPU if not
+            provided.
+        backend: Optional; the name of the modular arithmetic backend, the
+            fastest available if not provided.
+    """
+    def __init__(self, workers: int = None, backend: str = None):
+        self.workers = workers or os.cpu_count()
+        self.backend = get_backend(backend).name
+        self._progress_queue = multiprocessing.Queue()
+        self._executor = ProcessPoolExecutor(self.workers,
+                                             initializer=_init_worker,
+                                             initargs=(self._progress_queue,))
+        self._queue = []  # heap of (deadline, job, (future, args))
+        self._jobs = itertools.count()  # FIFO among equal deadlines
+        self._status = {}  # map from future to [job, t, i, rate]
+        self._futures = {}  # map from job to future
+        self._shutdown = False
+        self._condition = threading.Condition()
+        self._free = threading.Semaphore(self.workers)
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def submit(self, n: int, a: int, t: int, deadline: float = None,
+               checkpoint_path: str = None) -> Future:
+        """Queue a puzzle.
+
+        Args:
+            n: The RSA modulus of the puzzle.
+            a: The base of the puzzle.
+            t: The number of squarings.
+            deadline: Optional; the time (as in time.time()) the puzzle
+                should be solved by, queued last if not provided.
+            checkpoint_path: Optional; the checkpoint file of the solver.
+
+        Returns:
+            A future of b = a**(2**t) % n, to decrypt the puzzle with
+            puzzle.decrypt_solved or puzzle.decrypt_batch_solved.
+        """
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit a puzzle after shutdown")
+            job = next(self._jobs)
+            self._status[future] = [job, t, 0, None]
+            self._futures[job] = future
+            args = (job, n, a, t, checkpoint_path, self.backend)
+            heapq.heappush(self._queue, (deadline if deadline is not None
+                                         else float("inf"),
+                                         job, (future, args)))
+            self._condition.notify()
+        future.add_done_callback(self._forget)
+        return future
+
+    def pending(self) -> int:
+        """Return the number of puzzles waiting for a process."""
+        return len(self._queue)
+
+    def progress(self, future: Future) -> float:
+        """Return the fraction of squarings done for a submitted puzzle."""
+        if future.done():
+            return 1.0
+        _, t, i, _ = self._status.get(future, (None, 0, 0, None))
+        return i / t if t else 0.0
+
+    def eta(self, future: Future) -> float:
+        """Return the estimated seconds left for a puzzle being solved, or
+        None before its first report."""
+        if future.done():
+            return 0.0
+        _, t, i, rate = self._status.get(future, (None, 0, 0, None))
+        if not rate:
+            return None
+        return (t - i) / rate
+
+    def _listen(self):
+        while True:
+            report = self._progress_queue.get()
+            if report is None:
+                return
+            job, i, rate = report
+            with self._condition:
+                future = self._futures.get(job)
+                if future is None:
+                    continue
+                status = self._status[future]
+                status[2] = i
+                status[3] = rate or status[3]
+            if rate:
+                logging.info(f"Puzzle {self.progress(future):.0%} solved, "
+                             f"{self.eta(future):.0f}s left")
+
+    def _forget(self, future: Future):
+        with self._condition:
+            status = self._status.pop(future, None)
+            if status:
+                self._futures.pop(status[0], None)
+
+    def _dispatch(self):
+        while True:
+            self._free.acquire()
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._queue or self._shutdown)
+                if self._shutdown:
+                    return
+                _, _, (future, args) = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                self._free.release()
+                continue
+            try:
+                done = self._executor.submit(_solve, *args)
+            except Exception as e:  # e.g. a broken pool
+                self._free.release()
+                future.set_exception(e)
+                continue
+            done.add_done_callback(
+                lambda done, future=future: self._deliver(done, future))
+
+    def _deliver(self, done: Future, future: Future):
+        self._free.release()
+        if done.cancelled():
+            future.set_exception(RuntimeError("Solver pool shut down"))
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes, cancelling queued puzzles."""
+        with self._condition:
+            self._shutdown = True
+            for _, _, (future, _) in self._queue:
+                future.cancel()
+            self._queue.clear()
+            self._condition.notify_all()
+        self._free.release()  # wake up the dispatcher if all workers busy
+        self._executor.shutdown(wait=wait)
+        self._progress_queue.put(None)
@@ -0,0 +1,215 @@
+import asyncio
+import functools
+import json
+import os
+import re
+import subprocess
+import tempfile
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+
+from py_ecc.optimized_bn128 import (FQ, FQ2, FQ12, add, b, b2,
+                                    curve_order, final_exponentiate, is_inf,
+                                    is_on_curve, multiply, neg, pairing)
+from py_ecc.optimized_bn128.optimized_pairing import (cast_point_to_fq12,
+                                                      miller_loop, twist)
+
+CIRCUIT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                           "circuit")
+
+
+def _g1(point):
+    # snarkjs G1 point [x, y, z] in projective coordinates
+    x, y, z = (FQ(int(c)) for c in point)
+    point = (x, y, z)
+    if not is_on_curve(point, b):
+        raise ValueError("G1 point not on curve")
+    return point
+
+
+def _g2(point):
+    # snarkjs G2 point [[x0, x1], [y0, y1], [z0, z1]], FQ2 as c0 + c1 * i
+    point = tuple(FQ2([int(c) for c in coords]) for coords in point)
+    if not is_on_curve(point, b2):
+        raise ValueError("G2 point not on curve")
+    # G2 has a cofactor, G1 does not
+    if not is_inf(multiply(point, curve_order)):
+        raise ValueError("G2 point not in subgroup")
+    return point
+
+
+class VerificationKey:
+    """A Groth16 verification key of snarkjs, preprocessed for pairings.
+
+    The pairing e(alpha, beta) and the twisted G2 points are computed once,
+    so that each verification only costs three Miller loops and a single
+    final exponentiation.
+
+    Args:
+        vk: The dict of a snarkjs verification_key.json.
+    """
+    def __init__(self, vk):
+        if vk.get("protocol") != "groth16" or vk.get("curve") != "bn128":
+            raise ValueError("Not a Groth16 bn128 verification key")
+        self.n_public = int(vk["nPublic"])
+        self.ic = [_g1(point) for point in vk["IC"]]
+        if len(self.ic) != self.n_public + 1:
+            raise ValueError("IC does not match nPublic")
+        alpha, beta = _g1(vk["vk_alpha_1"]), _g2(vk["vk_beta_2"])
+        self.alpha_beta = pairing(beta, alpha)
+        self.gamma = twist(_g2(vk["vk_gamma_2"]))
+        self.delta = twist(_g2(vk["vk_delta_2"]))
+
+    def verify(self, proof, public):
+        """Verify a proof.
+
+        Args:
+            proof: The dict of a snarkjs proof.json.
+            public: The list of public signals of a snarkjs public.json.
+
+        Returns:
+            True if the proof is valid, False otherwise.
+        """
+        try:
+            a, b_, c = (_g1(proof["pi_a"]), _g2(proof["pi_b"]),
+                        _g1(proof["pi_c"]))
+            public = [int(signal) for signal in public]
+        except (KeyError, TypeError, ValueError):
+            return False
+        if is_inf(a) or is_inf(b_) or len(public) != self.n_public or \
+                any(not 0 <= signal < curve_order for signal in public):
+            return False
+
+        vk_x = self.ic[0]
+        for point, signal in zip(self.ic[1:], public):
+            vk_x = add(vk_x, multiply(point, signal))
+
+        # e(A, B) == e(alpha, beta) e(vk_x, gamma) e(C, delta)
+        f = miller_loop(twist(b_), cast_point_to_fq12(neg(a)),
+                        final_exponentiate=False)
+        for q, p in ((self.gamma, vk_x), (self.delta, c)):
+            if not is_inf(p):
+                f = f * miller_loop(q, cast_point_to_fq12(p),
+                                    final_exponentiate=False)
+        return final_exponentiate(f) * self.alpha_beta == FQ12.one()
+
+
+@functools.lru_cache()
+def _load(path, mtime):
+    with open(path) as f:
+        return VerificationKey(json.load(f))
+
+
+def load_verification_key(path=None):
+    """Return the preprocessed verification key of a file.
+
+    Keys are cached, and only loaded again when the file changes.
+
+    Args:
+        path: Optional; the path of a snarkjs verification_key.json, the
+            key of the circuit of this module if not provided.
+    """
+    path = path or os.path.join(CIRCUIT_DIR, "verification_key.json")
+    return _load(os.path.realpath(path), os.path.getmtime(path))
+
+
+def verify_subprocess(vk, proof, public):
+    """Verify a proof with the snarkjs command line, in a private directory.
+
+    Returns:
+        True if snarkjs accepts the proof.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        for name, data in (("verification_key", vk), ("proof", proof),
+                           ("public", public)):
+            with open(os.path.join(directory, name + ".json"), "w") as f:
+                json.dump(data, f)
+        result = subprocess.run(["snarkjs", "groth16", "verify",
+                                 "verification_key.json", "public.json",
+                                 "proof.json"],
+                                cwd=directory,
+                                capture_output=True)
+    output = re.sub(r'\x1b\[[0-9;]*m', '', result.stdout.decode('utf-8'))
+    return "snarkJS: OK" in output
+
+
+def _verify(path, proof, public):
+    # Run in a worker process, each loading the key once
+    return load_verification_key(path).verify(proof, public)
+
+
+class VerifierPool:
+    """A pool of processes verifying proofs against one verification key.
+
+    py_ecc is pure Python and holds the GIL for the whole verification, so
+    proofs are verified in other processes, in parallel and without
+    blocking the event loop.
+
+    Args:
+        path: Optional; the path of a snarkjs verification_key.json, the
+            key of the circuit of this module if not provided.
+        workers: Optional; the number of processes, one per CPU if not
+            provided.
+    """
+    def __init__(self, path=None, workers=None):
+        self.path = os.path.realpath(
+            path or os.path.join(CIRCUIT_DIR, "verification_key.json"))
+        self._executor = ProcessPoolExecutor(workers)
+
+    def submit(self, proof, public):
+        """Queue a proof, and return the future of its validity."""
+        return self._executor.submit(_verify, self.path, proof, public)
+
+    async def verify_async(self, proof, public):
+        """Verify a proof without blocking the event loop.
+
+        Returns:
+            True if the proof is valid, False otherwise.
+        """
+        return await asyncio.wrap_future(self.submit(proof, public))
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=wait)
+
+
+def benchmark(circuit_dir=CIRCUIT_DIR, repeats=5):
+    """Time the in-process verifier against the snarkjs command line.
+
+    Args:
+        circuit_dir: Optional; the directory of verification_key.json,
+            proof.json and public.json.
+        repeats: Optional; the number of verifications timed.
+
+    Returns:
+        A dict mapping each verifier to its mean time in seconds, None for
+        snarkjs if it is not installed.
+    """
+    data = {}
+    for name in ("verification_key", "proof", "public"):
+        with open(os.path.join(circuit_dir, name + ".json")) as f:
+            data[name] = json.load(f)
+    vk, proof, public = data["verification_key"], data["proof"], data["public"]
+
+    results = {
+        "load": timeit.timeit(lambda: VerificationKey(vk), number=1),
+    }
+    key = VerificationKey(vk)
+    if not key.verify(proof, public):
+        raise ValueError("Invalid proof in " + circuit_dir)
+    results["py_ecc"] = timeit.timeit(lambda: key.verify(proof, public),
+                                      number=repeats) / repeats
+    try:
+        results["snarkjs"] = timeit.timeit(
+            lambda: verify_subprocess(vk, proof, public),
+            number=repeats) / repeats
+    except FileNotFoundError:
+        results["snarkjs"] = None
+    return results
+
+
+if __name__ == '__main__':
+    # Run as python -m ZK.groth16
+    for name, seconds in benchmark().items():
+        print(f"{name:>8}: " + ("not installed" if seconds is None else
+                                f"{seconds * 1000:.1f} ms"))
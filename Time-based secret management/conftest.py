@@ -0,0 +1,2 @@
+# Puts this directory on sys.path, so that tests import its packages from any
+# working directory
@@ -0,0 +1,49 @@
+import pytest
+
+from VTSS.algorithms import backend
+
+N = 61 * 53
+BACKENDS = list(backend.BACKENDS)
+
+
+def test_get_backend():
+    assert backend.get_backend().name == \
+        ("gmpy2" if backend.gmpy2 is not None else "int")
+    assert backend.get_backend("int").name == "int"
+    with pytest.raises(ValueError):
+        backend.get_backend("unknown")
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_repeated_squaring(name, monkeypatch):
+    # Chunks of 7 squarings, so that t spans several chunks
+    monkeypatch.setattr(backend, "SQUARING_CHUNK", 7)
+    arithmetic = backend.get_backend(name)
+    for base in (2, 5, N + 7):
+        for t in (0, 1, 6, 7, 8, 100):
+            result = arithmetic.repeated_squaring(base, t, N)
+            assert result == pow(base, 2**t, N)
+            assert type(result) is int
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_powmod(name):
+    arithmetic = backend.get_backend(name)
+    n = arithmetic.mpz((1 << 127) - 1)
+    assert int(arithmetic.powmod(arithmetic.mpz(3), 1 << 100, n)) == \
+        pow(3, 1 << 100, (1 << 127) - 1)
+
+
+@pytest.mark.skipif(backend.gmpy2 is None, reason="gmpy2 is not installed")
+def test_backends_agree():
+    mod = (1 << 521) - 1
+    results = {
+        name: backend.get_backend(name).repeated_squaring(3, 1000, mod)
+        for name in ("int", "gmpy2")
+    }
+    assert results["int"] == results["gmpy2"]
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_squarings_per_second(name):
+    assert backend.get_backend(name).squarings_per_second(256, 1000) > 0
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from VTSS import calibration, modulus_pool, puzzle
+from VTSS.algorithms.backend import get_backend
+
+BITS = 1024  # smallest size accepted by cryptography
+RATE = 5000  # squarings per second of the fake benchmark
+
+
+@pytest.fixture
+def benchmarks(monkeypatch):
+    calls = []
+
+    def benchmark(bits, backend):
+        calls.append((bits, backend.name))
+        return RATE + len(calls)
+
+    monkeypatch.setattr(calibration, "benchmark", benchmark)
+    return calls
+
+
+def test_benchmark():
+    assert calibration.benchmark(256, squarings=1000) > 0
+
+
+def test_persisted(tmp_path, benchmarks):
+    path = str(tmp_path / "calibration" / "rates.json")
+    backend = get_backend("int")
+    rate = calibration.squarings_per_second(BITS, backend, path)
+    assert rate == RATE + 1
+    assert calibration.squarings_per_second(BITS, backend, path) == rate
+    assert benchmarks == [(BITS, "int")]
+    with open(path) as f:
+        assert list(json.load(f).values()) == [rate]
+
+    # Keyed by modulus size and backend, refreshed on demand
+    assert calibration.squarings_per_second(2 * BITS, backend, path) == \
+        RATE + 2
+    assert calibration.squarings_per_second(BITS, backend, path,
+                                            refresh=True) == RATE + 3
+    assert calibration.squarings_per_second(BITS, backend, path) == RATE + 3
+    assert len(benchmarks) == 3
+
+
+def test_unreadable_and_unwritable(tmp_path, benchmarks):
+    path = tmp_path / "rates.json"
+    path.write_text("not json")
+    assert calibration.squarings_per_second(BITS, path=str(path)) == RATE + 1
+
+    # A rate that cannot be persisted is still returned
+    path = tmp_path / "file" / "rates.json"
+    (tmp_path / "file").write_text("")
+    assert calibration.squarings_per_second(BITS, path=str(path)) == RATE + 2
+
+
+def test_encrypt_decrypt(tmp_path, monkeypatch, benchmarks):
+    pool = modulus_pool.ModulusPool(size=1, refill_threshold=1, bits=BITS)
+    monkeypatch.setattr(puzzle, "get_pool", lambda: pool)
+    path = str(tmp_path / "rates.json")
+
+    p, q, n, a, t, enc_key, enc_message, _ = calibration.encrypt(
+        b"message", 0.5, path=path)
+    assert t == int(0.5 * (RATE + 1))
+    message, elapsed, target = calibration.decrypt(n, a, t, enc_key,
+                                                   enc_message, path=path)
+    assert message == b"message"
+    assert target == t / (RATE + 1)
+    assert elapsed >= 0
+    assert len(benchmarks) == 1
@@ -0,0 +1,57 @@
+import secrets
+
+import pytest
+
+from VTSS.algorithms import backend, fast_exponentiation as fe
+
+BACKENDS = list(backend.BACKENDS)
+N = (1 << 127) - 1
+
+
+def test_window_size():
+    sizes = [fe.window_size(bits) for bits in range(0, 4096, 8)]
+    assert sizes == sorted(sizes)
+    assert sizes[0] == 1 and sizes[-1] == 6
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_fast_exponentiation(name):
+    arithmetic = backend.get_backend(name)
+    exponents = [0, 1, 2, 3, 0b1011, 1 << 100, (1 << 100) - 1]
+    # Exponents of every window size
+    exponents += [secrets.randbits(bits) for bits in (20, 60, 200, 600, 2000)]
+    for g in (0, 1, 2, secrets.randbits(127), N + 5):
+        for x in exponents:
+            result = fe.fast_exponentiation(N, g, x, arithmetic)
+            assert result == pow(g, x, N)
+            assert type(result) is int
+    with pytest.raises(ValueError):
+        fe.fast_exponentiation(N, 2, -1, arithmetic)
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_multi_exponentiation(name):
+    arithmetic = backend.get_backend(name)
+    pairs = [(secrets.randbits(127), secrets.randbits(bits))
+             for bits in (0, 1, 64, 127, 300)]
+    expected = 1
+    for g, x in pairs:
+        expected = expected * pow(g, x, N) % N
+    for window in (1, 4, 5):
+        assert fe.multi_exponentiation(N, pairs, window, arithmetic) == \
+            expected
+    assert fe.multi_exponentiation(N, [], backend=arithmetic) == 1
+    with pytest.raises(ValueError):
+        fe.multi_exponentiation(N, [(2, -1)], backend=arithmetic)
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_fixed_base_table(name):
+    g = secrets.randbits(127)
+    table = fe.FixedBaseTable(N, g, 256, window=5,
+                              backend=backend.get_backend(name))
+    for x in (0, 1, 31, 32, secrets.randbits(256), (1 << 256) - 1):
+        assert table.pow(x) == pow(g, x, N)
+    for x in (-1, 1 << 256):
+        with pytest.raises(ValueError):
+            table.pow(x)
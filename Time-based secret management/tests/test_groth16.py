@@ -0,0 +1,87 @@
+import asyncio
+import copy
+import json
+import os
+import shutil
+
+import pytest
+from py_ecc.optimized_bn128 import curve_order
+
+from ZK import groth16
+
+
+def load(name):
+    with open(os.path.join(groth16.CIRCUIT_DIR, name + ".json")) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def vk():
+    return groth16.load_verification_key()
+
+
+@pytest.fixture
+def proof():
+    return load("proof")
+
+
+@pytest.fixture
+def public():
+    return load("public")
+
+
+def test_valid_proof(vk, proof, public):
+    assert vk.verify(proof, public)
+
+
+def test_modified_public_signal(vk, proof, public):
+    public[0] = str(int(public[0]) + 1)
+    assert not vk.verify(proof, public)
+
+
+def test_swapped_points(vk, proof, public):
+    proof["pi_a"], proof["pi_c"] = proof["pi_c"], proof["pi_a"]
+    assert not vk.verify(proof, public)
+
+
+def test_malformed(vk, proof, public):
+    # Rejected before any pairing
+    not_on_curve = copy.deepcopy(proof)
+    not_on_curve["pi_a"][0] = str(int(proof["pi_a"][0]) + 1)
+    assert not vk.verify(not_on_curve, public)
+    assert not vk.verify({"pi_a": proof["pi_a"]}, public)
+    assert not vk.verify(proof, public[:-1])
+    assert not vk.verify(proof, ["x"] + public[1:])
+    assert not vk.verify(proof, [str(curve_order)] + public[1:])
+
+
+def test_invalid_key():
+    vk = load("verification_key")
+    with pytest.raises(ValueError):
+        groth16.VerificationKey(dict(vk, protocol="plonk"))
+    with pytest.raises(ValueError):
+        groth16.VerificationKey(dict(vk, IC=vk["IC"][:-1]))
+
+
+def test_key_cache(tmp_path, vk):
+    assert groth16.load_verification_key() is vk
+    path = str(tmp_path / "verification_key.json")
+    shutil.copy(os.path.join(groth16.CIRCUIT_DIR, "verification_key.json"),
+                path)
+    copied = groth16.load_verification_key(path)
+    assert copied is not vk
+    assert groth16.load_verification_key(path) is copied
+
+
+def test_verifier_pool(proof, public):
+    pool = groth16.VerifierPool(workers=1)
+    try:
+        invalid = dict(proof, pi_a=proof["pi_c"])
+
+        async def verify():
+            return await asyncio.gather(pool.verify_async(proof, public),
+                                        pool.verify_async(invalid, public))
+
+        assert asyncio.run(verify()) == [True, False]
+    finally:
+        pool.shutdown()
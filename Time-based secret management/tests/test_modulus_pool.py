@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from VTSS import modulus_pool, puzzle
+
+BITS = 1024  # smallest size accepted by cryptography
+
+
+def wait_full(pool, timeout=30):
+    deadline = time.monotonic() + timeout
+    while len(pool) < pool.size and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return len(pool)
+
+
+def test_modulus():
+    p, q, n, phi_n = modulus_pool.generate_modulus(BITS)
+    assert p * q == n and p != q
+    assert n.bit_length() == BITS
+    assert phi_n == (p - 1) * (q - 1)
+
+
+def test_distinct_moduli():
+    pool = modulus_pool.ModulusPool(size=2, refill_threshold=1, bits=BITS)
+    moduli = [pool.get()[2] for _ in range(6)]
+    assert len(set(moduli)) == len(moduli)
+
+
+def test_refill():
+    pool = modulus_pool.ModulusPool(size=3, refill_threshold=0, bits=BITS)
+    assert wait_full(pool) == 3
+    pool.get()
+    pool.get()
+    time.sleep(0.1)
+    assert len(pool) == 1  # still above the threshold
+    pool.get()
+    assert wait_full(pool) == 3
+
+
+def test_waits_for_background_modulus(monkeypatch):
+    calls = []
+    generate = modulus_pool.generate_modulus
+
+    def counting_generate(bits):
+        calls.append(bits)
+        return generate(bits)
+
+    monkeypatch.setattr(modulus_pool, "generate_modulus", counting_generate)
+    pool = modulus_pool.ModulusPool(size=1, refill_threshold=1, bits=BITS)
+    pool.get()  # drawn before the background modulus is ready
+    assert wait_full(pool) == 1
+    assert len(calls) == 2  # one drawn, one refilled
+
+
+def test_failing_generation():
+    # 512-bit keys are rejected, so the filler stops and get raises
+    pool = modulus_pool.ModulusPool(size=1, refill_threshold=1, bits=512)
+    with pytest.raises(ValueError):
+        pool.get(timeout=30)
+
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        modulus_pool.ModulusPool(size=0, refill_threshold=0)
+    with pytest.raises(ValueError):
+        modulus_pool.ModulusPool(size=2, refill_threshold=3)
+
+
+def test_puzzle_draws_from_empty_pool(monkeypatch):
+    monkeypatch.setattr(puzzle, "get_pool", lambda: pytest.fail(
+        "an empty pool must not fall back to the shared pool"))
+    pool = modulus_pool.ModulusPool(size=1, refill_threshold=1, bits=BITS)
+    p, q, n, a, t, enc_key, enc_message, _ = puzzle.encrypt(
+        b"message", 1, 100, pool=pool)
+    assert n.bit_length() == BITS
+    assert puzzle.decrypt(n, a, t, enc_key, enc_message) == b"message"
@@ -0,0 +1,83 @@
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+from VTSS import modulus_pool, puzzle
+from VTSS.algorithms.backend import BACKENDS
+
+BITS = 1024  # smallest size accepted by cryptography
+
+
+@pytest.fixture(scope="module")
+def modulus():
+    return modulus_pool.generate_modulus(BITS)
+
+
+@pytest.fixture
+def pool():
+    return modulus_pool.ModulusPool(size=1, refill_threshold=1, bits=BITS)
+
+
+@pytest.mark.parametrize("backend", BACKENDS.values(), ids=BACKENDS.keys())
+def test_trapdoor_matches_squaring(modulus, backend):
+    p, q, n, _ = modulus
+    for a, t in ((2, 0), (2, 1), (3, 64), (n - 1, 999), (n // 3, 20000)):
+        assert puzzle.trapdoor_squaring(p, q, a, t, backend) == \
+            backend.repeated_squaring(a, t, n)
+
+
+def test_trapdoor_base_sharing_a_factor():
+    # Euler's reduction of the exponent also holds for multiples of p or q
+    p, q = 61, 53
+    for a in (p, 2 * p, q, p * q - q):
+        for t in (1, 7, 100):
+            assert puzzle.trapdoor_squaring(p, q, a, t) == \
+                pow(a, 2**t, p * q)
+
+
+def test_trapdoor_large_t(modulus):
+    # t far beyond what could be squared, reduced modulo p - 1 and q - 1
+    p, q, n, phi_n = modulus
+    t = 10**12
+    assert puzzle.trapdoor_squaring(p, q, 5, t) == \
+        pow(5, pow(2, t, phi_n), n)
+
+
+def test_lock_key(pool):
+    key = b"0123456789abcdef"
+    p, q, n, a, t, enc_key, key_int = puzzle.lock_key(key, 2, 500, pool)
+    assert t == 1000
+    b = BACKENDS["int"].repeated_squaring(a, t, n)
+    assert puzzle.solved_key(n, b, enc_key) == key
+
+
+def test_derive_key():
+    master_key = Fernet.generate_key()
+    keys = [puzzle.derive_key(master_key, i) for i in range(4)]
+    assert len(set(keys)) == 4
+    assert keys == [puzzle.derive_key(master_key, i) for i in range(4)]
+    assert puzzle.derive_key(Fernet.generate_key(), 0) != keys[0]
+    Fernet(keys[0])  # a valid Fernet key
+
+
+def test_batch_lock_unlock(pool):
+    messages = [f"message {i}".encode() for i in range(5)]
+    p, q, n, a, t, enc_key, enc_messages, _ = puzzle.encrypt_batch(
+        messages, 1, 300, pool=pool)
+    assert len(enc_messages) == len(messages)
+    # One solve opens every message
+    assert puzzle.decrypt_batch(n, a, t, enc_key, enc_messages) == messages
+
+    b = puzzle.trapdoor_squaring(p, q, a, t)
+    assert puzzle.decrypt_batch_solved(n, b, enc_key, enc_messages) == \
+        messages
+    assert puzzle.decrypt_batch_solved(
+        n, b, enc_key, [enc_messages[3], enc_messages[1]], [3, 1]) == \
+        [messages[3], messages[1]]
+
+
+def test_batch_message_needs_its_index(pool):
+    p, q, n, a, t, enc_key, enc_messages, _ = puzzle.encrypt_batch(
+        [b"first", b"second"], 1, 300, pool=pool)
+    b = puzzle.trapdoor_squaring(p, q, a, t)
+    with pytest.raises(InvalidToken):
+        puzzle.decrypt_batch_solved(n, b, enc_key, enc_messages[1:], [0])
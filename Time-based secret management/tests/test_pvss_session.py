@@ -0,0 +1,119 @@
+import os
+import stat
+
+import pytest
+
+from VTSS import pvss_session
+
+NAMES = ("Chris", "Alice", "Boris")
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return pvss_session.PvssKeyManager(pvss_session.load_params())
+
+
+@pytest.fixture(scope="module")
+def users(keys):
+    return [keys.user_keypair(name) for name in NAMES]
+
+
+def public_keys(users):
+    return [pub for _, pub in users]
+
+
+def reconstruct(keys, users, shares):
+    recv_priv, recv_pub = keys.receiver_keypair("receiver")
+    dealt = keys.session(public_keys(users), shares, recv_pub, batched=True)
+    receiver = keys.session(public_keys(users), shares, recv_pub,
+                            batched=True)
+    for priv, _ in users[1:]:
+        receiver.add_reencrypted_share(dealt.reencrypt_share(priv))
+    return receiver.reconstruct_secret(recv_priv)
+
+
+def test_share_secrets(keys, users):
+    secrets, shares, proof = keys.share_secrets(public_keys(users), 2, 3)
+    assert len(secrets) == len(shares) == 3
+    assert len(set(secrets)) == 3
+    keys.verify_shares(public_keys(users), shares, proof)
+    for secret, shared in zip(secrets, shares):
+        assert reconstruct(keys, users, shared) == secret
+
+
+def test_batched_shares_have_no_own_proof(keys, users):
+    _, shares, _ = keys.share_secrets(public_keys(users), 2, 2)
+    with pytest.raises(ValueError):
+        keys.session(public_keys(users), shares[0])
+
+
+@pytest.mark.parametrize("tamper", ["swap", "replace", "drop"])
+def test_verify_shares_rejects(keys, users, tamper):
+    _, shares, proof = keys.share_secrets(public_keys(users), 2, 3)
+    if tamper == "swap":
+        shares = [shares[1], shares[0], shares[2]]
+    elif tamper == "replace":
+        shares = shares[:2] + keys.share_secrets(public_keys(users), 2, 1)[1]
+    else:
+        shares = shares[:2]
+    with pytest.raises(ValueError):
+        keys.verify_shares(public_keys(users), shares, proof)
+
+
+def test_verify_shares_rejects_other_threshold(keys, users):
+    _, shares, proof = keys.share_secrets(public_keys(users), 2, 2)
+    _, other, _ = keys.share_secrets(public_keys(users), 3, 1)
+    with pytest.raises(ValueError):
+        keys.verify_shares(public_keys(users), shares[:1] + other, proof)
+
+
+def test_params_persisted(tmp_path):
+    params = pvss_session.load_params(str(tmp_path))
+    path = tmp_path / pvss_session.PARAMS_FILE
+    assert path.read_bytes() == params
+    assert pvss_session.load_params(str(tmp_path)) == params
+
+
+def test_keypairs_persisted(tmp_path):
+    params = pvss_session.load_params()
+    keys = pvss_session.PvssKeyManager(params, str(tmp_path))
+    alice = keys.user_keypair("Alice")
+    receiver = keys.receiver_keypair("Alice")
+    assert receiver != alice
+    assert keys.user_keypair("Alice") == alice
+
+    # Same keys after a restart, kept apart per system parameters
+    keys = pvss_session.PvssKeyManager(params, str(tmp_path))
+    assert keys.user_keypair("Alice") == alice
+    assert keys.receiver_keypair("Alice") == receiver
+    assert os.listdir(tmp_path) == [os.path.basename(keys.directory)]
+    assert sorted(os.listdir(keys.directory)) == [
+        "receiver-Alice.key", "receiver-Alice.pub",
+        "user-Alice.key", "user-Alice.pub"]
+
+
+def test_keypairs_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    keys = pvss_session.PvssKeyManager(pvss_session.load_params())
+    assert keys.user_keypair("Alice") == keys.user_keypair("Alice")
+    assert os.listdir(tmp_path) == []
+
+
+def test_key_permissions(tmp_path):
+    keys = pvss_session.PvssKeyManager(pvss_session.load_params(),
+                                       str(tmp_path))
+    # A private key left world-readable by a crash, without its public key
+    os.makedirs(keys.directory)
+    key_path = os.path.join(keys.directory, "user-Alice.key")
+    with open(key_path, "wb") as f:
+        f.write(b"partial")
+    os.chmod(key_path, 0o666)
+
+    keys.user_keypair("Alice")
+    assert stat.S_IMODE(os.stat(key_path).st_mode) == 0o600
+    pub_path = os.path.join(keys.directory, "user-Alice.pub")
+    assert stat.S_IMODE(os.stat(pub_path).st_mode) == 0o644
+
+    keys = pvss_session.PvssKeyManager(keys.params, str(tmp_path / "new"))
+    keys.user_keypair("Alice")
+    assert stat.S_IMODE(os.stat(keys.directory).st_mode) == 0o700
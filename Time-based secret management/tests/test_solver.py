@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from VTSS import modulus_pool, puzzle
+from VTSS.algorithms.backend import BACKENDS
+from VTSS.solver import PuzzleSolver
+
+# RSA modulus 61 * 53
+P, Q = 61, 53
+N = P * Q
+
+
+@pytest.mark.parametrize("backend", BACKENDS.values(), ids=BACKENDS.keys())
+def test_known_answer(backend):
+    for a, t in ((5, 0), (5, 1), (7, 1000), (2, 5000)):
+        solver = PuzzleSolver(N, a, t, backend=backend)
+        assert solver.solve() == pow(a, 2**t, N)
+        assert solver.done() and solver.progress() == 1.0
+
+
+def test_trapdoor():
+    for a, t in ((5, 1), (7, 1000), (N - 1, 12345)):
+        assert puzzle.trapdoor_squaring(P, Q, a, t) == \
+            PuzzleSolver(N, a, t).solve()
+
+
+def test_resume(tmp_path):
+    path = str(tmp_path / "checkpoint")
+    a, t, i = 7, 3000, 1000
+    with open(path, "w") as f:
+        json.dump({"n": N, "a": a, "t": t, "i": i,
+                   "b": pow(a, 2**i, N)}, f)
+
+    solver = PuzzleSolver(N, a, t, checkpoint_path=path)
+    assert solver.i == i
+    assert solver.solve() == pow(a, 2**t, N)
+    with open(path) as f:
+        assert json.load(f)["i"] == t
+
+    # A solved puzzle is not solved again
+    assert PuzzleSolver(N, a, t, checkpoint_path=path).done()
+
+
+def test_checkpoint_of_another_puzzle(tmp_path):
+    path = str(tmp_path / "checkpoint")
+    PuzzleSolver(N, 7, 3000, checkpoint_path=path).solve()
+    solver = PuzzleSolver(N, 5, 3000, checkpoint_path=path)
+    assert solver.i == 0
+    assert solver.solve() == pow(5, 2**3000, N)
+
+
+def test_background_decrypt():
+    pool = modulus_pool.ModulusPool(size=1, refill_threshold=1)
+    p, q, n, a, t, enc_key, enc_messages, _ = puzzle.encrypt_batch(
+        [b"first", b"second"], 1, 2000, pool=pool)
+    solver = PuzzleSolver(n, a, t)
+    solver.start()
+    assert solver.decrypt_batch(enc_key, enc_messages, timeout=30) == \
+        [b"first", b"second"]
+    assert solver.decrypt_batch(enc_key, enc_messages[1:], [1]) == [b"second"]
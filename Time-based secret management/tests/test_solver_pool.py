@@ -0,0 +1,98 @@
+import concurrent.futures
+import time
+
+import pytest
+
+from VTSS import puzzle, solver_pool
+from VTSS.modulus_pool import generate_modulus
+from VTSS.solver_pool import SolverPool
+
+N = 61 * 53
+
+
+@pytest.fixture
+def pool():
+    pool = SolverPool(workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_results(pool):
+    puzzles = [(a, t) for a in (2, 5, 7) for t in (1, 100, 4000)]
+    futures = [pool.submit(N, a, t) for a, t in puzzles]
+    for (a, t), future in zip(puzzles, futures):
+        assert future.result(timeout=60) == pow(a, 2**t, N)
+        assert pool.progress(future) == 1.0
+        assert pool.eta(future) == 0.0
+
+
+def test_progress(monkeypatch):
+    # Workers are forked on first submit, with the patched interval
+    monkeypatch.setattr(solver_pool, "PROGRESS_INTERVAL", 0.05)
+    pool = SolverPool(workers=1)
+    try:
+        p, q, n, _ = generate_modulus()
+        future = pool.submit(n, 3, 300000)
+        reports = []
+        while not future.done():
+            reports.append((pool.progress(future), pool.eta(future)))
+            time.sleep(0.05)
+        assert any(0 < progress < 1 and eta is not None
+                   for progress, eta in reports)
+        assert future.result() == puzzle.trapdoor_squaring(p, q, 3, 300000)
+    finally:
+        pool.shutdown()
+
+
+def test_deadline_order():
+    # One process, so queued puzzles start by deadline
+    pool = SolverPool(workers=1)
+    try:
+        started = []
+        blocker = pool.submit(N, 3, 2000000)
+        futures = {
+            deadline: pool.submit(N, 5, 10, deadline=deadline)
+            for deadline in (30, 10, 20)
+        }
+        for deadline, future in futures.items():
+            future.add_done_callback(
+                lambda future, deadline=deadline: started.append(deadline))
+        concurrent.futures.wait(list(futures.values()) + [blocker],
+                                timeout=60)
+        assert started == [10, 20, 30]
+    finally:
+        pool.shutdown()
+
+
+def test_checkpoint(pool, tmp_path):
+    path = str(tmp_path / "checkpoint")
+    assert pool.submit(N, 7, 5000, checkpoint_path=path).result(60) == \
+        pow(7, 2**5000, N)
+    # Resumed from the checkpoint of the solved puzzle
+    assert pool.submit(N, 7, 5000, checkpoint_path=path).result(60) == \
+        pow(7, 2**5000, N)
+
+
+def test_submit_after_shutdown():
+    pool = SolverPool(workers=1)
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.submit(N, 5, 10)
+
+
+def test_shutdown_cancels_queued_puzzles():
+    pool = SolverPool(workers=1)
+    pool.submit(N, 3, 200000)
+    queued = pool.submit(N, 5, 10)
+    pool.shutdown(wait=False)
+    with pytest.raises((concurrent.futures.CancelledError, RuntimeError)):
+        queued.result(timeout=60)
+
+
+def test_broken_executor(pool):
+    # An executor failing on submit fails the puzzle, not the dispatcher
+    pool._executor.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.submit(N, 5, 10).result(timeout=60)
+    with pytest.raises(RuntimeError):
+        pool.submit(N, 5, 10).result(timeout=60)
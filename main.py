@@ -1,48 +1,86 @@
+from GC import codec
+from GC import compiler
 from GC import ot
 from GC import yao
 from GC import util
+from storage import cache
+from storage import container
+from storage import ipfs
+from PVTSS import calibration
+from PVTSS import modulus_pool
 from PVTSS import puzzle
-from pvss import Pvss
-from pvss.ristretto_255 import create_ristretto_255_parameters
+from PVTSS import pvss_session
+from PVTSS import solver_pool
+from ZK import groth16
 from abc import ABC, abstractmethod
+import asyncio
 import logging
 import time
-import ipfshttpclient
 import requests
-import base64
 import os
+import pickle
 import subprocess
 import json
-import re
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
+import threading
 import hashlib
+import concurrent.futures
 from mife.single.lwe import FeLWE
 
 
 
+# Checkpoints of the time-lock puzzles solved by the access controller
+PUZZLE_CHECKPOINT_DIR = "data/puzzles"
+# PVSS system parameters and participant keypairs, kept across runs in
+# one directory per party
+PVSS_KEY_DIR = "data/pvss"
+
 logging.basicConfig(format="[%(levelname)s] %(message)s",
                     level=logging.WARNING)
 
 class YaoGarbler(ABC):
     """An abstract class for Yao garblers (e.g. Alice)."""
-    def __init__(self, circuits):
+    def __init__(self, circuits, scheme="classic", stream=False, workers=1):
+        programs = compiler.load_compiled(circuits)
         circuits = util.parse_json(circuits)
         self.name = circuits["name"]
+        self.scheme = scheme
+        self.stream = stream
         self.circuits = []
 
-        for circuit in circuits["circuits"]:
-            garbled_circuit = yao.GarbledCircuit(circuit)
+        if stream:
+            # In stream mode, tables are garbled while being sent
+            garbled_circuits = [
+                yao.GarbledCircuit(circuit,
+                                   scheme=scheme,
+                                   program=program,
+                                   stream=stream)
+                for circuit, program in zip(circuits["circuits"], programs)
+            ]
+        elif workers != 1:
+            garbled_circuits = yao.garble_circuits(circuits["circuits"],
+                                                   programs,
+                                                   scheme=scheme,
+                                                   workers=workers)
+        else:
+            garbled_circuits = [
+                yao.GarbledCircuit(circuit, scheme=scheme, program=program)
+                for circuit, program in zip(circuits["circuits"], programs)
+            ]
+
+        for circuit, program, garbled_circuit in zip(circuits["circuits"],
+                                                     programs,
+                                                     garbled_circuits):
             pbits = garbled_circuit.get_pbits()
             entry = {
                 "circuit": circuit,
+                "program": program,
+                "scheme": scheme,
                 "garbled_circuit": garbled_circuit,
                 "garbled_tables": garbled_circuit.get_garbled_tables(),
                 "keys": garbled_circuit.get_keys(),
                 "pbits": pbits,
-                "pbits_out": {w: pbits[w]
-                              for w in circuit["out"]},
+                "pbits_out": None if stream else {w: pbits[w]
+                                                  for w in circuit["out"]},
             }
             self.circuits.append(entry)
 
@@ -51,53 +89,67 @@ class YaoGarbler(ABC):
         pass
 
 class ServiceProvider(YaoGarbler):
-    def __init__(self, circuits, oblivious_transfer=False):
-        super().__init__(circuits)
+    def __init__(self,
+                 circuits,
+                 oblivious_transfer=False,
+                 scheme="classic",
+                 stream=False,
+                 workers=1,
+                 storage=None,
+                 squarings_per_second=None):
+        super().__init__(circuits,
+                         scheme=scheme,
+                         stream=stream,
+                         workers=workers)
+        # map from circuit ID to circuit entry
+        self.circuit_index = {c["circuit"]["id"]: c for c in self.circuits}
+        self.storage = storage or ipfs.get_storage()
+        # map from circuit ID to (response, pickled response) sent to users
+        self.responses = {}
         self.socket = util.GarblerSocket()
         self.ot = ot.ObliviousTransfer(self.socket, enabled=oblivious_transfer)
-        self.init_dealer()
+        self.init_dealer(squarings_per_second)
 
-    def init_dealer(self):
-        pvss_init = Pvss()
-        self.params = create_ristretto_255_parameters(pvss_init)
-        self.pvss_dealer = Pvss()
-        self.pvss_dealer.set_params(self.params)
+    def init_dealer(self, squarings_per_second=None):
+        self.params = pvss_session.load_params(
+            os.path.join(PVSS_KEY_DIR, "service_provider"))
+        self.pvss_keys = pvss_session.PvssKeyManager(self.params)
         self.secend = 100
-        self.squarings_per_second = 10000
+        # Puzzles are solved by the access controller, so the delay only
+        # holds for the squaring rate of its host
+        if squarings_per_second is None:
+            logging.warning("No squaring rate of the access controller, "
+                            "puzzles are calibrated for this host")
+            squarings_per_second = calibration.squarings_per_second()
+        self.squarings_per_second = squarings_per_second
+        # One puzzle locks the whole batch of circuits, so a single modulus
+        # is drawn per start, generated while the circuits are garbled
+        self.modulus_pool = modulus_pool.ModulusPool(size=1,
+                                                     refill_threshold=1)
         self.message = "This is a vote for Myrto".encode()
 
-    def update_dealer(self):
+    def update_dealer(self, count=1):
+        """Share one secret per circuit, all sent in a single message."""
         result = self.socket.send_wait_to_evaluator(True)
         self.alice_pub = result["alice_pub"]
         self.boris_pub = result["boris_pub"]
         self.chris_pub = result["chris_pub"]
-        self.pvss_dealer.add_user_public_key(self.chris_pub)
-        self.pvss_dealer.add_user_public_key(self.alice_pub)
-        self.pvss_dealer.add_user_public_key(self.boris_pub)
-        self.secret0, self.shares = self.pvss_dealer.share_secret(2)
+        # A fresh dealing per secret with a single proof for all of them,
+        # the keys are the same every time
+        self.secrets, self.shares, proof = self.pvss_keys.share_secrets(
+            [self.chris_pub, self.alice_pub, self.boris_pub], 2, count)
+        self.responses.clear()  # responses hold the previous shares
         to_send = {
             "shares": self.shares,
+            "proof": proof,
         }
         self.socket.send_wait_to_evaluator(to_send)
     
-    def encrypt_file(self, file_path, key):
-        backend = default_backend()
-        iv = os.urandom(16)
-        cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=backend)
-        encryptor = cipher.encryptor()
-        padder = padding.PKCS7(algorithms.AES.block_size).padder()
-
-        with open(file_path, 'rb') as f:
-            plaintext = f.read()
-
-        padded_data = padder.update(plaintext) + padder.finalize()
-        ciphertext = encryptor.update(padded_data) + encryptor.finalize()
-
-        encrypted_file_path = file_path + '.enc'
-        with open(encrypted_file_path, 'wb') as f:
-            f.write(iv + ciphertext)
-
-        return encrypted_file_path
+    def encrypt_file(self, file_path, key, encrypted_file_path=None):
+        # Streamed in segments sealed on all cores, so memory does not grow
+        # with the file
+        return container.encrypt_file(key, file_path,
+                                      encrypted_file_path or file_path + '.enc')
     
     def functional_encryption(self, x, y):
         # len(x) == len(y)
@@ -109,10 +161,21 @@ class ServiceProvider(YaoGarbler):
 
     
     def upload_to_ipfs(self, file_path):
-        with open(file_path, 'rb') as file:
-            client = ipfshttpclient.connect('/dns/localhost/tcp/5001/http')
-            res = client.add(file_path)
-            return res
+        return self.storage.add(file_path)
+
+    def upload_data(self, file_path="data/financial_info.txt"):
+        """Encrypt the data under the key of each circuit and upload all
+        ciphertexts at once."""
+        encrypted_file_paths = [
+            self.encrypt_file(file_path, self.to_32_bytes_hash(secret),
+                              f"{file_path}.{index}.enc")
+            for index, secret in enumerate(self.secrets)
+        ]
+        cids = self.storage.add_many(encrypted_file_paths)
+        for index, circuit in enumerate(self.circuits):
+            circuit["cid"] = cids[index]
+            circuit["secret_index"] = index
+        self.responses.clear()  # responses hold the previous CIDs
     
     def to_32_bytes_hash(self, data):
         sha256 = hashlib.sha256()
@@ -123,42 +186,76 @@ class ServiceProvider(YaoGarbler):
         """Start Yao protocol."""
         # secret0, shares = self.pvss_dealer.share_secret(2) # put inside
         # print(f"Shares: {shares}")
-        for circuit in self.circuits:
-            p, q, n, a, t, encrypted_key, encrypted_message, original_key = puzzle.encrypt(
-                self.message,
-                self.secend,
-                self.squarings_per_second
-            )
-            print("1.Encrypt the puzzle")
+        # All circuits are released at the same time: one puzzle locks the
+        # keys of the messages of every circuit
+        p, q, n, a, t, encrypted_key, encrypted_messages, original_key = puzzle.encrypt_batch(
+            [self.message] * len(self.circuits),
+            self.secend,
+            self.squarings_per_second,
+            pool=self.modulus_pool,
+        )
+        print("1.Encrypt the puzzle")
+        for index, circuit in enumerate(self.circuits):
             to_send = {
                 "source": "garbler",
                 "circuit": circuit["circuit"],
-                "garbled_tables": circuit["garbled_tables"],
                 "pbits_out": circuit["pbits_out"],
+                "stream": self.stream,
+                "scheme": circuit["scheme"],
                 "params": self.params,
                 "n": n,
                 "a": a,
                 "t": t,
                 "encrypted_key": encrypted_key,
-                "encrypted_message": encrypted_message,
+                "encrypted_message": encrypted_messages[index],
+                "puzzle_index": index,
+                # The secrets of all circuits are dealt with the first one
+                "dealing": index == 0,
                 # "shares": shares,
             }
             logging.debug(f"Sending {circuit['circuit']['id']}")
-            self.socket.send_wait_to_evaluator(to_send)
+            if self.stream:
+                # Chunks are sent with the inputs, see print
+                self.socket.send_wait_to_evaluator(to_send)
+            else:
+                frames = codec.pack_garbled_tables(circuit["garbled_tables"],
+                                                   circuit["scheme"])
+                self.socket.send_wait_to_evaluator(to_send, frames)
             print("2.Garble the circuit")
-            self.update_dealer()
-            print("3.Split the secret")
-            file_path = "data/financial_info.txt"
-            key = self.to_32_bytes_hash(self.secret0)
-            encrypted_file_path = self.encrypt_file(file_path, key)
-            ipfs_hash = self.upload_to_ipfs(encrypted_file_path)
-            self.cid = ipfs_hash['Hash']
-            print("4.Encrypt the data and send the ciphertext to IPFS")
+            if index == 0:
+                self.update_dealer(len(self.circuits))
+                print("3.Split the secret")
+                self.upload_data()
+                print("4.Encrypt the data and send the ciphertext to IPFS")
             x = [i for i in range(10)]
             y = [1/n for i in range(10)]
             c, sk = self.functional_encryption(x, y)
             self.print(circuit)
 
+    def send_garbled_chunks(self, entry):
+        """Garble a circuit chunk by chunk, sending each chunk when ready.
+
+        The evaluator acknowledges a chunk as soon as it is received, so the
+        next chunk is garbled while the previous one is being evaluated. The
+        last message, with the output p-bits, is answered with the results
+        received by ot.get_results.
+
+        Args:
+            entry: A dict representing the circuit to garble.
+        """
+        for chunk in entry["garbled_circuit"].garbled_chunks():
+            frames = codec.pack_garbled_tables(chunk, entry["scheme"])
+            self.socket.send_wait_to_evaluator({"source": "garbler"}, frames)
+
+        # Output p-bits are only known once all gates have been garbled
+        self.responses.pop(entry["circuit"]["id"], None)  # garbled again
+        pbits = entry["pbits"]
+        entry["pbits_out"] = {w: pbits[w] for w in entry["circuit"]["out"]}
+        self.socket.send_to_evaluator({
+            "source": "garbler",
+            "pbits_out": entry["pbits_out"],
+        })
+
     def print(self, entry):
         """Print circuit evaluation for all Bob and Alice inputs.
 
@@ -168,22 +265,23 @@ class ServiceProvider(YaoGarbler):
         circuit, pbits, keys = entry["circuit"], entry["pbits"], entry["keys"]
         outputs = circuit["out"]
         a_wires = circuit.get("alice", [])  # Alice's wires
-        a_inputs = {}  # map from Alice's wires to (key, encr_bit) inputs
+        a_inputs_list = []  # maps from Alice's wires to (key, encr_bit)
         b_wires = circuit.get("bob", [])  # Bob's wires
         b_keys = {  # map from Bob's wires to a pair (key, encr_bit)
             w: self._get_encr_bits(pbits[w], key0, key1)
             for w, (key0, key1) in keys.items() if w in b_wires
         }
+        scheme = entry["scheme"]
         b_bytes_keys = {
             w: self._get_encr_bits(pbits[w], 
-                                   list(base64.urlsafe_b64decode(key0)), 
-                                   list(base64.urlsafe_b64decode(key1)))
+                                   list(yao.key_to_bytes(key0, scheme)), 
+                                   list(yao.key_to_bytes(key1, scheme)))
             for w, (key0, key1) in keys.items() if w in b_wires
         }
         b_decode_keys = {
             w: self._get_encr_bits(pbits[w], 
-                                   int.from_bytes(base64.urlsafe_b64decode(key0), byteorder='big'), 
-                                   int.from_bytes(base64.urlsafe_b64decode(key1), byteorder='big'))
+                                   yao.key_to_int(key0, scheme), 
+                                   yao.key_to_int(key1, scheme))
             for w, (key0, key1) in keys.items() if w in b_wires
         }
 
@@ -193,17 +291,25 @@ class ServiceProvider(YaoGarbler):
         print(f"======== {circuit['id']} ========")
 
         # Generate all inputs for both Alice and Bob
-        for bits in [format(n, 'b').zfill(N) for n in range(2**N)]:
+        all_bits = [format(n, 'b').zfill(N) for n in range(2**N)]
+        for bits in all_bits:
             bits_a = [int(b) for b in bits[:len(a_wires)]]  # Alice's inputs
 
             # Map Alice's wires to (key, encr_bit)
-            for i in range(len(a_wires)):
-                a_inputs[a_wires[i]] = (keys[a_wires[i]][bits_a[i]],
-                                        pbits[a_wires[i]] ^ bits_a[i])
-
-            # Send Alice's encrypted inputs and keys to Bob
-            result = self.ot.get_result(a_inputs, b_keys)
-
+            a_inputs_list.append({
+                a_wires[i]: (keys[a_wires[i]][bits_a[i]],
+                             pbits[a_wires[i]] ^ bits_a[i])
+                for i in range(len(a_wires))
+            })
+
+        # Send Alice's encrypted inputs and keys to Bob in one batch
+        # Streamed circuits are garbled while Bob evaluates them
+        results = self.ot.get_results(
+            a_inputs_list, b_keys,
+            send_tables=(lambda: self.send_garbled_chunks(entry))
+            if self.stream else None)
+
+        for bits, result in zip(all_bits, results):
             # Format output
             str_bits_a = ' '.join(bits[:len(a_wires)])
             str_bits_b = ' '.join(bits[len(a_wires):])
@@ -219,6 +325,50 @@ class ServiceProvider(YaoGarbler):
         return ((key0, 0 ^ pbit), (key1, 1 ^ pbit))
     
 
+    def b_decode_response(self, circuit_id):
+        """Return the response to a user's request for b_decode_keys.
+
+        Responses are built on the first request for a circuit and cached
+        with their pickled form until the circuit is garbled again or the
+        shares or CID change.
+
+        Args:
+            circuit_id: The ID of the requested circuit.
+
+        Returns:
+            A tuple (response, pickled response), or None for an unknown
+            circuit.
+        """
+        if circuit_id in self.responses:
+            return self.responses[circuit_id]
+        circuit = self.circuit_index.get(circuit_id)
+        if circuit is None:
+            return None
+
+        # Generate b_decode_keys for the requested circuit
+        pbits, keys = circuit["pbits"], circuit["keys"]
+        b_wires = circuit["circuit"].get("bob", [])
+        scheme = circuit["scheme"]
+        b_decode_keys = {
+            w: self._get_encr_bits(pbits[w], 
+                                   yao.key_to_int(keys[w][0], scheme), 
+                                   yao.key_to_int(keys[w][1], scheme))
+            for w in b_wires
+        }
+        to_send = {
+            "b_decode_keys": b_decode_keys,
+            "params": self.params,
+            "alice_pub": self.alice_pub,
+            "boris_pub": self.boris_pub,
+            "chris_pub": self.chris_pub,
+            # Only the shares of the secret of this circuit
+            "shares": self.shares[circuit["secret_index"]],
+            "cid": circuit.get("cid"),
+            "secret_index": circuit.get("secret_index"),
+        }
+        self.responses[circuit_id] = (to_send, pickle.dumps(to_send))
+        return self.responses[circuit_id]
+
     def listen(self):
         """Listen for incoming requests and send b_decode_keys to user."""
         while True:
@@ -226,63 +376,69 @@ class ServiceProvider(YaoGarbler):
             message = self.socket.receive()
             
             # Assume message contains the necessary information to identify the circuit
-            circuit_id = message.get("circuit_id")
-            for circuit in self.circuits:
-                if circuit["circuit"]["id"] == circuit_id:
-                    # Generate b_decode_keys for the requested circuit
-                    pbits, keys = circuit["pbits"], circuit["keys"]
-                    b_wires = circuit["circuit"].get("bob", [])
-                    b_keys = {  # map from Bob's wires to a pair (key, encr_bit)
-                        w: self._get_encr_bits(pbits[w], key0, key1)
-                        for w, (key0, key1) in keys.items() if w in b_wires
-                    }
-                    b_decode_keys = {
-                        w: self._get_encr_bits(pbits[w], 
-                                               int.from_bytes(base64.urlsafe_b64decode(keys[w][0]), byteorder='big'), 
-                                               int.from_bytes(base64.urlsafe_b64decode(keys[w][1]), byteorder='big'))
-                        for w in b_wires
-                    }
-                    # Send b_decode_keys to user
-                    to_send = {
-                        "b_decode_keys": b_decode_keys,
-                        "params": self.params,
-                        "alice_pub": self.alice_pub,
-                        "boris_pub": self.boris_pub,
-                        "chris_pub": self.chris_pub,
-                        "shares": self.shares,
-                        "cid": self.cid,
-                    }
-                    self.socket.send(to_send)
-                    break
+            response = self.b_decode_response(message.get("circuit_id"))
+            if response is None:
+                # A REP socket must reply before receiving again
+                self.socket.send({"error": "unknown circuit"})
+            else:
+                # Send b_decode_keys to user
+                self.socket.send_serialized(response[1])
+
+    async def serve(self,
+                    endpoint=f"tcp://*:{util.GARBLER_SESSION_PORT}"):
+        """Serve b_decode_keys to many concurrent users.
+
+        Each client has its own session, and every request is answered
+        with its request ID, so requests of different users never wait for
+        each other.
+
+        Args:
+            endpoint: Optional; the endpoint of the session server.
+        """
+        socket = util.AsyncServerSocket(endpoint)
+        self.sessions = {}  # map from client to its session
+        logging.info("Start serving users")
+        try:
+            while True:
+                client, request_id, message = await socket.receive()
+                session = self.sessions.setdefault(client, {"requests": 0})
+                session["requests"] += 1
+                session["circuit_id"] = message.get("circuit_id")
+
+                response = self.b_decode_response(session["circuit_id"])
+                if response is None:
+                    await socket.send(client, request_id,
+                                      {"error": "unknown circuit"})
+                else:
+                    await socket.send_serialized(client, request_id,
+                                                 response[1])
+        finally:
+            socket.close()
 
 class AccessController:
 
     def __init__(self, oblivious_transfer=False):
         self.socket = util.EvaluatorSocket()
         self.ot = ot.ObliviousTransfer(self.socket, enabled=oblivious_transfer)
-        # self.pvss_alice = pvss_alice
-        # self.pvss_boris = pvss_boris
-        # self.pvss_chris = pvss_chris
-        # self.alice_priv = alice_priv
-        # self.boris_priv = boris_priv
-        # self.chris_priv = chris_priv
-        # self.pvss_receiver = pvss_receiver
-    
+        self.ready = threading.Event()  # set once shares are received
+        self.solver_pool = solver_pool.SolverPool()
+        # map from puzzle (n, a, t) to the future of its solution
+        self.puzzles = {}
+        self.puzzle = None  # future of the solution of the current puzzle
+        self.pvss_keys = None  # keypairs of Alice, Boris and Chris
+        # Proofs are verified in other processes, each loading the key once
+        self.verifier = groth16.VerifierPool()
+
     def init_ac(self, params):
-        self.pvss_alice = Pvss()
-        self.pvss_alice.set_params(params)
-        self.alice_priv, self.alice_pub = self.pvss_alice.create_user_keypair("Alice")
-
-        # boris, genuser
-        self.pvss_boris = Pvss()
-        self.pvss_boris.set_params(params)
-        self.boris_priv, self.boris_pub = self.pvss_boris.create_user_keypair("Boris")
-
-        # chris, genuser
-        self.pvss_chris = Pvss()
-        self.pvss_chris.set_params(params)
-        self.chris_priv, self.chris_pub = self.pvss_chris.create_user_keypair("Chris")
-        
+        # Keypairs are only created for new system parameters, every other
+        # secret only refreshes the shares
+        if self.pvss_keys is None or self.pvss_keys.params != params:
+            self.pvss_keys = pvss_session.PvssKeyManager(
+                params, os.path.join(PVSS_KEY_DIR, "access_controller"))
+        self.alice_priv, self.alice_pub = self.pvss_keys.user_keypair("Alice")
+        self.boris_priv, self.boris_pub = self.pvss_keys.user_keypair("Boris")
+        self.chris_priv, self.chris_pub = self.pvss_keys.user_keypair("Chris")
+
         self.socket.receive()
         to_send = {
             "alice_pub": self.alice_pub,
@@ -291,15 +447,18 @@ class AccessController:
         }
         self.socket.send(to_send)
         result = self.socket.receive()
+        try:
+            self.pvss_keys.verify_shares(
+                [self.alice_pub, self.boris_pub, self.chris_pub],
+                result["shares"], result["proof"])
+        except ValueError:
+            logging.error("Invalid shares from the dealer")
+            self.socket.send(False)
+            return
         self.shares = result["shares"]
-        self.pvss_alice.add_user_public_key(self.chris_pub)
-        self.pvss_alice.add_user_public_key(self.boris_pub)
-        self.pvss_alice.set_shares(self.shares)
-        self.pvss_boris.add_user_public_key(self.alice_pub)
-        self.pvss_boris.add_user_public_key(self.chris_pub)
-        self.pvss_boris.set_shares(self.shares)
 
         self.socket.send(True)
+        self.ready.set()
 
     def listen(self):
         """Start listening for Alice messages."""
@@ -311,6 +470,28 @@ class AccessController:
         except KeyboardInterrupt:
             logging.info("Stop listening")
 
+    def receive_garbled_chunks(self, pbits_out):
+        """Receive the chunks of a streamed garbled circuit.
+
+        Each chunk is acknowledged before being decoded so that the garbler
+        can garble the next one in the meantime. The output p-bits sent at
+        the end of the stream are stored in pbits_out, and their message is
+        left for the results of the evaluation to answer.
+
+        Args:
+            pbits_out: The dict to fill with the output p-bits.
+
+        Yields:
+            Dicts mapping each gate of a chunk to its garbled table.
+        """
+        while True:
+            message = self.socket.receive()
+            if "frames" not in message:
+                pbits_out.update(message["pbits_out"])
+                return
+            self.socket.send(True)
+            yield codec.unpack_garbled_tables(message["frames"])[0]
+
     def send_evaluation(self, entry):
         """Evaluate yao circuit for all Bob and Alice's inputs and
         send back the results.
@@ -319,20 +500,26 @@ class AccessController:
             entry: A dict representing the circuit to evaluate.
         """
         if entry["source"] == "garbler":
-            self.init_ac(entry["params"])
-            circuit, pbits_out = entry["circuit"], entry["pbits_out"]
-            garbled_tables = entry["garbled_tables"]
+            if entry["stream"]:
+                # Chunks follow the inputs of Alice, and are evaluated as
+                # they arrive
+                self.pbits_out = {}
+                garbled_tables = self.receive_garbled_chunks(self.pbits_out)
+                scheme = entry["scheme"]
+            else:
+                garbled_tables, scheme = codec.unpack_garbled_tables(
+                    entry["frames"])
+                self.pbits_out = entry["pbits_out"]
+            # Users are only served once the puzzle is solved
+            self.solve_puzzle(entry)
+            if entry.get("dealing", True):
+                self.init_ac(entry["params"])
+            circuit, pbits_out = entry["circuit"], self.pbits_out
+            program = compiler.compile_circuit(circuit)  # compiled once
             a_wires = circuit.get("alice", [])  # list of Alice's wires
             b_wires = circuit.get("bob", [])  # list of Bob's wires
             N = len(a_wires) + len(b_wires)
 
-            n = entry["n"]
-            a = entry["a"]
-            t = entry["t"]
-            encrypted_key = entry["encrypted_key"]
-            encrypted_message = entry["encrypted_message"]
-            puzzle.decrypt(n, a, t, encrypted_key, encrypted_message)
-            print("5.Time puzzle decrypted")
             # print(timeit.repeat(
             #     'print(puzzle.decrypt(n, a, t, encrypted_key, encrypted_message))',
             #     globals=globals(),
@@ -341,6 +528,7 @@ class AccessController:
             # )
 
             # Generate all possible inputs for both Alice and Bob
+            b_inputs_list = []  # maps from Bob's wires to Bob's input
             for bits in [format(n, 'b').zfill(N) for n in range(2**N)]:
                 bits_b = [int(b) for b in bits[N - len(b_wires):]]  # Bob's inputs
 
@@ -349,10 +537,11 @@ class AccessController:
                     b_wires[i]: bits_b[i]
                     for i in range(len(b_wires))
                 }
+                b_inputs_list.append(b_inputs_clear)
 
-                # Evaluate and send result to Alice
-                self.ot.send_result(circuit, garbled_tables, pbits_out,
-                                    b_inputs_clear)
+            # Evaluate the whole batch and send results to Alice
+            self.ot.send_results(program, garbled_tables, pbits_out,
+                                 b_inputs_list, scheme)
             # shares = entry["shares"]
             # print(f"Shares: {shares}")
             # self.pvss_boris.set_shares(shares)
@@ -365,84 +554,213 @@ class AccessController:
 
         elif entry["source"] == "user":
             self.socket.receive()
+            self.wait_puzzle()
             proof = entry["proof"]
             public = entry["public"]
-            verification_key = entry["verification_key"]
-            command9 = "snarkjs groth16 verify verification_key.json public.json proof.json"
-            original_directory = os.getcwd()
-            os.chdir(os.getcwd() + "/ZK/circuit")
-            result = subprocess.run(command9, capture_output=True, shell=True, check=True)
-            output = result.stdout.decode('utf-8')
-            clean_output = re.sub(r'\x1b\[[0-9;]*m', '', output).strip()
-            
-            self.pvss_alice.set_receiver_public_key(entry["recv_pub"])
-            self.pvss_boris.set_receiver_public_key(entry["recv_pub"])
-            self.reenc_alice = self.pvss_alice.reencrypt_share(self.alice_priv)
-            self.reenc_boris = self.pvss_boris.reencrypt_share(self.boris_priv)
-            to_send = {
-                "source": "evaluator",
-                "reenc_alice": self.reenc_alice,
-                "reenc_boris": self.reenc_boris,
-            }
-            if "snarkJS: OK" in clean_output:
+
+            to_send = self.reencrypt_shares(entry["recv_pub"],
+                                            entry.get("secret_index"))
+            if self.verifier.submit(proof, public).result():
                 self.socket.send(to_send)
                 print("7.Verification successful")
             else:
                 print("7.Verification failed")
-            os.chdir(original_directory)
+
+    def solve_puzzle(self, entry):
+        """Solve the time-lock puzzle of the garbler in the background.
+
+        Puzzles are solved by a pool of processes, the puzzle due first
+        being solved first. Solvers checkpoint their progress, so that a
+        restarted access controller resumes solving a puzzle where it
+        stopped. All circuits of a batch share the same puzzle, which is
+        solved once.
+
+        Args:
+            entry: A dict containing the puzzle.
+        """
+        n, a, t = entry["n"], entry["a"], entry["t"]
+        if (n, a, t) in self.puzzles:  # already solved or being solved
+            self.puzzle = self.puzzles[(n, a, t)]
+            return
+
+        start = time.time()
+        target = t / calibration.squarings_per_second()
+
+        def report(future):
+            b = future.result()
+            puzzle.decrypt_batch_solved(n, b, entry["encrypted_key"],
+                                        [entry["encrypted_message"]],
+                                        [entry["puzzle_index"]])
+            print(f"5.Time puzzle decrypted in {time.time() - start:.1f}s "
+                  f"(target {target:.1f}s)")
+
+        name = hashlib.sha256(f"{n}:{a}:{t}".encode()).hexdigest()[:16]
+        self.puzzle = self.solver_pool.submit(
+            n, a, t,
+            deadline=start + target,
+            checkpoint_path=os.path.join(PUZZLE_CHECKPOINT_DIR, name))
+        self.puzzle.add_done_callback(report)
+        self.puzzles[(n, a, t)] = self.puzzle
+
+    def wait_puzzle(self, interval=10):
+        """Wait for the current puzzle, reporting the progress of its
+        solver every interval seconds.
+
+        Returns:
+            The solution b of the puzzle.
+        """
+        while True:
+            try:
+                return self.puzzle.result(timeout=interval)
+            except concurrent.futures.TimeoutError:
+                progress = self.solver_pool.progress(self.puzzle)
+                eta = self.solver_pool.eta(self.puzzle)
+                print(f"5.Time puzzle {progress:.0%} solved" +
+                      ("" if eta is None else f", {eta:.0f}s left"))
+
+    def reencrypt_shares(self, recv_pub, index):
+        """Re-encrypt the shares of Alice and Boris for a receiver.
+
+        Only the secret of the requested circuit is re-encrypted, the
+        secrets of the other circuits stay out of reach of the receiver.
+
+        Args:
+            recv_pub: The public key of the receiver.
+            index: The index of the secret of the circuit.
+
+        Returns:
+            The dict to send to the receiver.
+        """
+        if not isinstance(index, int) or not 0 <= index < len(self.shares):
+            return {"source": "evaluator", "error": "unknown secret"}
+        # A Pvss object takes a single receiver, so each receiver gets its
+        # own session over the current shares
+        session = self.pvss_keys.session(
+            [self.alice_pub, self.boris_pub, self.chris_pub],
+            self.shares[index], recv_pub, batched=True)
+        # Runs in executor threads, so nothing is kept on self
+        return {
+            "source": "evaluator",
+            "reenc_alice": session.reencrypt_share(self.alice_priv),
+            "reenc_boris": session.reencrypt_share(self.boris_priv),
+        }
+
+    async def verify_proof(self, entry):
+        """Verify the proof of a user without blocking other sessions.
+
+        Proofs are verified by a pool of processes against the verification
+        key of the access controller, so that concurrent users are verified
+        in parallel.
+
+        Args:
+            entry: A dict containing the proof and public signals of the
+                user.
+
+        Returns:
+            True if the proof is valid.
+        """
+        return await self.verifier.verify_async(entry["proof"],
+                                                entry["public"])
+
+    async def serve(self,
+                    endpoint=f"tcp://*:{util.EVALUATOR_SESSION_PORT}"):
+        """Verify proofs and re-encrypt shares for many concurrent users.
+
+        The garbler is still served by listen, in a background thread. Each
+        request is handled in its own task, so a slow proof verification
+        only delays the user who sent it. Shares are re-encrypted in the
+        default executor, so that the event loop keeps receiving requests.
+
+        Args:
+            endpoint: Optional; the endpoint of the session server.
+        """
+        socket = util.AsyncServerSocket(endpoint)
+        self.sessions = {}  # map from client to its session
+        threading.Thread(target=self.listen, daemon=True).start()
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.ready.wait)
+        logging.info("Start serving users")
+
+        async def handle(client, request_id, entry):
+            session = self.sessions[client]
+            try:
+                session["verified"] = await self.verify_proof(entry)
+                await asyncio.wrap_future(self.puzzle)
+                if session["verified"]:
+                    to_send = await loop.run_in_executor(
+                        None, self.reencrypt_shares, entry["recv_pub"],
+                        entry.get("secret_index"))
+                else:
+                    to_send = {"source": "evaluator",
+                               "error": "invalid proof"}
+            except Exception:
+                # Every request gets a reply, or its client waits forever
+                logging.exception("Request failed")
+                to_send = {"source": "evaluator", "error": "invalid request"}
+            await socket.send(client, request_id, to_send)
+
+        tasks = set()
+        try:
+            while True:
+                client, request_id, entry = await socket.receive()
+                session = self.sessions.setdefault(client, {"requests": 0})
+                session["requests"] += 1
+                task = asyncio.ensure_future(handle(client, request_id, entry))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            socket.close()
 
 
 class User:
-    def __init__(self):
-        self.socket = util.UserSocket()
+    def __init__(self, sessions=False, storage=None):
+        # Session servers answer each request with exactly one reply
+        self.sessions = sessions
+        # Ciphertexts are cached by CID, so repeated accesses are local reads
+        self.storage = storage or cache.CachedStorage(ipfs.get_storage())
+        self.socket = util.SessionUserSocket() if sessions else util.UserSocket()
         self.ot = ot.ObliviousTransfer(self.socket, enabled=False)
+        self.pvss_keys = None  # keypair of the receiver
 
     def init_receiver(self, params, alice_pub, boris_pub, chris_pub, shares):
-        self.pvss_receiver = Pvss()
-        self.pvss_receiver.set_params(params)
-        self.recv_priv, self.recv_pub = self.pvss_receiver.create_receiver_keypair("receiver")
-        self.pvss_receiver.add_user_public_key(alice_pub)
-        self.pvss_receiver.add_user_public_key(boris_pub)
-        self.pvss_receiver.add_user_public_key(chris_pub)
-        self.pvss_receiver.set_shares(shares)
+        if self.pvss_keys is None or self.pvss_keys.params != params:
+            self.pvss_keys = pvss_session.PvssKeyManager(
+                params, os.path.join(PVSS_KEY_DIR, "user"))
+        self.recv_priv, self.recv_pub = \
+            self.pvss_keys.receiver_keypair("receiver")
+        self.pvss_receiver = self.pvss_keys.session(
+            [alice_pub, boris_pub, chris_pub], shares, self.recv_pub,
+            batched=True)
 
     def download_from_ipfs(self, cid, output_path):
-        client = ipfshttpclient.connect('/dns/localhost/tcp/5001/http')
-        data = client.cat(cid)
-        with open(output_path, 'wb') as file:
-            file.write(data)
+        # Served from the cache, or streamed to disk over the pooled
+        # connection of the process
+        return self.storage.cat(cid, output_path)
     
     def decrypt_file(self, encrypted_file_path, key):
-        backend = default_backend()
-        with open(encrypted_file_path, 'rb') as f:
-            iv = f.read(16)
-            ciphertext = f.read()
-
-        cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=backend)
-        decryptor = cipher.decryptor()
-        unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
-
-        padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
-        plaintext = unpadder.update(padded_plaintext) + unpadder.finalize()
-
         decrypted_file_path = encrypted_file_path.replace('.enc', '.dec')
-        with open(decrypted_file_path, 'wb') as f:
-            f.write(plaintext)
-
-        return decrypted_file_path
+        return container.decrypt_file(key, encrypted_file_path,
+                                      decrypted_file_path)
     
     def to_32_bytes_hash(self, data):
         sha256 = hashlib.sha256()
         sha256.update(data)
         return sha256.digest()
 
+    def _check_response(self, response, party):
+        # Failed requests are answered with an error instead of the result
+        if "error" in response:
+            raise RuntimeError(
+                f"Request to the {party} failed: {response['error']}")
+        return response
+
     def request_b_decode_keys(self, circuit_id):
         request = {"circuit_id": circuit_id}
-        self.socket.send_to_garbler(request)
-        
-        response = self.socket.receive_from_garbler()
+        response = self._check_response(
+            self.socket.send_wait_to_garbler(request), "garbler")
         self.init_receiver(response["params"], response["alice_pub"], response["boris_pub"], response["chris_pub"], response["shares"])
         self.cid = response["cid"]
+        self.secret_index = response["secret_index"]
         return response["b_decode_keys"]
     
     def start(self):
@@ -485,22 +803,24 @@ class User:
             proof = json.load(f)
         with open("ZK/circuit/public.json", "r") as f:
             public = json.load(f)
-        with open("ZK/circuit/verification_key.json", "r") as f:
-            verification_key = json.load(f)
         
         to_send = {
             "source": "user",
             "proof": proof,
             "public": public,
-            "verification_key": verification_key,
             "recv_pub": self.recv_pub,
+            "secret_index": self.secret_index,
         }
         print("6.Proof generated")
 
         # true = self.socket.receive_from_evaluator()
-        self.socket.send_wait_to_evaluator(to_send)
-        self.socket.send_to_evaluator(True)
-        entry = self.socket.receive_from_evaluator()
+        if self.sessions:
+            entry = self.socket.send_wait_to_evaluator(to_send)
+        else:
+            self.socket.send_wait_to_evaluator(to_send)
+            self.socket.send_to_evaluator(True)
+            entry = self.socket.receive_from_evaluator()
+        self._check_response(entry, "evaluator")
         reenc_alice = entry["reenc_alice"]
         reenc_boris = entry["reenc_boris"]
         self.pvss_receiver.add_reencrypted_share(reenc_alice)
@@ -517,20 +837,40 @@ def main(
     circuit_path="circuits/default.json",
     oblivious_transfer=False,
     print_mode="circuit",
+    scheme="classic",
+    stream=False,
+    serve=False,
+    workers=1,
+    storage_dir=None,
+    squarings_per_second=None,
     loglevel=logging.WARNING,
 ):
     logging.getLogger().setLevel(loglevel)
 
     
     if party == "alice":
-        alice = ServiceProvider(circuit_path, oblivious_transfer=False)
+        alice = ServiceProvider(circuit_path,
+                                oblivious_transfer=False,
+                                scheme=scheme,
+                                stream=stream,
+                                workers=workers,
+                                storage=ipfs.get_storage(storage_dir),
+                                squarings_per_second=squarings_per_second)
         alice.start()
-        alice.listen()
+        if serve:
+            asyncio.get_event_loop().run_until_complete(alice.serve())
+        else:
+            alice.listen()
     elif party == "bob":
         bob = AccessController(oblivious_transfer=False)
-        bob.listen()
+        if serve:
+            asyncio.get_event_loop().run_until_complete(bob.serve())
+        else:
+            bob.listen()
     elif party == "carol":
-        carol = User()
+        carol = User(sessions=serve,
+                     storage=cache.CachedStorage(
+                         ipfs.get_storage(storage_dir)))
         carol.start()
     elif party == "local":
         local = LocalTest(circuit_path, print_mode=print_mode)
@@ -571,6 +911,38 @@ if __name__ == '__main__':
             choices=["circuit", "table"],
             default="circuit",
             help="the print mode for local tests (default 'circuit')")
+        parser.add_argument(
+            "-s",
+            "--scheme",
+            metavar="scheme",
+            choices=yao.SCHEMES,
+            default="classic",
+            help="the garbling scheme for alice (default 'classic')")
+        parser.add_argument("--stream",
+                            action="store_true",
+                            help="garble and send circuits in chunks")
+        parser.add_argument("--serve",
+                            action="store_true",
+                            help="serve many users concurrently in sessions")
+        parser.add_argument(
+            "-j",
+            "--workers",
+            metavar="workers",
+            type=int,
+            default=1,
+            help="the number of processes garbling circuits, 0 for one per "
+            "CPU (default 1)")
+        parser.add_argument(
+            "--storage",
+            metavar="directory",
+            help="a local directory standing in for IPFS")
+        parser.add_argument(
+            "--squarings-per-second",
+            metavar="rate",
+            type=int,
+            help="the squaring rate of the access controller host, given by "
+            "python -m VTSS.calibration on that host (default: the rate of "
+            "this host)")
         parser.add_argument("-l",
                             "--loglevel",
                             metavar="level",
@@ -583,6 +955,12 @@ if __name__ == '__main__':
             circuit_path=parser.parse_args().circuit,
             oblivious_transfer=not parser.parse_args().no_oblivious_transfer,
             print_mode=parser.parse_args().m,
+            scheme=parser.parse_args().scheme,
+            stream=parser.parse_args().stream,
+            serve=parser.parse_args().serve,
+            workers=parser.parse_args().workers,
+            storage_dir=parser.parse_args().storage,
+            squarings_per_second=parser.parse_args().squarings_per_second,
             loglevel=loglevels[parser.parse_args().loglevel],
         )
 